@@ -1,22 +1,28 @@
 import streamlit as st
-import pyodbc
 import pandas as pd
 from datetime import datetime, timedelta
-import base64
-from io import BytesIO
-import reports  # 🔑 CRITICAL: Import report module for test reports
 
 # -----------------------------
 # DATABASE CONNECTION (SQL SERVER 2012 COMPATIBLE)
 # -----------------------------
-def get_connection():
-    return pyodbc.connect(
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        "SERVER=91.239.146.172;"
-        "DATABASE=Labnew;"
-        "UID=labuser;"
-        "PWD=janan123%%"
-    )
+# Connections are borrowed from the shared pool in db.py (settings live there)
+from db import get_connection, read_sql, day_bounds
+from sequences import peek_lab_no
+from registration import register_patient, build_test_lines
+from catalog import get_catalog
+from results import load_patient_tests, save_results
+from today_board import get_today_patients, AUTO_REFRESH_CHOICES
+from order_summary import refresh_summary, summary_source
+from daily_payment import daily_payment_data
+from receivables import reverse_patient
+import report_cache
+import batch_reports
+from pdf_render import PDF_AVAILABLE, html_to_pdf, worker_stats
+import finalized_reports
+from branding import get_branding
+from reports import report_file_name
+from receipts import receipt_copies, dual_receipt_html
+from patient_keys import join_on, key_column, key_param
 
 # -----------------------------
 # SESSION INITIALIZATION (ALL REQUIRED STATES)
@@ -58,64 +64,63 @@ def login_screen():
     password = st.text_input("Password", type="password")
     if st.button("Login", type="primary"):
         try:
-            con = get_connection()
-            cur = con.cursor()
-            cur.execute("""
-                SELECT user_id, user_name
-                FROM users
-                WHERE user_name = ? AND passward = ?
-            """, (username, password))
-            row = cur.fetchone()
-            if row:
-                st.session_state.logged_in = True
-                st.session_state.user = {
-                    "user_id": row[0],
-                    "user_name": row[1]
-                }
-                # LOAD USER RIGHTS
+            with get_connection() as con:
+                cur = con.cursor()
                 cur.execute("""
-                    SELECT
-                        uf.form_code,
-                        uf.form_name,
-                        uf.Module,
-                        ur.[Insert],
-                        ur.[Update],
-                        ur.[Delete],
-                        ur.[Select],
-                        ur.[Open],
-                        ur.[Print]
-                    FROM user_rights ur
-                    JOIN user_forms uf ON ur.form_id = uf.form_id
-                    WHERE ur.user_id = ?
-                """, (row[0],))
-                rights = {}
-                for r in cur.fetchall():
-                    rights[r.form_code] = {
-                        "form_name": r.form_name,
-                        "module": r.Module,
-                        "Insert": str(r.Insert).strip().lower() == "yes",
-                        "Update": str(r.Update).strip().lower() == "yes",
-                        "Delete": str(r.Delete).strip().lower() == "yes",
-                        "Select": str(r.Select).strip().lower() == "yes",
-                        "Open": str(r.Open).strip().lower() == "yes",
-                        "Print": str(r.Print).strip().lower() == "yes",
+                    SELECT user_id, user_name
+                    FROM users
+                    WHERE user_name = ? AND passward = ?
+                """, (username, password))
+                row = cur.fetchone()
+                if row:
+                    st.session_state.logged_in = True
+                    st.session_state.user = {
+                        "user_id": row[0],
+                        "user_name": row[1]
                     }
-                st.session_state.rights = rights
+                    # LOAD USER RIGHTS
+                    cur.execute("""
+                        SELECT
+                            uf.form_code,
+                            uf.form_name,
+                            uf.Module,
+                            ur.[Insert],
+                            ur.[Update],
+                            ur.[Delete],
+                            ur.[Select],
+                            ur.[Open],
+                            ur.[Print]
+                        FROM user_rights ur
+                        JOIN user_forms uf ON ur.form_id = uf.form_id
+                        WHERE ur.user_id = ?
+                    """, (row[0],))
+                    rights = {}
+                    for r in cur.fetchall():
+                        rights[r.form_code] = {
+                            "form_name": r.form_name,
+                            "module": r.Module,
+                            "Insert": str(r.Insert).strip().lower() == "yes",
+                            "Update": str(r.Update).strip().lower() == "yes",
+                            "Delete": str(r.Delete).strip().lower() == "yes",
+                            "Select": str(r.Select).strip().lower() == "yes",
+                            "Open": str(r.Open).strip().lower() == "yes",
+                            "Print": str(r.Print).strip().lower() == "yes",
+                        }
+                    st.session_state.rights = rights
                 
-                # LOAD LAB INFO
-                cur.execute("SELECT TOP 1 ID, LabName, Address, PhoneNo FROM LabInfo")
-                lab_row = cur.fetchone()
-                if lab_row:
-                    st.session_state.lab_info = {
-                        "id": lab_row[0],
-                        "name": lab_row[1],
-                        "address": lab_row[2],
-                        "phone": lab_row[3]
-                    }
-                st.success(f"Welcome {row[1]}")
-                st.rerun()
-            else:
-                st.error("Invalid username or password")
+                    # LOAD LAB INFO (process-wide branding cache)
+                    lab = get_branding()
+                    if lab:
+                        st.session_state.lab_info = {
+                            "id": lab["id"],
+                            "name": lab["name"],
+                            "address": lab["address"],
+                            "phone": lab["phone"]
+                        }
+                    st.success(f"Welcome {row[1]}")
+                    st.rerun()
+                else:
+                    st.error("Invalid username or password")
         except Exception as e:
             st.error(f"Database error: {str(e)}")
 
@@ -149,6 +154,7 @@ def sidebar_menu():
         if st.sidebar.button("➕ New Patient", use_container_width=True):
             st.session_state.current_page = "test_selection"
             st.session_state.selected_tests = None
+            st.session_state.pop("test_pick", None)
             st.session_state.subtest_selections = {}
             st.session_state.selected_patient = None
             st.session_state.report_params = {}
@@ -174,194 +180,63 @@ def sidebar_menu():
 # GET PATIENT TESTS (FOR RESULTS ENTRY)
 # -----------------------------
 def get_patient_tests(patient_id):
-    """Get ALL tests for patient - returns numeric Test_ID and display number"""
-    con = get_connection()
-    cur = con.cursor()
-    
-    cur.execute("""
-        SELECT 
-            pt.PatientID,
-            pt.Test_ID,
-            pt.PaymentID,
-            t.Test_Name,
-            ti.Test_Display_No,
-            ti.Test_Display_Name,
-            ti.SRate,
-            t.General_Test_Id
-        FROM patient_test pt
-        JOIN test t ON pt.Test_ID = t.Test_Id
-        JOIN test_identity ti ON t.Id = ti.Id
-        WHERE pt.PatientID = ?
-        ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50))
-    """, (str(patient_id),))
-    
-    tests = []
-    for row in cur.fetchall():
-        tests.append({
-            "patient_id": row[0],
-            "test_id": int(row[1]),
-            "payment_id": row[2],
-            "test_name": row[3],
-            "display_no": str(row[4]),
-            "display_name": row[5],
-            "rate": float(row[6]) if row[6] else 0.0,
-            "general_test_id": row[7]
-        })
-    
-    con.close()
-    return tests
+    """Get ALL tests for patient (numeric Test_ID, display number) with their current results"""
+    return load_patient_tests(patient_id)
 
 # -----------------------------
 # GET TEST SUB-TESTS
 # -----------------------------
 def get_test_subtests(test_id):
     """Get all sub-tests for a given test ID"""
-    con = get_connection()
-    cur = con.cursor()
-    
-    cur.execute("""
-        SELECT 
-            t.Test_Id,
-            t.Test_Name,
-            ti.Test_Display_No,
-            ti.SRate
-        FROM test t
-        JOIN test_identity ti ON t.Id = ti.Id
-        WHERE t.General_Test_Id = ?
-        ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50))
-    """, (test_id,))
-    
-    subtests = []
-    for row in cur.fetchall():
-        subtests.append({
-            "test_id": row[0],
-            "test_name": row[1],
-            "display_no": row[2],
-            "rate": float(row[3]) if row[3] else 0.0
-        })
-    
-    con.close()
-    return subtests
-
-# -----------------------------
-# GET TEST RESULTS
-# -----------------------------
-def get_test_results(patient_id, test_id):
-    """Get results using NUMERIC Test_ID (not display number)"""
-    con = get_connection()
-    cur = con.cursor()
-    
-    cur.execute("""
-        SELECT 
-            Result_id,
-            Patient_No,
-            Test_No,
-            Test_Values,
-            Remarks
-        FROM patient_test_results
-        WHERE Patient_No = ? AND Test_No = ?
-    """, (str(patient_id), int(test_id)))
-    
-    results = []
-    for row in cur.fetchall():
-        results.append({
-            "result_id": row[0],
-            "patient_no": row[1],
-            "test_no": row[2],
-            "test_values": row[3] if row[3] else "",
-            "remarks": row[4] if row[4] else ""
-        })
-    
-    con.close()
-    return results
+    return [
+        {
+            "test_id": sub["test_id"],
+            "test_name": sub["test_name"],
+            "display_no": sub["display_no"],
+            "rate": sub["rate"]
+        }
+        for sub in get_catalog().subtests(test_id)
+    ]
 
 # -----------------------------
 # SAVE TEST RESULT
 # -----------------------------
 def save_test_result(patient_id, test_id, test_values, remarks):
-    """Save to EXACT schema with manual Result_id generation and numeric Test_No"""
+    """Save one result (same writer as the bulk save on the results screen)"""
     try:
-        con = get_connection()
-        cur = con.cursor()
-        patient_id_str = str(patient_id)
-        
-        cur.execute("""
-            SELECT Result_id FROM patient_test_results
-            WHERE Patient_No = ? AND Test_No = ?
-        """, (patient_id_str, int(test_id)))
-        
-        existing = cur.fetchone()
-        
-        if existing:
-            cur.execute("""
-                UPDATE patient_test_results
-                SET Test_Values = ?, Remarks = ?
-                WHERE Result_id = ?
-            """, (test_values, remarks, existing[0]))
-            con.commit()
-            con.close()
-            return True, "updated"
-        else:
-            cur.execute("SELECT ISNULL(MAX(Result_id), 0) + 1 FROM patient_test_results")
-            next_result_id = cur.fetchone()[0]
-            
-            cur.execute("""
-                INSERT INTO patient_test_results (
-                    Result_id, Patient_No, Test_No, Test_Values, Remarks
-                ) VALUES (?, ?, ?, ?, ?)
-            """, (next_result_id, patient_id_str, int(test_id), test_values, remarks))
-            con.commit()
-            con.close()
-            return True, "inserted"
-        
+        outcome = save_results(patient_id, {test_id: {"test_values": test_values, "remarks": remarks}})
+        return True, outcome["outcomes"][int(test_id)]
     except Exception as e:
         return False, str(e)
 
 # -----------------------------
 # DASHBOARD GRID (WITH REPORT BUTTON)
 # -----------------------------
+DASHBOARD_PAGE_SIZE = 25
+
 def dashboard():
     lab_name = st.session_state.lab_info['name'] if st.session_state.lab_info else "Dashboard"
     st.title(f"📊 {lab_name} – Today Patients")
     st.caption(f"User: {st.session_state.user['user_name']} | Role: {st.session_state.user.get('role_name', 'User')}")
+    
+    # Auto-refresh re-polls only the grid (needs a Streamlit version with st.fragment)
+    can_auto_refresh = hasattr(st, "fragment")
+    if can_auto_refresh:
+        refresh_label = st.selectbox(
+            "🔄 Auto-refresh", list(AUTO_REFRESH_CHOICES), key="dashboard_auto_refresh"
+        )
+        interval = AUTO_REFRESH_CHOICES[refresh_label]
     st.divider()
     
+    if can_auto_refresh and interval:
+        st.fragment(run_every=interval)(dashboard_grid)()
+    else:
+        dashboard_grid()
+
+def dashboard_grid():
     try:
-        con = get_connection()
-        df = pd.read_sql("""
-            SELECT
-                p.Patient_Id,
-                p.LabNo,
-                p.Patient_Name AS Patient,
-                p.Age,
-                p.Sex,
-                p.Mobile_No AS Mobile,
-                p.Refered_By AS DoctorID,
-                d.DoctorName AS Doctor,
-                STUFF((
-                    SELECT ', ' + t2.Test_Name
-                    FROM patient_test pt2
-                    JOIN test t2 ON pt2.Test_ID = t2.Test_Id
-                    WHERE pt2.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
-                    FOR XML PATH(''), TYPE
-                ).value('.', 'NVARCHAR(MAX)'), 1, 2, '') AS Tests,
-                (ISNULL(pp.TotalAmount, 0) - ISNULL(pp.AmountPaid, 0)) AS Balance,
-                CASE
-                    WHEN EXISTS (
-                        SELECT 1
-                        FROM patient_test_results r
-                        WHERE r.Patient_No = CAST(p.Patient_Id AS VARCHAR(50))
-                    )
-                    THEN 'Ready'
-                    ELSE 'Awaiting Result'
-                END AS Status,
-                p.Visit_Date
-            FROM patient p
-            LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
-            LEFT JOIN patientpayment pp ON CAST(p.Patient_Id AS VARCHAR(50)) = pp.PatientID
-            WHERE CAST(p.Visit_Date AS DATE) = CAST(GETDATE() AS DATE)
-            ORDER BY p.Patient_Id DESC
-        """, con)
+        # Cached snapshot of today's rows; each call only fetches what changed since the last poll
+        df = get_today_patients()
         
         if df.empty:
             st.info("🕗 No patients found for today. Add a new patient to get started!")
@@ -374,80 +249,126 @@ def dashboard():
             col4.metric("Total Balance", f"Rs. {df['Balance'].sum():,.2f}")
             st.divider()
             
-            # Patient grid with action buttons
-            for idx, row in df.iterrows():
-                with st.expander(f"📋 Lab No: {row['LabNo']} - {row['Patient']} (Age: {row['Age']}, {row['Sex']})", expanded=False):
-                    col1, col2, col3, col4 = st.columns([2, 2, 2, 2])
-                    with col1:
-                        st.write(f"**Patient:** {row['Patient']}")
-                        st.write(f"**Age/Sex:** {row['Age']} / {row['Sex']}")
-                        st.write(f"**Mobile:** {row['Mobile']}")
-                    with col2:
-                        st.write(f"**Doctor:** {row['Doctor']}")
-                        st.write(f"**Tests:** {row['Tests']}")
-                        st.write(f"**Visit:** {row['Visit_Date'].strftime('%d-%b-%Y %I:%M %p')}")
-                    with col3:
-                        status_color = "🟢" if row['Status'] == 'Ready' else "🟡"
-                        st.write(f"**Status:** {status_color} {row['Status']}")
-                        balance_color = "🔴" if row['Balance'] > 0 else "🟢"
-                        st.write(f"**Balance:** {balance_color} Rs. {row['Balance']:.2f}")
-                    with col4:
-                        if st.button("📝 Results", key=f"results_{row['Patient_Id']}", use_container_width=True):
-                            st.session_state.selected_patient = {
-                                "patient_id": row['Patient_Id'],
-                                "lab_no": row['LabNo'],
-                                "patient_name": row['Patient'],
-                                "age": row['Age'],
-                                "sex": row['Sex'],
-                                "mobile": row['Mobile'],
-                                "doctor": row['Doctor'],
-                                "tests": row['Tests'],
-                                "balance": row['Balance'],
-                                "status": row['Status']
-                            }
-                            st.session_state.current_page = "test_results"
-                            st.rerun()
-                        
-                        # 🔑 REPORT BUTTON FOR READY PATIENTS
-                        if row['Status'] == 'Ready':
-                            if st.button("📄 Report", key=f"report_{row['Patient_Id']}", use_container_width=True, type="primary"):
-                                st.session_state.selected_patient = {
-                                    "patient_id": row['Patient_Id'],
-                                    "lab_no": row['LabNo'],
-                                    "patient_name": row['Patient'],
-                                    "age": row['Age'],
-                                    "sex": row['Sex'],
-                                    "mobile": row['Mobile'],
-                                    "doctor": row['Doctor'],
-                                    "city": row.get('City', 'N/A'),
-                                    "visit_date": row['Visit_Date']
-                                }
-                                st.session_state.current_page = "test_report"
-                                st.rerun()
-                        
-                        if st.button("✏️ Update", key=f"update_{row['Patient_Id']}", use_container_width=True):
-                            st.session_state.selected_patient = {
-                                "patient_id": row['Patient_Id'],
-                                "lab_no": row['LabNo'],
-                                "patient_name": row['Patient'],
-                                "age": row['Age'],
-                                "sex": row['Sex'],
-                                "mobile": row['Mobile'],
-                                "doctor": row['Doctor']
-                            }
-                            st.session_state.action_mode = "update_patient"
-                            st.session_state.current_page = "patient_update"
-                            st.rerun()
-                        
-                        if st.button("🗑️ Delete", key=f"delete_{row['Patient_Id']}", use_container_width=True):
-                            st.session_state.selected_patient = {
-                                "patient_id": row['Patient_Id'],
-                                "lab_no": row['LabNo'],
-                                "patient_name": row['Patient']
-                            }
-                            st.session_state.action_mode = "delete_patient"
-                            st.session_state.current_page = "patient_delete"
-                            st.rerun()
+            # Filters and paging run on the in-memory snapshot; only one page is rendered
+            fcol1, fcol2, fcol3 = st.columns([2, 3, 2])
+            with fcol1:
+                status_filter = st.selectbox("Status", ["All", "Awaiting Result", "Ready"], key="dashboard_status")
+            with fcol2:
+                doctors = sorted(df['Doctor'].dropna().unique())
+                doctor_filter = st.selectbox("Doctor", ["All"] + doctors, key="dashboard_doctor")
+            
+            filtered = df
+            if status_filter != "All":
+                filtered = filtered[filtered['Status'] == status_filter]
+            if doctor_filter != "All":
+                filtered = filtered[filtered['Doctor'] == doctor_filter]
+            
+            page_count = max(1, -(-len(filtered) // DASHBOARD_PAGE_SIZE))
+            with fcol3:
+                page = st.number_input(
+                    f"Page (of {page_count})", min_value=1, max_value=page_count, value=1,
+                    key=f"dashboard_page_{status_filter}_{doctor_filter}"
+                )
+            page_rows = filtered.iloc[(page - 1) * DASHBOARD_PAGE_SIZE:page * DASHBOARD_PAGE_SIZE]
+            
+            if page_rows.empty:
+                st.info("No patients match the selected filters")
+                return
+            
+            view = pd.DataFrame({
+                "Lab No": page_rows['LabNo'],
+                "Patient": page_rows['Patient'],
+                "Age/Sex": page_rows['Age'].astype(str) + " / " + page_rows['Sex'].astype(str),
+                "Mobile": page_rows['Mobile'],
+                "Doctor": page_rows['Doctor'],
+                "Tests": page_rows['Tests'],
+                "Status": page_rows['Status'].map(lambda s: f"🟢 {s}" if s == 'Ready' else f"🟡 {s}"),
+                "Balance": page_rows['Balance'],
+                "Visit": page_rows['Visit_Date'].map(lambda v: v.strftime('%I:%M %p')),
+            })
+            st.caption(
+                f"Showing {len(page_rows)} of {len(filtered)} patient(s) - select a row for actions"
+            )
+            try:
+                event = st.dataframe(
+                    view, hide_index=True, use_container_width=True,
+                    column_config={"Balance": st.column_config.NumberColumn("Balance", format="Rs. %.2f")},
+                    on_select="rerun", selection_mode="single-row",
+                    key=f"dashboard_grid_{status_filter}_{doctor_filter}_{page}"
+                )
+                picked = event.selection.rows
+                row = page_rows.iloc[picked[0]] if picked else None
+            except TypeError:
+                # Streamlit without dataframe row selection: pick from a list instead
+                st.dataframe(view, hide_index=True, use_container_width=True)
+                labels = [f"{r['LabNo']} - {r['Patient']}" for _, r in page_rows.iterrows()]
+                choice = st.selectbox("Patient", ["-"] + labels, key="dashboard_pick")
+                row = page_rows.iloc[labels.index(choice)] if choice != "-" else None
+            
+            if row is None:
+                return
+            
+            # One action bar for the selected patient
+            st.markdown(f"**Selected:** Lab No {row['LabNo']} - {row['Patient']} "
+                        f"(Age: {row['Age']}, {row['Sex']}) | Doctor: {row['Doctor']}")
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                if st.button("📝 Results", key=f"results_{row['Patient_Id']}", use_container_width=True):
+                    st.session_state.selected_patient = {
+                        "patient_id": row['Patient_Id'],
+                        "lab_no": row['LabNo'],
+                        "patient_name": row['Patient'],
+                        "age": row['Age'],
+                        "sex": row['Sex'],
+                        "mobile": row['Mobile'],
+                        "doctor": row['Doctor'],
+                        "tests": row['Tests'],
+                        "balance": row['Balance'],
+                        "status": row['Status']
+                    }
+                    st.session_state.current_page = "test_results"
+                    st.rerun()
+            with col2:
+                # 🔑 REPORT BUTTON FOR READY PATIENTS
+                if st.button("📄 Report", key=f"report_{row['Patient_Id']}", use_container_width=True,
+                             type="primary", disabled=row['Status'] != 'Ready'):
+                    st.session_state.selected_patient = {
+                        "patient_id": row['Patient_Id'],
+                        "lab_no": row['LabNo'],
+                        "patient_name": row['Patient'],
+                        "age": row['Age'],
+                        "sex": row['Sex'],
+                        "mobile": row['Mobile'],
+                        "doctor": row['Doctor'],
+                        "city": row.get('City', 'N/A'),
+                        "visit_date": row['Visit_Date']
+                    }
+                    st.session_state.current_page = "test_report"
+                    st.rerun()
+            with col3:
+                if st.button("✏️ Update", key=f"update_{row['Patient_Id']}", use_container_width=True):
+                    st.session_state.selected_patient = {
+                        "patient_id": row['Patient_Id'],
+                        "lab_no": row['LabNo'],
+                        "patient_name": row['Patient'],
+                        "age": row['Age'],
+                        "sex": row['Sex'],
+                        "mobile": row['Mobile'],
+                        "doctor": row['Doctor']
+                    }
+                    st.session_state.action_mode = "update_patient"
+                    st.session_state.current_page = "patient_update"
+                    st.rerun()
+            with col4:
+                if st.button("🗑️ Delete", key=f"delete_{row['Patient_Id']}", use_container_width=True):
+                    st.session_state.selected_patient = {
+                        "patient_id": row['Patient_Id'],
+                        "lab_no": row['LabNo'],
+                        "patient_name": row['Patient']
+                    }
+                    st.session_state.action_mode = "delete_patient"
+                    st.session_state.current_page = "patient_delete"
+                    st.rerun()
     except Exception as e:
         st.error(f"Error loading dashboard: {str(e)}")
         st.exception(e)
@@ -455,6 +376,11 @@ def dashboard():
 # -----------------------------
 # TEST SELECTION SCREEN (FULLY IMPLEMENTED)
 # -----------------------------
+TEST_PAGE_SIZE = 50
+
+def test_option_label(test):
+    return f"{test['Test_Display_No']} - {test['Test_Display_Name']} (Rs. {test['Rate']})"
+
 def test_selection():
     st.title("🧪 Step 1: Select Tests")
     
@@ -465,52 +391,59 @@ def test_selection():
         search_no = st.text_input("Search by Display No")
     
     try:
-        con = get_connection()
-        query = """
-            SELECT
-                ti.Id AS test_identity_id,
-                ti.Test_Display_No,
-                ti.Test_Display_Name,
-                t.Test_Id,
-                t.Test_Name,
-                CAST(ti.SRate AS FLOAT) AS Rate
-            FROM test_identity ti
-            JOIN test t ON ti.Id = t.Id
-            WHERE ti.Test_Display_No IS NOT NULL 
-              AND LTRIM(RTRIM(ti.Test_Display_No)) <> ''
-        """
-        params = []
-        if search_name:
-            query += " AND t.Test_Name LIKE ?"
-            params.append(f"%{search_name}%")
-        if search_no:
-            query += " AND ti.Test_Display_No LIKE ?"
-            params.append(f"%{search_no}%")
-        query += " ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50))"
+        # Chosen tests are kept across searches and pages (label -> test row)
+        if "test_pick" not in st.session_state:
+            st.session_state.test_pick_rows = {
+                test_option_label(test): test for test in (st.session_state.selected_tests or [])
+            }
+            st.session_state.test_pick = list(st.session_state.test_pick_rows)
+        picked_rows = st.session_state.test_pick_rows
         
-        df = pd.read_sql(query, con, params=params)
+        # In-memory ranked search, one bounded page at a time (no database trip)
+        index = get_catalog().search_index
+        page_key = f"test_page_{search_name}_{search_no}"
+        page = st.session_state.get(page_key, 1)
+        matches, total_matches = index.search(
+            search_name, search_no, offset=(page - 1) * TEST_PAGE_SIZE, limit=TEST_PAGE_SIZE
+        )
         
-        if df.empty:
+        if total_matches == 0 and not picked_rows:
             st.warning("No tests found matching your search")
             return
         
-        df["Display"] = df["Test_Display_No"].astype(str) + " - " + df["Test_Display_Name"] + " (Rs. " + df["Rate"].astype(str) + ")"
-        
-        preselected = []
-        if st.session_state.selected_tests:
-            for test in st.session_state.selected_tests:
-                label = f"{test['Test_Display_No']} - {test['Test_Display_Name']} (Rs. {test['Rate']})"
-                if label in df["Display"].values:
-                    preselected.append(label)
+        page_rows = {}
+        for t in matches:
+            row = {
+                "test_identity_id": t["identity_id"],
+                "Test_Display_No": t["display_no"],
+                "Test_Display_Name": t["display_name"],
+                "Test_Id": t["test_id"],
+                "Test_Name": t["test_name"],
+                "Rate": t["rate"]
+            }
+            page_rows[test_option_label(row)] = row
         
+        options = list(page_rows) + [label for label in picked_rows if label not in page_rows]
         selected = st.multiselect(
             "Select Tests (you can select multiple)",
-            options=df["Display"].tolist(),
-            default=preselected
+            options=options,
+            key="test_pick"
         )
         
+        pages = max(1, -(-total_matches // TEST_PAGE_SIZE))
+        if pages > 1:
+            st.number_input(
+                f"Page (of {pages}, {total_matches} matching tests)",
+                min_value=1, max_value=pages, step=1, key=page_key
+            )
+        elif total_matches == 0:
+            st.warning("No tests found matching your search")
+        
+        known_rows = {**picked_rows, **page_rows}
+        st.session_state.test_pick_rows = {label: known_rows[label] for label in selected}
+        
         if selected:
-            total = df[df["Display"].isin(selected)]["Rate"].sum()
+            total = sum(row["Rate"] for row in st.session_state.test_pick_rows.values())
             st.success(f"✅ {len(selected)} test(s) selected | Total: Rs. {total:.2f}")
         
         col_btn1, col_btn2 = st.columns(2)
@@ -520,11 +453,7 @@ def test_selection():
                     st.warning("⚠️ Please select at least one test")
                     return
                 
-                selected_df = df[df["Display"].isin(selected)]
-                st.session_state.selected_tests = selected_df[[
-                    "test_identity_id", "Test_Display_No", "Test_Display_Name", 
-                    "Test_Id", "Test_Name", "Rate"
-                ]].to_dict("records")
+                st.session_state.selected_tests = list(st.session_state.test_pick_rows.values())
                 
                 st.session_state.subtest_selections = {}
                 st.session_state.current_page = "patient_entry"
@@ -555,27 +484,18 @@ def patient_entry_form():
     # FETCH SUB-TESTS FOR EACH MAIN TEST
     if not st.session_state.subtest_selections:
         try:
-            con = get_connection()
-            cur = con.cursor()
-            for test in st.session_state.selected_tests:
-                main_test_id = test["Test_Id"]
-                cur.execute("""
-                    SELECT t.Test_Id, t.Test_Name, CAST(ti.SRate AS FLOAT) AS Rate
-                    FROM test t
-                    JOIN test_identity ti ON t.Id = ti.Id
-                    WHERE t.General_Test_Id = ?
-                """, (main_test_id,))
-                subtests = cur.fetchall()
+            # One lookup for the whole selection (parent -> children index), no per-test query
+            children = get_catalog().subtests_for(test["Test_Id"] for test in st.session_state.selected_tests)
+            for main_test_id, subtests in children.items():
                 st.session_state.subtest_selections[main_test_id] = [
                     {
-                        "Test_Id": row[0],
-                        "Test_Name": row[1],
-                        "Rate": float(row[2]) if row[2] else 0.0,
+                        "Test_Id": sub["test_id"],
+                        "Test_Name": sub["test_name"],
+                        "Rate": sub["rate"],
                         "selected": True
                     }
-                    for row in subtests
+                    for sub in subtests
                 ]
-            con.close()
         except Exception as e:
             st.error(f"Error loading sub-tests: {str(e)}")
     
@@ -645,18 +565,10 @@ def patient_entry_form():
         col1, col2 = st.columns(2)
         
         with col1:
+            # Preview only - the real LabNo is taken from the daily counter when saving
+            lab_id = st.session_state.lab_info["id"] if st.session_state.lab_info else 0
             try:
-                con = get_connection()
-                cur = con.cursor()
-                cur.execute("""
-                    SELECT ISNULL(MAX(CASE 
-                        WHEN ISNUMERIC(LabNo) = 1 THEN CAST(LabNo AS INT) 
-                        ELSE 0 
-                    END), 0) + 1 
-                    FROM patient 
-                    WHERE CAST(Visit_Date AS DATE) = CAST(GETDATE() AS DATE)
-                """)
-                next_labno = cur.fetchone()[0]
+                next_labno = peek_lab_no(lab_id, datetime.now().date())
             except:
                 next_labno = 1
             
@@ -668,7 +580,7 @@ def patient_entry_form():
         
         with col2:
             try:
-                doctors = pd.read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName", con)
+                doctors = read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName")
                 doctor_opts = [""] + doctors["DoctorName"].tolist()
                 doctor = st.selectbox("Referred By Doctor", doctor_opts)
                 doctor_id = doctors.loc[doctors["DoctorName"] == doctor, "DoctorID"].values[0] if doctor else None
@@ -712,86 +624,26 @@ def patient_entry_form():
                 return
             
             try:
-                con = get_connection()
-                cur = con.cursor()
-                cur.execute("BEGIN TRANSACTION")
-                
-                cur.execute("SELECT ISNULL(MAX(Patient_Id), 0) + 1 FROM patient")
-                next_patient_id = cur.fetchone()[0]
-                patient_no = f"P{next_patient_id}"
-                
-                cur.execute("SELECT ISNULL(MAX(PaymentID), 0) + 1 FROM patientpayment")
-                next_payment_id = cur.fetchone()[0]
-                
-                cur.execute("""
-                    INSERT INTO patient (
-                        Patient_Id, PatientNo, LabNo, Patient_Name, NIC, Mobile_No, 
-                        ReportedDate, Visit_Date, Age, Sex, Refered_By, 
-                        City, Parent_Age_Name, SampleSource, WrongEntry, 
-                        ReturnTime, Address
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    next_patient_id, patient_no, next_labno, patient_name, "", mobile,
-                    visit_date, visit_date, age, sex, doctor_id,
-                    city, "", sample_source, 0,
-                    return_time, address
-                ))
-                con.commit()
-                
-                cur.execute("""
-                    INSERT INTO patientpayment (
-                        PaymentID, PatientID, TotalAmount, Discount, AmountPaid, 
-                        UserID, Description, TDiscount
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    next_payment_id, str(next_patient_id), total_amount, discount, paid,
-                    st.session_state.user["user_id"], "New Patient Entry", discount
-                ))
-                con.commit()
-                
-                all_tests_to_insert = []
-                
-                for test in st.session_state.selected_tests:
-                    all_tests_to_insert.append({
-                        "Test_ID": test["Test_Id"],
-                        "Rate": test["Rate"]
-                    })
-                
-                for main_test_id, subtests in st.session_state.subtest_selections.items():
-                    for sub in subtests:
-                        if sub["selected"]:
-                            all_tests_to_insert.append({
-                                "Test_ID": sub["Test_Id"],
-                                "Rate": sub["Rate"]
-                            })
-                
-                for test_item in all_tests_to_insert:
-                    cur.execute("""
-                        INSERT INTO patient_test (PatientID, Test_ID, PaymentID, TestRepeat)
-                        VALUES (?, ?, ?, 0)
-                    """, (str(next_patient_id), test_item["Test_ID"], next_payment_id))
-                
-                con.commit()
-                
-                cur.execute("SELECT ISNULL(MAX(TRN_ID), 0) FROM journal")
-                base_trn_id = cur.fetchone()[0]
-                
-                journal_entries = [
-                    (base_trn_id + 1, visit_date, 1, "Transaction Generated For Patient Entry", "Debit", paid, next_patient_id, None),
-                    (base_trn_id + 2, visit_date, 3, "Transaction Generated For Patient Entry", "Credit", paid, next_patient_id, None),
-                    (base_trn_id + 3, visit_date, 1, "Transaction Generated For Patient Entry", "Credit", paid, next_patient_id, None),
-                    (base_trn_id + 4, visit_date, 2, "Transaction Generated For Patient Entry", "Debit", paid, next_patient_id, None)
-                ]
-                
-                for entry in journal_entries:
-                    cur.execute("""
-                        INSERT INTO journal (
-                            TRN_ID, TRN_date, S_ID, Description, TRN_type, 
-                            TRN_amount, PatientID, DoctorFeeID
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, entry)
-                
-                con.commit()
+                saved = register_patient(
+                    patient={
+                        "name": patient_name,
+                        "mobile": mobile,
+                        "visit_date": visit_date,
+                        "age": age,
+                        "sex": sex,
+                        "doctor_id": doctor_id,
+                        "city": city,
+                        "sample_source": sample_source,
+                        "return_time": return_time,
+                        "address": address
+                    },
+                    payment={"total": total_amount, "discount": discount, "paid": paid},
+                    test_lines=build_test_lines(st.session_state.selected_tests, st.session_state.subtest_selections),
+                    user_id=st.session_state.user["user_id"],
+                    lab_id=lab_id
+                )
+                next_labno = saved["lab_no"]
+                patient_no = saved["patient_no"]
                 
                 receipt_tests = []
                 for test in st.session_state.selected_tests:
@@ -845,7 +697,6 @@ def patient_entry_form():
                 st.rerun()
                 
             except Exception as e:
-                cur.execute("ROLLBACK TRANSACTION")
                 st.error(f"Database error: {str(e)}")
                 st.exception(e)
 
@@ -878,11 +729,11 @@ def test_results_entry():
     patient_key = f"results_{patient['patient_id']}"
     if patient_key not in st.session_state.result_inputs:
         st.session_state.result_inputs[patient_key] = {}
+        # Existing results arrived with the test list (one query)
         for test in all_tests:
-            existing = get_test_results(patient['patient_id'], test['test_id'])
             st.session_state.result_inputs[patient_key][test['test_id']] = {
-                "test_values": existing[0]['test_values'] if existing else "",
-                "remarks": existing[0]['remarks'] if existing else ""
+                "test_values": test['test_values'],
+                "remarks": test['remarks']
             }
     
     with st.form(key=f"all_results_form_{patient['patient_id']}"):
@@ -933,25 +784,21 @@ def test_results_entry():
         submitted = st.form_submit_button("💾 Save All Results", type="primary")
         
         if submitted:
-            success_count = 0
-            error_count = 0
-            
-            for test in all_tests:
-                test_id = test['test_id']
-                test_values = st.session_state.result_inputs[patient_key][test_id]['test_values']
-                remarks = st.session_state.result_inputs[patient_key][test_id]['remarks']
-                
-                success, msg = save_test_result(patient['patient_id'], test_id, test_values, remarks)
-                if success:
-                    success_count += 1
+            entries = {
+                test['test_id']: st.session_state.result_inputs[patient_key][test['test_id']]
+                for test in all_tests
+            }
+            try:
+                saved = save_results(patient['patient_id'], entries)
+                changed = saved['inserted'] + saved['updated']
+                if changed:
+                    st.success(f"✅ Successfully saved {changed} result(s)! "
+                               f"({saved['unchanged']} unchanged)")
                 else:
-                    error_count += 1
-                    st.error(f"Error saving {test['test_name']}: {msg}")
-            
-            if success_count > 0:
-                st.success(f"✅ Successfully saved {success_count} result(s)!")
-            if error_count > 0:
-                st.error(f"❌ Failed to save {error_count} result(s). Check errors above.")
+                    st.info("ℹ️ No changes to save")
+            except Exception as e:
+                st.error(f"❌ Failed to save results (nothing was saved): {str(e)}")
+                return
             
             if patient_key in st.session_state.result_inputs:
                 del st.session_state.result_inputs[patient_key]
@@ -980,16 +827,23 @@ def test_report_viewer():
     st.title(f"📄 Test Report - Lab No: {patient['lab_no']} | {patient['patient_name']}")
     
     try:
-        # 🔑 CRITICAL: Generate report using reports.py module
-        report_html = reports.generate_report(patient['patient_id'], format_type="standard")
+        # Finalized reports are re-printed from the store exactly as issued
+        finalized = finalized_reports.get_finalized(patient['patient_id'])
+        if finalized:
+            report_html = finalized_reports.read_html(finalized)
+            st.success(f"🔒 Finalized report issued {finalized['finalized_at'].replace('T', ' ')}"
+                       f"{' by ' + finalized['finalized_by'] if finalized['finalized_by'] else ''} - re-printed from the report store")
+        else:
+            # 🔑 CRITICAL: Generate report using reports.py module (re-used while results are unchanged)
+            report_html = report_cache.get_report(patient['patient_id'], format_type="standard")
         st.session_state.report_html = report_html
         
         # Display report with controls
-        st.markdown("""
+        st.markdown(f"""
         <div style="text-align: center; margin: 20px 0; padding: 15px; background: #e8f4fc; border-radius: 8px; border: 2px solid #2c3e50;">
             <h3 style="margin: 0; color: #2c3e50; font-size: 20px;">🖨️ Report Controls</h3>
             <p style="margin: 8px 0 0; font-size: 15px; color: #2c3e50;">
-                💡 <strong>Tip:</strong> Use browser's <strong>Print > Save as PDF</strong> for PDF version
+                💡 <strong>Tip:</strong> {"Download the PDF below for printing" if PDF_AVAILABLE else "Use browser's <strong>Print > Save as PDF</strong> for PDF version"}
             </p>
         </div>
         """, unsafe_allow_html=True)
@@ -1011,21 +865,50 @@ def test_report_viewer():
             st.download_button(
                 "💾 Download HTML Report",
                 report_html,
-                file_name=f"LabReport_Lab{patient['lab_no']}_Patient{patient['patient_no']}.html",
+                file_name=report_file_name(patient['lab_no'], patient['patient_id']),
                 mime="text/html",
                 use_container_width=True,
                 help="Save report as HTML file for viewing in browser"
             )
         
         with col3:
-            st.info(
-                "🖨️ **Print Instructions:**\n"
-                "1. Click button above to download HTML\n"
-                "2. Open in browser\n"
-                "3. Press Ctrl+P (or Cmd+P)\n"
-                "4. Choose 'Save as PDF'",
-                icon="ℹ️"
-            )
+            # Server-side PDF (stored with a finalized report, else rendered once per report version)
+            report_pdf = finalized_reports.read_pdf(finalized) if finalized else None
+            if report_pdf is None and PDF_AVAILABLE:
+                report_pdf = html_to_pdf(report_html)
+            if report_pdf:
+                st.download_button(
+                    "📥 Download PDF Report",
+                    report_pdf,
+                    file_name=report_file_name(patient['lab_no'], patient['patient_id'], "pdf"),
+                    mime="application/pdf",
+                    use_container_width=True,
+                    type="primary"
+                )
+            else:
+                st.info(
+                    "🖨️ **Print Instructions:**\n"
+                    "1. Click button above to download HTML\n"
+                    "2. Open in browser\n"
+                    "3. Press Ctrl+P (or Cmd+P)\n"
+                    "4. Choose 'Save as PDF'",
+                    icon="ℹ️"
+                )
+        
+        # FINALIZE (permanent record: needs Update rights on the patient form)
+        can_finalize = st.session_state.rights.get("FRM-005", {}).get("Update", False)
+        if not finalized:
+            st.markdown("---")
+            st.caption("Finalize once the results are verified: the report is stored as issued and "
+                       "later re-prints come from the store, unaffected by later range or catalog changes.")
+            if not can_finalize:
+                st.info("🔒 Finalizing reports requires Update rights on patients.")
+            elif st.button("✅ Finalize Report (Results Verified)", use_container_width=True, type="primary"):
+                try:
+                    finalized_reports.finalize(patient['patient_id'], st.session_state.user['user_name'])
+                    st.rerun()
+                except finalized_reports.AlreadyFinalized:
+                    st.rerun()
     
     except Exception as e:
         st.error(f"❌ Error generating report: {str(e)}")
@@ -1050,8 +933,6 @@ def update_patient_form():
     st.title(f"✏️ Update Patient Information - Lab No: {patient['lab_no']}")
     
     try:
-        con = get_connection()
-        
         with st.form("update_patient_form"):
             col1, col2 = st.columns(2)
             
@@ -1062,7 +943,7 @@ def update_patient_form():
                 mobile = st.text_input("Mobile No", value=patient['mobile'], max_chars=15)
             
             with col2:
-                doctors = pd.read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName", con)
+                doctors = read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName")
                 doctor_opts = [""] + doctors["DoctorName"].tolist()
                 current_doctor = patient.get('doctor', '')
                 doctor_index = doctor_opts.index(current_doctor) if current_doctor in doctor_opts else 0
@@ -1080,14 +961,16 @@ def update_patient_form():
                     return
                 
                 try:
-                    cur = con.cursor()
-                    cur.execute("""
-                        UPDATE patient
-                        SET Patient_Name = ?, Age = ?, Sex = ?, Mobile_No = ?,
-                            Refered_By = ?, City = ?, Address = ?
-                        WHERE Patient_Id = ?
-                    """, (patient_name, age, sex, mobile, doctor_id, city, address, patient['patient_id']))
-                    con.commit()
+                    with get_connection() as con:
+                        cur = con.cursor()
+                        cur.execute("""
+                            UPDATE patient
+                            SET Patient_Name = ?, Age = ?, Sex = ?, Mobile_No = ?,
+                                Refered_By = ?, City = ?, Address = ?
+                            WHERE Patient_Id = ?
+                        """, (patient_name, age, sex, mobile, doctor_id, city, address, patient['patient_id']))
+                        con.commit()
+                    report_cache.invalidate(patient['patient_id'])
                     
                     st.success("✅ Patient information updated successfully!")
                     st.session_state.current_page = "dashboard"
@@ -1138,18 +1021,24 @@ def delete_patient_confirmation():
     with col1:
         if st.button("🗑️ Yes, Delete Patient", type="primary", use_container_width=True):
             try:
-                con = get_connection()
-                cur = con.cursor()
-                cur.execute("BEGIN TRANSACTION")
-                
-                patient_id_str = str(patient['patient_id'])
-                
-                cur.execute("DELETE FROM patient_test_results WHERE Patient_No = ?", (patient_id_str,))
-                cur.execute("DELETE FROM patient_test WHERE PatientID = ?", (patient_id_str,))
-                cur.execute("DELETE FROM patientpayment WHERE PatientID = ?", (patient_id_str,))
-                cur.execute("DELETE FROM patient WHERE Patient_Id = ?", (patient['patient_id'],))
-                
-                con.commit()
+                # One pyodbc transaction (autocommit is off); rolled back automatically on error
+                with get_connection() as con:
+                    cur = con.cursor()
+                    
+                    patient_id = patient['patient_id']
+                    
+                    # Take the patient's charges and payments back out of the receivables ledger
+                    reverse_patient(cur, patient_id)
+                    for table in ("patient_test_results", "patient_test", "patientpayment"):
+                        cur.execute(
+                            f"DELETE x FROM {table} x WHERE {key_column('x', table)} = ?",
+                            (key_param(table, patient_id),)
+                        )
+                    cur.execute("DELETE FROM patient WHERE Patient_Id = ?", (patient['patient_id'],))
+                    refresh_summary(cur, patient_id)
+                    
+                    con.commit()
+                report_cache.invalidate(patient_id)
                 
                 st.success("✅ Patient deleted successfully!")
                 st.session_state.current_page = "dashboard"
@@ -1157,7 +1046,6 @@ def delete_patient_confirmation():
                 st.rerun()
                 
             except Exception as e:
-                cur.execute("ROLLBACK TRANSACTION")
                 st.error(f"Database error: {str(e)}")
                 st.exception(e)
     
@@ -1177,255 +1065,12 @@ def receipt_preview():
         return
     
     data = st.session_state.last_saved
-    lab_info = data["lab_info"]
     
     st.title("🖨️ Patient Receipts")
     st.caption("Both receipts are designed for A4 paper (each takes half page vertically)")
     
-    all_tests = data['tests']
-    
-    # CUSTOMER RECEIPT HTML
-    customer_receipt_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @media print {{
-                body {{ margin: 0; padding: 0; }}
-                .receipt {{ width: 210mm; height: 148mm; page-break-after: always; }}
-            }}
-            .receipt {{
-                font-family: Arial, sans-serif;
-                width: 100%;
-                max-width: 210mm;
-                min-height: 148mm;
-                margin: 0 auto;
-                padding: 15px;
-                border: 2px solid #2c3e50;
-                background: #fff;
-                box-sizing: border-box;
-            }}
-            .header {{ text-align: center; margin-bottom: 10px; }}
-            .header h2 {{ color: #2c3e50; margin: 3px 0; font-size: 18px; }}
-            .header p {{ margin: 2px 0; font-size: 12px; }}
-            .divider {{ border-top: 1px dashed #2c3e50; margin: 8px 0; }}
-            .patient-info {{ margin: 8px 0; }}
-            .patient-info p {{ margin: 3px 0; font-size: 13px; }}
-            .tests-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 12px; }}
-            .tests-table th {{ background: #e8f4fc; padding: 4px; text-align: left; border-bottom: 1px solid #2c3e50; }}
-            .tests-table td {{ padding: 4px; border-bottom: 1px dashed #ccc; }}
-            .sub-test {{ color: #555; font-size: 11px; }}
-            .payment-table {{ width: 100%; margin-top: 5px; font-size: 13px; }}
-            .payment-table td {{ padding: 2px 0; }}
-            .balance-due {{ color: {'red' if data['balance'] > 0 else 'green'}; font-weight: bold; }}
-            .footer {{ text-align: center; margin-top: 10px; font-size: 11px; color: #7f8c8d; }}
-            .badge {{ background: #e8f4fc; padding: 2px 8px; border-radius: 3px; font-weight: bold; display: inline-block; margin-top: 5px; }}
-        </style>
-    </head>
-    <body>
-        <div class="receipt">
-            <div class="header">
-                <h2>{lab_info['name']}</h2>
-                <p>{lab_info['address']}</p>
-                <p>📞 {lab_info['phone']}</p>
-                <div class="divider"></div>
-                <h3>PATIENT RECEIPT</h3>
-                <div class="badge">CUSTOMER COPY</div>
-            </div>
-            
-            <div class="patient-info">
-                <p><strong>Lab No:</strong> {data['labno']}</p>
-                <p><strong>Patient No:</strong> {data['patient_no']}</p>
-                <p><strong>Date:</strong> {data['date']}</p>
-                <p><strong>Patient:</strong> {data['name']}</p>
-                <p><strong>Age/Sex:</strong> {data['age']} / {data['sex']}</p>
-                <p><strong>Mobile:</strong> {data['mobile']}</p>
-                <p><strong>Doctor:</strong> {data['doctor_name']}</p>
-                <p><strong>City:</strong> {data['city']}</p>
-            </div>
-            
-            <div class="divider"></div>
-            
-            <table class="tests-table">
-                <thead>
-                    <tr>
-                        <th>Test</th>
-                        <th style="text-align: right;">Amount</th>
-                    </tr>
-                </thead>
-                <tbody>
-    """
-    
-    for test in all_tests:
-        test_class = "sub-test" if test["is_sub"] else ""
-        customer_receipt_html += f"""
-                    <tr class="{test_class}">
-                        <td>{test['display_no']} {test['name']}</td>
-                        <td style="text-align: right;">Rs. {test['rate']:.2f}</td>
-                    </tr>
-        """
-    
-    customer_receipt_html += f"""
-                </tbody>
-            </table>
-            
-            <div class="divider"></div>
-            
-            <table class="payment-table">
-                <tr>
-                    <td><strong>Total Amount</strong></td>
-                    <td style="text-align: right;">Rs. {data['total']:.2f}</td>
-                </tr>
-                <tr>
-                    <td><strong>Discount</strong></td>
-                    <td style="text-align: right;">Rs. {data['discount']:.2f}</td>
-                </tr>
-                <tr>
-                    <td><strong>Amount Paid</strong></td>
-                    <td style="text-align: right;">Rs. {data['paid']:.2f}</td>
-                </tr>
-                <tr style="border-top: 2px solid #2c3e50;">
-                    <td><strong>Balance Due</strong></td>
-                    <td style="text-align: right;" class="balance-due">Rs. {data['balance']:.2f}</td>
-                </tr>
-            </table>
-            
-            <div class="divider"></div>
-            
-            <div class="footer">
-                <p>Thank you for your visit!</p>
-                <p>Results will be ready after {data['return_time'] or '5:00 PM'}</p>
-                <p style="margin-top: 8px; font-size: 10px;">This is a computer-generated receipt. No signature required.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    # LAB RECEIPT HTML
-    lab_receipt_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @media print {{
-                body {{ margin: 0; padding: 0; }}
-                .receipt {{ width: 210mm; height: 148mm; page-break-after: always; }}
-            }}
-            .receipt {{
-                font-family: Arial, sans-serif;
-                width: 100%;
-                max-width: 210mm;
-                min-height: 148mm;
-                margin: 0 auto;
-                padding: 15px;
-                border: 2px solid #e74c3c;
-                background: #fff;
-                box-sizing: border-box;
-            }}
-            .header {{ text-align: center; margin-bottom: 10px; }}
-            .header h2 {{ color: #e74c3c; margin: 3px 0; font-size: 18px; }}
-            .header p {{ margin: 2px 0; font-size: 12px; }}
-            .divider {{ border-top: 1px dashed #e74c3c; margin: 8px 0; }}
-            .patient-info {{ margin: 8px 0; }}
-            .patient-info p {{ margin: 3px 0; font-size: 13px; }}
-            .tests-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 12px; }}
-            .tests-table th {{ background: #fadbd8; padding: 4px; text-align: left; border-bottom: 1px solid #e74c3c; }}
-            .tests-table td {{ padding: 4px; border-bottom: 1px dashed #ccc; }}
-            .sub-test {{ color: #555; font-size: 11px; }}
-            .payment-table {{ width: 100%; margin-top: 5px; font-size: 13px; }}
-            .payment-table td {{ padding: 2px 0; }}
-            .balance-due {{ color: {'red' if data['balance'] > 0 else 'green'}; font-weight: bold; }}
-            .footer {{ text-align: center; margin-top: 10px; font-size: 11px; color: #7f8c8d; }}
-            .badge {{ background: #fadbd8; padding: 2px 8px; border-radius: 3px; font-weight: bold; color: #c0392b; display: inline-block; margin-top: 5px; }}
-        </style>
-    </head>
-    <body>
-        <div class="receipt">
-            <div class="header">
-                <h2>{lab_info['name']}</h2>
-                <p>{lab_info['address']}</p>
-                <p>📞 {lab_info['phone']}</p>
-                <div class="divider"></div>
-                <h3>PATIENT RECEIPT</h3>
-                <div class="badge">LAB COPY - INTERNAL USE</div>
-            </div>
-            
-            <div class="patient-info">
-                <p><strong>Lab No:</strong> {data['labno']}</p>
-                <p><strong>Patient No:</strong> {data['patient_no']}</p>
-                <p><strong>Date:</strong> {data['date']}</p>
-                <p><strong>Patient:</strong> {data['name']}</p>
-                <p><strong>Age/Sex:</strong> {data['age']} / {data['sex']}</p>
-                <p><strong>Mobile:</strong> {data['mobile']}</p>
-                <p><strong>Doctor:</strong> {data['doctor_name']}</p>
-                <p><strong>City:</strong> {data['city']}</p>
-                <p><strong>Address:</strong> {data['address']}</p>
-                <p><strong>Sample Source:</strong> {data['sample_source']}</p>
-                <p><strong>Entered By:</strong> {st.session_state.user['user_name']}</p>
-            </div>
-            
-            <div class="divider"></div>
-            
-            <table class="tests-table">
-                <thead>
-                    <tr>
-                        <th>Display No</th>
-                        <th>Test Name</th>
-                        <th style="text-align: right;">Amount</th>
-                    </tr>
-                </thead>
-                <tbody>
-    """
-    
-    for test in all_tests:
-        display_no = test['display_no'] if not test['is_sub'] else "Sub"
-        lab_receipt_html += f"""
-                    <tr class="{'sub-test' if test['is_sub'] else ''}">
-                        <td>{display_no}</td>
-                        <td>{test['name']}</td>
-                        <td style="text-align: right;">Rs. {test['rate']:.2f}</td>
-                    </tr>
-        """
-    
-    lab_receipt_html += f"""
-                </tbody>
-            </table>
-            
-            <div class="divider"></div>
-            
-            <table class="payment-table">
-                <tr>
-                    <td><strong>Total Amount</strong></td>
-                    <td style="text-align: right;">Rs. {data['total']:.2f}</td>
-                </tr>
-                <tr>
-                    <td><strong>Discount</strong></td>
-                    <td style="text-align: right;">Rs. {data['discount']:.2f}</td>
-                </tr>
-                <tr>
-                    <td><strong>Amount Paid</strong></td>
-                    <td style="text-align: right;">Rs. {data['paid']:.2f}</td>
-                </tr>
-                <tr style="border-top: 2px solid #e74c3c;">
-                    <td><strong>Balance Due</strong></td>
-                    <td style="text-align: right;" class="balance-due">Rs. {data['balance']:.2f}</td>
-                </tr>
-            </table>
-            
-            <div class="divider"></div>
-            
-            <div class="footer">
-                <p><strong>INTERNAL COPY - FOR LAB USE ONLY</strong></p>
-                <p>Results will be ready after {data['return_time'] or '5:00 PM'}</p>
-                <p style="margin-top: 8px; font-size: 10px;">Patient must present this receipt to collect reports. Balance must be cleared before report release.</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    # Both copies from the precompiled receipt templates (see receipts.py)
+    customer_receipt_html, lab_receipt_html = receipt_copies(data, st.session_state.user['user_name'])
     
     st.subheader("📄 Customer Copy (Top Half of A4)")
     st.components.v1.html(customer_receipt_html, height=550, scrolling=True)
@@ -1459,6 +1104,29 @@ def receipt_preview():
             use_container_width=True
         )
 
+    if PDF_AVAILABLE:
+        customer_pdf = html_to_pdf(customer_receipt_html)
+        lab_pdf = html_to_pdf(lab_receipt_html)
+        col1, col2, col3 = st.columns(3)
+        with col2:
+            if customer_pdf:
+                st.download_button(
+                    "📥 Download Customer Receipt (PDF)",
+                    customer_pdf,
+                    file_name=f"receipt_customer_lab{data['labno']}_patient{data['patient_no']}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
+        with col3:
+            if lab_pdf:
+                st.download_button(
+                    "📥 Download Lab Receipt (PDF)",
+                    lab_pdf,
+                    file_name=f"receipt_lab_lab{data['labno']}_patient{data['patient_no']}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
+
 # ============================================================================
 # REPORTS MENU SYSTEM (ADMINISTRATIVE REPORTS - NEW)
 # ============================================================================
@@ -1479,63 +1147,62 @@ def search_patient_receipt():
     
     if st.button("🔍 Search Receipt", type="primary", use_container_width=True):
         try:
-            con = get_connection()
-            cur = con.cursor()
+            # Lab info and pre-encoded logo from the branding cache
+            lab_info = get_branding()
             
-            # Get lab info
-            cur.execute("SELECT TOP 1 LabName, Address, PhoneNo, Pad_Logo FROM LabInfo")
-            lab_info = cur.fetchone()
-            
-            # Search patient
-            query = """
-                SELECT 
-                    p.Patient_Id, p.LabNo, p.PatientNo, p.Patient_Name, p.Age, p.Sex, 
-                    p.Mobile_No, p.Visit_Date, p.ReturnTime, p.City, p.Address,
-                    d.DoctorName AS Referred_By,
-                    pp.TotalAmount, pp.Discount, pp.AmountPaid,
-                    (ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) AS Balance
-                FROM patient p
-                LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
-                LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
-                WHERE 1=1
-            """
-            params = []
-            
-            if lab_no:
-                query += " AND p.LabNo = ?"
-                params.append(lab_no)
-            if patient_no:
-                query += " AND p.PatientNo = ?"
-                params.append(patient_no)
-            if visit_date:
-                query += " AND CAST(p.Visit_Date AS DATE) = ?"
-                params.append(visit_date)
-            
-            query += " ORDER BY p.Visit_Date DESC"
+            with get_connection() as con:
+                cur = con.cursor()
             
-            cur.execute(query, params)
-            patient = cur.fetchone()
+                # Search patient
+                query = f"""
+                    SELECT 
+                        p.Patient_Id, p.LabNo, p.PatientNo, p.Patient_Name, p.Age, p.Sex, 
+                        p.Mobile_No, p.Visit_Date, p.ReturnTime, p.City, p.Address,
+                        d.DoctorName AS Referred_By,
+                        pp.TotalAmount, pp.Discount, pp.AmountPaid,
+                        (ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) AS Balance
+                    FROM patient p
+                    LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+                    LEFT JOIN patientpayment pp ON {join_on("pp", "patientpayment")}
+                    WHERE 1=1
+                """
+                params = []
+            
+                if lab_no:
+                    query += " AND p.LabNo = ?"
+                    params.append(lab_no)
+                if patient_no:
+                    query += " AND p.PatientNo = ?"
+                    params.append(patient_no)
+                if visit_date:
+                    query += " AND p.Visit_Date >= ? AND p.Visit_Date < ?"
+                    params.extend(day_bounds(visit_date))
+            
+                query += " ORDER BY p.Visit_Date DESC"
+            
+                cur.execute(query, params)
+                patient = cur.fetchone()
+            
+                if not patient:
+                    st.warning("⚠️ No patient found with the provided criteria")
+                    return
             
-            if not patient:
-                st.warning("⚠️ No patient found with the provided criteria")
-                return
-            
-            # Get patient tests
-            cur.execute("""
-                SELECT 
-                    ti.Test_Display_No,
-                    t.Test_Name,
-                    ti.SRate
-                FROM patient_test pt
-                JOIN test_identity ti ON pt.Test_ID = ti.Id
-                JOIN test t ON ti.Id = t.Id
-                WHERE pt.PatientID = ?
-                ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50))
-            """, (patient.Patient_Id,))
-            tests = cur.fetchall()
+                # Get patient tests
+                cur.execute(f"""
+                    SELECT 
+                        ti.Test_Display_No,
+                        t.Test_Name,
+                        ti.SRate
+                    FROM patient_test pt
+                    JOIN test_identity ti ON pt.Test_ID = ti.Id
+                    JOIN test t ON ti.Id = t.Id
+                    WHERE {key_column("pt", "patient_test")} = ?
+                    ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50))
+                """, (key_param("patient_test", patient.Patient_Id),))
+                tests = cur.fetchall()
             
             # Generate dual receipt HTML
-            receipt_html = generate_dual_receipt_html(patient, tests, lab_info)
+            receipt_html = dual_receipt_html(patient, tests, lab_info)
             
             # Display receipt
             st.components.v1.html(receipt_html, height=800, scrolling=True)
@@ -1551,253 +1218,41 @@ def search_patient_receipt():
                     mime="text/html",
                     use_container_width=True
                 )
+                receipt_pdf = html_to_pdf(receipt_html) if PDF_AVAILABLE else None
+                if receipt_pdf:
+                    st.download_button(
+                        label="📥 Download Receipt (PDF)",
+                        data=receipt_pdf,
+                        file_name=f"Receipt_Lab{patient.LabNo}_{patient.PatientNo}_{visit_date}.pdf",
+                        mime="application/pdf",
+                        use_container_width=True
+                    )
+                
+                # Finalized lab report: re-print straight from the report store
+                finalized = finalized_reports.get_finalized(patient.Patient_Id)
+                if finalized:
+                    st.caption(f"🔒 Lab report finalized {finalized['finalized_at'].replace('T', ' ')}")
+                    st.download_button(
+                        label="🧾 Re-print Lab Report (HTML)",
+                        data=finalized_reports.read_html(finalized),
+                        file_name=report_file_name(patient.LabNo, patient.Patient_Id),
+                        mime="text/html",
+                        use_container_width=True
+                    )
+                    finalized_pdf = finalized_reports.read_pdf(finalized)
+                    if finalized_pdf:
+                        st.download_button(
+                            label="🧾 Re-print Lab Report (PDF)",
+                            data=finalized_pdf,
+                            file_name=report_file_name(patient.LabNo, patient.Patient_Id, "pdf"),
+                            mime="application/pdf",
+                            use_container_width=True
+                        )
                 
         except Exception as e:
             st.error(f"Error generating receipt: {str(e)}")
             st.exception(e)
 
-def generate_dual_receipt_html(patient, tests, lab_info):
-    # Format tests list
-    tests_list = ", ".join([f"{t.Test_Name}" for t in tests]) if tests else "No tests recorded"
-    
-    # Format amounts
-    total = patient.TotalAmount if patient.TotalAmount else 0
-    discount = patient.Discount if patient.Discount else 0
-    paid = patient.AmountPaid if patient.AmountPaid else 0
-    balance = patient.Balance if patient.Balance else 0
-    
-    # Format dates
-    visit_date = patient.Visit_Date.strftime('%d-%b-%Y') if patient.Visit_Date else ""
-    return_time = patient.ReturnTime.strftime('%I:%M %p') if patient.ReturnTime else "N/A"
-    
-    # Lab logo handling
-    logo_html = ""
-    if lab_info and lab_info[3]:  # Pad_Logo exists
-        try:
-            logo_base64 = base64.b64encode(lab_info[3]).decode('utf-8')
-            logo_html = f'<img src="data:image/png;base64,{logo_base64}" style="max-height:40px; max-width:150px;">'
-        except:
-            logo_html = f"<h3>{lab_info[0]}</h3>"
-    elif lab_info:
-        logo_html = f"<h3>{lab_info[0]}</h3>"
-    
-    # Generate SINGLE PAGE with TWO RECEIPTS (TOP + BOTTOM)
-    receipt_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <title>Receipt - Lab No: {patient.LabNo}</title>
-        <style>
-            @media print {{
-                body {{ margin: 0; padding: 0; }}
-                .receipt-page {{ width: 210mm; height: 297mm; margin: 0; padding: 0; }}
-                .receipt {{ page-break-inside: avoid; }}
-            }}
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 0;
-                padding: 0;
-                background: #f5f7fa;
-            }}
-            .receipt-page {{
-                width: 210mm;
-                height: 297mm;
-                margin: 10mm auto;
-                background: white;
-                box-shadow: 0 0 10px rgba(0,0,0,0.1);
-            }}
-            .receipt {{
-                width: 190mm;
-                margin: 10mm;
-                padding: 15px;
-                border: 1px solid #000;
-            }}
-            .receipt-top {{
-                border-bottom: 1px dashed #000;
-                padding-bottom: 10px;
-                margin-bottom: 10px;
-            }}
-            .receipt-bottom {{
-                padding-top: 10px;
-                margin-top: 10px;
-            }}
-            .header {{
-                text-align: center;
-                margin-bottom: 10px;
-            }}
-            .header h2 {{
-                margin: 3px 0;
-                font-size: 18px;
-                color: #2c3e50;
-            }}
-            .header p {{
-                margin: 2px 0;
-                font-size: 12px;
-            }}
-            .receipt-info {{
-                display: flex;
-                justify-content: space-between;
-                font-size: 13px;
-                margin: 8px 0;
-            }}
-            .patient-info {{
-                margin: 10px 0;
-                font-size: 13px;
-            }}
-            .patient-info p {{
-                margin: 3px 0;
-            }}
-            .tests-list {{
-                margin: 10px 0;
-                font-size: 12px;
-                line-height: 1.4;
-            }}
-            .payment-summary {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 15px 0;
-                font-size: 13px;
-            }}
-            .payment-summary td {{
-                padding: 4px 8px;
-                border-bottom: 1px solid #000;
-            }}
-            .payment-summary tr:last-child td {{
-                border-top: 2px solid #000;
-                font-weight: bold;
-            }}
-            .balance-due {{
-                color: {'red' if balance > 0 else 'green'};
-                font-weight: bold;
-            }}
-            .footer {{
-                text-align: center;
-                margin-top: 15px;
-                font-size: 11px;
-                color: #7f8c8d;
-            }}
-            .badge {{
-                background: #e8f4fc;
-                padding: 2px 8px;
-                border-radius: 3px;
-                font-weight: bold;
-                display: inline-block;
-                margin-top: 5px;
-                font-size: 12px;
-            }}
-            .lab-badge {{
-                background: #fadbd8;
-                color: #c0392b;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="receipt-page">
-            <!-- TOP RECEIPT (CUSTOMER COPY) -->
-            <div class="receipt receipt-top">
-                <div class="header">
-                    {logo_html}
-                    <p>{lab_info[1] if lab_info else ''}<br>📞 {lab_info[2] if lab_info else ''}</p>
-                    <div class="badge">CUSTOMER COPY</div>
-                </div>
-                <div class="receipt-info">
-                    <div><strong>Lab No:</strong> {patient.LabNo}</div>
-                    <div><strong>Date:</strong> {visit_date}</div>
-                    <div><strong>Receipt No:</strong> {patient.PatientNo}</div>
-                </div>
-                <div class="patient-info">
-                    <p><strong>Patient:</strong> {patient.Patient_Name}</p>
-                    <p><strong>Age/Sex:</strong> {patient.Age} / {patient.Sex}</p>
-                    <p><strong>Mobile:</strong> {patient.Mobile_No or 'N/A'}</p>
-                    <p><strong>City:</strong> {patient.City or 'N/A'}</p>
-                    <p><strong>Referred by:</strong> {patient.Referred_By or 'N/A'}</p>
-                    <p><strong>Delivery:</strong> {visit_date} {return_time}</p>
-                </div>
-                <div class="tests-list">
-                    <strong>Tests Performed:</strong><br>
-                    {tests_list}
-                </div>
-                <table class="payment-summary">
-                    <tr>
-                        <td><strong>Total</strong></td>
-                        <td style="text-align: right;">Rs. {total:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Discount</strong></td>
-                        <td style="text-align: right;">Rs. {discount:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Paid</strong></td>
-                        <td style="text-align: right;">Rs. {paid:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Balance</strong></td>
-                        <td style="text-align: right;" class="balance-due">Rs. {balance:,.2f}</td>
-                    </tr>
-                </table>
-                <div class="footer">
-                    <p>Received with thanks the sum of Rs. {paid:,.2f} in Cash</p>
-                    <p style="margin-top: 8px; font-size: 10px;">Note: Computer generated receipt. No signature required.</p>
-                </div>
-            </div>
-            
-            <!-- BOTTOM RECEIPT (LAB COPY) -->
-            <div class="receipt receipt-bottom">
-                <div class="header">
-                    {logo_html}
-                    <p>{lab_info[1] if lab_info else ''}<br>📞 {lab_info[2] if lab_info else ''}</p>
-                    <div class="badge lab-badge">LAB COPY</div>
-                </div>
-                <div class="receipt-info">
-                    <div><strong>Lab No:</strong> {patient.LabNo}</div>
-                    <div><strong>Date:</strong> {visit_date}</div>
-                    <div><strong>Receipt No:</strong> {patient.PatientNo}</div>
-                </div>
-                <div class="patient-info">
-                    <p><strong>Patient:</strong> {patient.Patient_Name}</p>
-                    <p><strong>Age/Sex:</strong> {patient.Age} / {patient.Sex}</p>
-                    <p><strong>Mobile:</strong> {patient.Mobile_No or 'N/A'}</p>
-                    <p><strong>City:</strong> {patient.City or 'N/A'}</p>
-                    <p><strong>Address:</strong> {patient.Address or 'N/A'}</p>
-                    <p><strong>Referred by:</strong> {patient.Referred_By or 'N/A'}</p>
-                    <p><strong>Delivery:</strong> {visit_date} {return_time}</p>
-                </div>
-                <div class="tests-list">
-                    <strong>Tests Performed:</strong><br>
-                    {tests_list}
-                </div>
-                <table class="payment-summary">
-                    <tr>
-                        <td><strong>Total</strong></td>
-                        <td style="text-align: right;">Rs. {total:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Discount</strong></td>
-                        <td style="text-align: right;">Rs. {discount:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Paid</strong></td>
-                        <td style="text-align: right;">Rs. {paid:,.2f}</td>
-                    </tr>
-                    <tr>
-                        <td><strong>Balance</strong></td>
-                        <td style="text-align: right;" class="balance-due">Rs. {balance:,.2f}</td>
-                    </tr>
-                </table>
-                <div class="footer">
-                    <p><strong>INTERNAL USE ONLY</strong></p>
-                    <p>Results ready after {return_time}. Balance must be cleared before report release.</p>
-                    <p style="margin-top: 8px; font-size: 10px;">Note: Computer generated receipt. No signature required.</p>
-                </div>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    
-    return receipt_html
-
 # -----------------------------
 # REPORT 2: DAILY PAYMENT DETAIL
 # -----------------------------
@@ -1816,35 +1271,9 @@ def daily_payment_detail_report():
     
     if st.button("📊 Generate Report", type="primary", use_container_width=True):
         try:
-            con = get_connection()
-            
-            # Main patient payment data (SQL Server 2012 compatible)
-            df = pd.read_sql("""
-                SELECT 
-                    p.PatientNo AS [Pat#],
-                    p.LabNo AS [Lab#],
-                    p.Patient_Name AS [Patient Name],
-                    STUFF((
-                        SELECT ', ' + t2.Test_Name
-                        FROM patient_test pt2
-                        JOIN test t2 ON pt2.Test_ID = t2.Test_Id
-                        WHERE pt2.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
-                        FOR XML PATH(''), TYPE
-                    ).value('.', 'NVARCHAR(MAX)'), 1, 2, '') AS Tests,
-                    CONVERT(VARCHAR, p.Visit_Date, 106) AS [Visit Date],
-                    CONVERT(VARCHAR(15), p.Visit_Date, 100) AS [Visit Time],
-                    ISNULL(d.DoctorName, 'N/A') AS [Referred By],
-                    ISNULL(pp.TotalAmount, 0) AS Total,
-                    ISNULL(pp.Discount, 0) AS Discount,
-                    ISNULL(pp.AmountPaid, 0) AS Paid,
-                    (ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) AS Due
-                FROM patient p
-                LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
-                LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
-                WHERE CAST(p.Visit_Date AS DATE) BETWEEN ? AND ?
-                  AND p.LabNo BETWEEN ? AND ?
-                ORDER BY p.LabNo
-            """, con, params=[from_date, to_date, from_lab, to_lab])
+            # Detail rows, previous due and monthly sale run concurrently (see daily_payment.py)
+            data = daily_payment_data(from_date, to_date, from_lab, to_lab)
+            df = data["rows"]
             
             if df.empty:
                 st.warning("⚠️ No payment records found for the selected criteria")
@@ -1855,28 +1284,8 @@ def daily_payment_detail_report():
             total_discount = df['Discount'].sum()
             total_paid = df['Paid'].sum()
             total_due = df['Due'].sum()
-            
-            # Previous due calculation
-            prev_due_query = """
-                SELECT ISNULL(SUM(ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)), 0) AS PrevDue
-                FROM patient p
-                LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
-                WHERE CAST(p.Visit_Date AS DATE) < ?
-                  AND (ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) > 0
-            """
-            prev_due_df = pd.read_sql(prev_due_query, con, params=[from_date])
-            prev_due = prev_due_df['PrevDue'].iloc[0] if not prev_due_df.empty else 0
-            
-            # Monthly sale calculation
-            month_start = datetime(to_date.year, to_date.month, 1)
-            monthly_query = """
-                SELECT ISNULL(SUM(ISNULL(pp.AmountPaid,0)), 0) AS MonthlySale
-                FROM patient p
-                LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
-                WHERE CAST(p.Visit_Date AS DATE) BETWEEN ? AND ?
-            """
-            monthly_df = pd.read_sql(monthly_query, con, params=[month_start, to_date])
-            monthly_sale = monthly_df['MonthlySale'].iloc[0] if not monthly_df.empty else 0
+            prev_due = data["prev_due"]
+            monthly_sale = data["monthly_sale"]
             
             # Display report header (EXACTLY LIKE YOUR PDF)
             st.markdown(f"""
@@ -1940,6 +1349,12 @@ def daily_payment_detail_report():
             with col2:
                 st.metric("TOTAL MONTHLY SALE", f"Rs. {monthly_sale:,.2f}", delta=None, delta_color="off")
             
+            timings = data["timings"]
+            st.caption(
+                f"⏱️ Generated in {data['elapsed_ms']:,.0f} ms - detail {timings['detail']:,.0f} ms, "
+                f"previous due {timings['previous_due']:,.0f} ms, monthly sale {timings['monthly_sale']:,.0f} ms"
+            )
+            
             # Download button
             st.markdown("---")
             csv = df.to_csv(index=False).encode('utf-8')
@@ -1970,8 +1385,7 @@ def doctor_wise_patient_report():
     with col3:
         # Get doctor list
         try:
-            con = get_connection()
-            doctor_df = pd.read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName", con)
+            doctor_df = read_sql("SELECT DoctorID, DoctorName FROM doctor ORDER BY DoctorName")
             doctor_list = ["All Doctors"] + doctor_df['DoctorName'].tolist()
         except:
             doctor_list = ["All Doctors"]
@@ -1980,31 +1394,24 @@ def doctor_wise_patient_report():
     
     if st.button("📊 Generate Report", type="primary", use_container_width=True):
         try:
-            con = get_connection()
-            
-            # Build query with optional doctor filter
-            query = """
+            # Build query with optional doctor filter (tests and amounts from the order summary)
+            summary_join, col = summary_source()
+            query = f"""
                 SELECT 
                     d.DoctorName AS [Doctor Name],
                     p.Patient_Name AS [Patient Name],
                     CONVERT(VARCHAR, p.Visit_Date, 106) AS [Date],
-                    STUFF((
-                        SELECT ', ' + t2.Test_Name
-                        FROM patient_test pt2
-                        JOIN test t2 ON pt2.Test_ID = t2.Test_Id
-                        WHERE pt2.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
-                        FOR XML PATH(''), TYPE
-                    ).value('.', 'NVARCHAR(MAX)'), 1, 2, '') AS Tests,
-                    ISNULL(pp.TotalAmount, 0) AS Total,
-                    ISNULL(pp.Discount, 0) AS Discount,
-                    ISNULL(pp.AmountPaid, 0) AS Paid,
-                    (ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) AS Due
+                    {col["tests"]} AS Tests,
+                    {col["total"]} AS Total,
+                    {col["discount"]} AS Discount,
+                    {col["paid"]} AS Paid,
+                    {col["due"]} AS Due
                 FROM patient p
                 JOIN doctor d ON p.Refered_By = d.DoctorID
-                LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
-                WHERE CAST(p.Visit_Date AS DATE) BETWEEN ? AND ?
+                {summary_join}
+                WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
             """
-            params = [from_date, to_date]
+            params = [*day_bounds(from_date, to_date)]
             
             if doctor_filter != "All Doctors":
                 query += " AND d.DoctorName = ?"
@@ -2012,7 +1419,7 @@ def doctor_wise_patient_report():
             
             query += " ORDER BY d.DoctorName, p.Visit_Date DESC"
             
-            df = pd.read_sql(query, con, params=params)
+            df = read_sql(query, params=params)
             
             if df.empty:
                 st.warning("⚠️ No patient records found for the selected criteria")
@@ -2120,23 +1527,21 @@ def top_test_report():
     
     if st.button("📊 Generate Report", type="primary", use_container_width=True):
         try:
-            con = get_connection()
-            
             # Get top tests by count and revenue (SQL Server 2012 compatible)
-            df = pd.read_sql("""
+            df = read_sql(f"""
                 SELECT 
                     t.Test_Name AS [Test Name],
                     COUNT(pt.Test_ID) AS [Count],
                     SUM(ti.SRate) AS [Total Amount],
                     AVG(ti.SRate) AS [Avg Rate]
                 FROM patient_test pt
-                JOIN patient p ON pt.PatientID = p.Patient_Id
+                JOIN patient p ON {join_on("pt", "patient_test")}
                 JOIN test t ON pt.Test_ID = t.Test_Id
                 JOIN test_identity ti ON t.Id = ti.Id
-                WHERE CAST(p.Visit_Date AS DATE) BETWEEN ? AND ?
+                WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
                 GROUP BY t.Test_Name
                 ORDER BY [Count] DESC
-            """, con, params=[from_date, to_date])
+            """, params=[*day_bounds(from_date, to_date)])
             
             if df.empty:
                 st.warning("⚠️ No test records found for the selected date range")
@@ -2216,6 +1621,101 @@ def top_test_report():
             st.error(f"Error generating report: {str(e)}")
             st.exception(e)
 
+# -----------------------------
+# REPORT 5: BATCH LAB REPORTS
+# -----------------------------
+def batch_lab_reports():
+    st.subheader("🖨️ Batch Lab Reports")
+    st.caption("Every patient of the day (or a Lab No range) in one print document or ZIP")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        from_date = st.date_input("From Date", value=datetime.today(), key="batch_from_date")
+    with col2:
+        to_date = st.date_input("To Date", value=datetime.today(), key="batch_to_date")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        use_lab_range = st.checkbox("Limit to Lab No range", key="batch_use_lab_range")
+    with col2:
+        from_lab = st.number_input("From Lab No", min_value=1, step=1, value=1,
+                                   disabled=not use_lab_range, key="batch_from_lab")
+    with col3:
+        to_lab = st.number_input("To Lab No", min_value=1, step=1, value=9999,
+                                 disabled=not use_lab_range, key="batch_to_lab")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        outputs = ["Combined print document (HTML)", "ZIP of reports"]
+        if PDF_AVAILABLE:
+            outputs.append("ZIP of PDF reports")
+        output = st.radio("Output", outputs, horizontal=True, key="batch_output")
+    with col2:
+        ready_only = st.checkbox("Only patients with results", value=True, key="batch_ready_only")
+
+    if st.button("🖨️ Generate Reports", type="primary", use_container_width=True):
+        try:
+            progress_bar = st.progress(0.0, text="Fetching patients...")
+
+            def on_progress(done, total):
+                progress_bar.progress(done / total, text=f"Rendered {done} of {total} reports")
+
+            batch = batch_reports.generate_batch(
+                from_date, to_date,
+                from_lab=int(from_lab) if use_lab_range else None,
+                to_lab=int(to_lab) if use_lab_range else None,
+                ready_only=ready_only,
+                output="pdf" if output.endswith("PDF reports") else "zip" if output.startswith("ZIP") else "combined",
+                progress=on_progress,
+            )
+            progress_bar.progress(1.0, text="Done")
+
+            if batch["count"] == 0:
+                st.warning("⚠️ No patients with reports found for the selected range")
+                return
+
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("REPORTS", f"{batch['count']:,}")
+            with col2:
+                st.metric("REPORTS / SEC", f"{batch['reports_per_sec']:.1f}",
+                          delta=f"target {batch_reports.TARGET_REPORTS_PER_SEC:.0f}", delta_color="off")
+            with col3:
+                st.metric("FETCH", f"{batch['fetch_ms']:,.0f} ms")
+            with col4:
+                st.metric("RENDER", f"{batch['render_ms']:,.0f} ms")
+
+            if batch["pages"] is not None:
+                st.caption(f"PDF: {batch['pages']:,} pages in {batch['pdf_ms']:,.0f} ms "
+                           f"({batch['pages_per_sec']:.1f} pages/sec)")
+                if batch["failed"]:
+                    st.warning(f"⚠️ {len(batch['failed'])} PDF(s) could not be rendered and are not in the ZIP: "
+                               f"{', '.join(batch['failed'])}")
+                workers = pd.DataFrame(worker_stats())
+                if not workers.empty:
+                    st.dataframe(
+                        workers.rename(columns={
+                            "pid": "Worker", "documents": "Documents", "pages": "Pages",
+                            "pages_per_sec": "Pages/sec", "peak_rss_mb": "Peak Memory (MB)",
+                        }),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+            is_zip = batch["file_name"].endswith(".zip")
+            st.download_button(
+                "💾 Download Reports",
+                batch["content"],
+                batch["file_name"],
+                "application/zip" if is_zip else "text/html",
+                use_container_width=True,
+                type="primary"
+            )
+
+        except Exception as e:
+            st.error(f"Error generating batch reports: {str(e)}")
+            st.exception(e)
+
 # -----------------------------
 # REPORTS MENU SYSTEM (NEW - MATCHES YOUR PDF SAMPLES)
 # -----------------------------
@@ -2224,8 +1724,8 @@ def reports_menu():
     st.caption(f"User: {st.session_state.user['user_name']} | Lab: {st.session_state.lab_info['name']}")
     st.divider()
     
-    # Report selection buttons (4 columns matching your requirements)
-    col1, col2, col3, col4 = st.columns(4)
+    # Report selection buttons
+    col1, col2, col3, col4, col5 = st.columns(5)
     
     with col1:
         if st.button("🔍 Search Patient\nReceipt", use_container_width=True,
@@ -2259,6 +1759,14 @@ def reports_menu():
             st.session_state.report_params = {}
             st.rerun()
     
+    with col5:
+        if st.button("🖨️ Batch Lab\nReports", use_container_width=True,
+                    type="primary" if st.session_state.selected_report == "batch_reports" else "secondary",
+                    help="Print all of a day's lab reports as one document or ZIP"):
+            st.session_state.selected_report = "batch_reports"
+            st.session_state.report_params = {}
+            st.rerun()
+    
     st.divider()
     
     # Render selected report
@@ -2270,6 +1778,8 @@ def reports_menu():
         doctor_wise_patient_report()
     elif st.session_state.selected_report == "top_test":
         top_test_report()
+    elif st.session_state.selected_report == "batch_reports":
+        batch_lab_reports()
     else:
         st.info("👈 Select a report type from the options above to get started")
 
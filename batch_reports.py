@@ -0,0 +1,218 @@
+"""
+Batch Lab Report Generation
+Features: all patients of a date / Lab No range fetched with three set-based queries, report
+data built from the in-memory catalog, HTML rendered in a process (or thread) pool, output as
+one combined print document, a ZIP of HTML or a ZIP of PDFs (pdf_render worker pool), with
+progress callbacks and a measured reports/second
+"""
+import io
+import os
+import re
+import time
+import logging
+import zipfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import reports
+from db import get_connection, day_bounds
+from catalog import get_catalog
+from patient_keys import join_on
+import pdf_render
+
+log = logging.getLogger("lab.batch_reports")
+
+# An evening run is 200-400 reports; below this rate the batch is logged as slow
+TARGET_REPORTS_PER_SEC = 20.0
+
+# Reports handed to a pool worker per task (amortises pickling / scheduling)
+RENDER_CHUNK = 16
+
+_BODY = re.compile(r"<body[^>]*>(.*)</body>", re.IGNORECASE | re.DOTALL)
+_HEAD = re.compile(r"^(.*?<body[^>]*>)", re.IGNORECASE | re.DOTALL)
+
+
+# -----------------------------
+# SET-BASED FETCH
+# -----------------------------
+def _filter_sql(from_lab, to_lab):
+    sql = "p.Visit_Date >= ? AND p.Visit_Date < ?"
+    if from_lab is not None and to_lab is not None:
+        sql += " AND p.LabNo BETWEEN ? AND ?"
+    return sql
+
+
+def fetch_batch(from_date, to_date=None, from_lab=None, to_lab=None):
+    """
+    Rows for every patient in the range with three queries (patients, ordered tests, results).
+
+    Returns {Patient_Id: (patient_row, [Test_ID], [(Test_No, Test_Values, Remarks)])}
+    in LabNo order; rows are plain tuples (picklable).
+    """
+    where = _filter_sql(from_lab, to_lab)
+    params = [*day_bounds(from_date, to_date)]
+    if from_lab is not None and to_lab is not None:
+        params += [from_lab, to_lab]
+
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SELECT
+                p.Patient_Id, p.LabNo, p.PatientNo, p.Patient_Name, p.Age, p.Sex,
+                p.Mobile_No, p.City, p.Address, p.Visit_Date, d.DoctorName
+            FROM patient p
+            LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+            WHERE {where}
+            ORDER BY p.LabNo, p.Patient_Id
+        """, params)
+        batch = {row[0]: (tuple(row[1:]), [], []) for row in cur.fetchall()}
+
+        cur.execute(f"""
+            SELECT p.Patient_Id, pt.Test_ID
+            FROM patient_test pt
+            JOIN patient p ON {join_on("pt", "patient_test")}
+            WHERE {where}
+        """, params)
+        for patient_id, test_id in cur.fetchall():
+            if patient_id in batch:
+                batch[patient_id][1].append(test_id)
+
+        cur.execute(f"""
+            SELECT p.Patient_Id, ptr.Test_No, ptr.Test_Values, ptr.Remarks
+            FROM patient_test_results ptr
+            JOIN patient p ON {join_on("ptr", "patient_test_results")}
+            WHERE {where}
+            ORDER BY ptr.Result_id
+        """, params)
+        for patient_id, test_no, test_values, remarks in cur.fetchall():
+            if patient_id in batch:
+                batch[patient_id][2].append((test_no, test_values, remarks))
+    return batch
+
+
+# -----------------------------
+# RENDERING
+# -----------------------------
+def _render_chunk(items):
+    """Pool task: [(patient_id, report_data)] -> [(patient_id, html)]"""
+    return [(patient_id, reports.generate_standard_report_html(data)) for patient_id, data in items]
+
+
+def _render(items, executor, max_workers, progress):
+    """Render report data in a pool; returns {patient_id: html}"""
+    chunks = [items[i:i + RENDER_CHUNK] for i in range(0, len(items), RENDER_CHUNK)]
+    if executor == "process":
+        # spawn: the app is threaded, so fork is unsafe (see pdf_render.PdfPool)
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+    rendered = {}
+    with pool:
+        futures = [pool.submit(_render_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            rendered.update(future.result())
+            if progress:
+                progress(len(rendered), len(items))
+    return rendered
+
+
+def combine_html(documents):
+    """One printable document: the first report's <head> once, every body on its own page"""
+    if not documents:
+        return ""
+    head = _HEAD.match(documents[0])
+    pages = []
+    for doc in documents:
+        body = _BODY.search(doc)
+        pages.append(body.group(1) if body else doc)
+    separator = '\n<div style="page-break-after: always;"></div>\n'
+    return (head.group(1) if head else "<html><body>") + separator.join(pages) + "\n</body>\n</html>"
+
+
+def zip_reports(named_documents):
+    """ZIP bytes of {file name: html text or PDF bytes}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, html in named_documents.items():
+            archive.writestr(name, html)
+    return buffer.getvalue()
+
+
+# -----------------------------
+# PUBLIC API
+# -----------------------------
+def generate_batch(from_date, to_date=None, from_lab=None, to_lab=None, ready_only=True,
+                   output="combined", executor="process", max_workers=None, progress=None):
+    """
+    Render the reports of every patient in a date (and optional Lab No) range.
+
+    Args:
+        ready_only: skip patients without any result row
+        output: "combined" (one HTML document, a page per report), "zip" (HTML files)
+                or "pdf" (ZIP of PDF files, needs WeasyPrint)
+        executor: "process" or "thread" pool for HTML rendering
+        progress: optional callable(done, total) called as reports finish
+
+    Returns:
+        dict with content (str for combined, bytes for zip), file_name, count,
+        fetch_ms, build_ms, render_ms, elapsed_ms, reports_per_sec
+        (+ pdf_ms, pages, pages_per_sec and failed - file names left out of the ZIP -
+        for PDF output)
+    """
+    started = time.perf_counter()
+    batch = fetch_batch(from_date, to_date, from_lab, to_lab)
+    fetched = time.perf_counter()
+
+    cat = get_catalog()
+    items = []
+    for patient_id, (patient_row, test_ids, result_rows) in batch.items():
+        if ready_only and not result_rows:
+            continue
+        items.append((patient_id, reports.build_report_data(patient_row, test_ids, result_rows, cat)))
+    built = time.perf_counter()
+
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    try:
+        rendered = _render(items, executor, max_workers, progress) if items else {}
+    except BrokenProcessPool:
+        log.warning("Process pool unavailable; rendering the batch in threads")
+        rendered = _render(items, "thread", max_workers, progress)
+    finished = time.perf_counter()
+
+    ordered = [patient_id for patient_id, _ in items]    # LabNo order
+    label = f"{from_date}" if not to_date or to_date == from_date else f"{from_date}_to_{to_date}"
+    pdf_stats = {}
+    if output == "pdf":
+        names = {pid: reports.report_file_name(batch[pid][0][0], pid, "pdf") for pid in ordered}
+        pdf_stats = pdf_render.render_many({names[pid]: rendered[pid] for pid in ordered}, progress)
+        content = zip_reports({names[pid]: pdf_stats["pdfs"][names[pid]] for pid in ordered
+                               if names[pid] in pdf_stats["pdfs"]})
+        file_name = f"LabReports_{label}_pdf.zip"
+    elif output == "zip":
+        content = zip_reports({reports.report_file_name(batch[pid][0][0], pid): rendered[pid] for pid in ordered})
+        file_name = f"LabReports_{label}.zip"
+    else:
+        content = combine_html([rendered[pid] for pid in ordered])
+        file_name = f"LabReports_{label}.html"
+
+    elapsed = time.perf_counter() - started
+    rate = len(items) / elapsed if elapsed > 0 and items else 0.0
+    if items and rate < TARGET_REPORTS_PER_SEC:
+        log.warning("Batch of %d reports ran at %.1f reports/s (target %.0f)",
+                    len(items), rate, TARGET_REPORTS_PER_SEC)
+
+    return {
+        "content": content,
+        "file_name": file_name,
+        "count": len(items),
+        "fetch_ms": (fetched - started) * 1000,
+        "build_ms": (built - fetched) * 1000,
+        "render_ms": (finished - built) * 1000,
+        "elapsed_ms": elapsed * 1000,
+        "reports_per_sec": rate,
+        "pdf_ms": pdf_stats.get("elapsed_ms"),
+        "pages": pdf_stats.get("pages"),
+        "pages_per_sec": pdf_stats.get("pages_per_sec"),
+        "failed": pdf_stats.get("failed", []),
+    }
@@ -0,0 +1,903 @@
+"""
+Legacy Report / Receipt Renderers (frozen)
+Features: the f-string and += HTML assembly of the lab report, the registration receipts and
+the dual receipt as it was just before templates.py, kept only as the baseline for
+benchmarks/template_benchmark.py - do not use from the app. QR codes come from the current
+qr_codes helpers, as in the templates, so the comparison covers HTML assembly only; the QR
+change itself is measured by benchmarks/qr_benchmark.py
+"""
+from qr_codes import QR_AVAILABLE, qr_svg, qr_svg_data_uri
+
+
+def legacy_standard_report_html(report_data):
+    """Report showing ONLY sub-tests grouped under main test headers"""
+    patient = report_data["patient"]
+    test_groups = report_data["tests"]
+    report_time = report_data["report_generated"]
+    
+    # QR code as SVG, cached per payload (the payload identifies the report, not the render time)
+    qr_data = f"Lab:{patient['lab_name']}|LabNo:{patient['lab_no']}|Patient:{patient['name']}|Date:{patient['visit_date']}"
+    qr_src = qr_svg_data_uri(qr_data) if QR_AVAILABLE else None
+    
+    # Build HTML report
+    html = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Test Report - Lab No: {patient['lab_no']}</title>
+    <style>
+        @media print {{
+            body {{ margin: 0; padding: 0; }}
+            .report {{ width: 210mm; min-height: 297mm; padding: 10mm; }}
+            .no-print {{ display: none; }}
+        }}
+        * {{ box-sizing: border-box; }}
+        body {{
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            margin: 0;
+            padding: 0;
+            color: #333;
+            line-height: 1.4;
+        }}
+        .report {{
+            width: 210mm;
+            min-height: 297mm;
+            margin: 10mm auto;
+            background: white;
+            padding: 15px;
+            position: relative;
+            box-shadow: 0 0 10px rgba(0,0,0,0.1);
+        }}
+        .header {{
+            display: flex;
+            justify-content: space-between;
+            align-items: flex-start;
+            border-bottom: 2px solid #2c3e50;
+            padding-bottom: 8px;
+            margin-bottom: 12px;
+        }}
+        .logo-section {{
+            display: flex;
+            align-items: center;
+        }}
+        .logo-img {{
+            max-height: 50px;
+            max-width: 160px;
+            object-fit: contain;
+        }}
+        .lab-info {{
+            margin-left: 12px;
+        }}
+        .lab-name {{
+            font-size: 20px;
+            color: #2c3e50;
+            font-weight: bold;
+            margin: 2px 0;
+        }}
+        .lab-address {{
+            font-size: 12px;
+            color: #555;
+            line-height: 1.3;
+        }}
+        .report-title {{
+            font-size: 19px;
+            color: #e74c3c;
+            text-align: center;
+            margin: 6px 0 4px;
+            font-weight: bold;
+        }}
+        .report-subtitle {{
+            text-align: center;
+            color: #7f8c8d;
+            font-size: 13px;
+            margin-bottom: 12px;
+            font-weight: 500;
+        }}
+        .patient-section {{
+            display: flex;
+            justify-content: space-between;
+            background: #f8f9fa;
+            border-radius: 6px;
+            padding: 10px;
+            margin-bottom: 12px;
+            border: 1px solid #e9ecef;
+            font-size: 12px;
+        }}
+        .patient-details {{
+            flex: 1;
+            display: grid;
+            grid-template-columns: repeat(4, 1fr);
+            gap: 3px 8px;
+        }}
+        .patient-item {{
+            margin: 1px 0;
+        }}
+        .patient-label {{
+            font-weight: 600;
+            color: #2c3e50;
+            display: inline-block;
+            width: 65px;
+            font-size: 11px;
+        }}
+        .patient-value {{
+            color: #2c3e50;
+            font-weight: 500;
+            font-size: 11px;
+        }}
+        .qr-container {{
+            text-align: right;
+            flex: 0 0 100px;
+            padding-left: 8px;
+            border-left: 1px dashed #ccc;
+        }}
+        .qr-code {{
+            width: 90px;
+            height: 90px;
+            border: 2px solid white;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+            margin: 0 auto;
+        }}
+        .qr-label {{
+            font-size: 9px;
+            color: #7f8c8d;
+            margin-top: 4px;
+            font-weight: 500;
+        }}
+        .tests-container {{
+            width: 100%;
+            margin-top: 10px;
+        }}
+        .tests-table {{
+            width: 100%;
+            border-collapse: collapse;
+            font-size: 12px;
+        }}
+        .tests-table th {{
+            background: #2c3e50;
+            color: white;
+            padding: 8px 10px;
+            text-align: left;
+            font-weight: 600;
+        }}
+        .tests-table td {{
+            padding: 7px 10px;
+            border-bottom: 1px solid #e9ecef;
+        }}
+        .tests-table tr:nth-child(even) {{
+            background: #f9fbfd;
+        }}
+        .tests-table tr:hover {{
+            background: #e8f4fc;
+        }}
+        .section-header {{
+            font-weight: bold;
+            font-size: 14px;
+            color: #2980b9;
+            padding: 6px 0;
+            background: #f1f8ff;
+        }}
+        .result-value {{
+            font-weight: 600;
+            color: #27ae60;
+            font-size: 13px;
+        }}
+        .abnormal {{
+            color: #e74c3c !important;
+            text-decoration: underline wavy #e74c3c;
+            font-weight: 600;
+        }}
+        .unit {{
+            color: #7f8c8d;
+            font-style: italic;
+            margin-left: 3px;
+            font-size: 11px;
+        }}
+        .reference-range {{
+            color: #e67e22;
+            background: #fff9f0;
+            padding: 1px 5px;
+            border-radius: 2px;
+            display: inline-block;
+            font-size: 11px;
+            margin-top: 1px;
+        }}
+        .footer {{
+            text-align: center;
+            margin-top: 20px;
+            padding-top: 12px;
+            border-top: 2px solid #2c3e50;
+            color: #7f8c8d;
+            font-size: 11px;
+            line-height: 1.4;
+        }}
+        .report-id {{
+            position: absolute;
+            top: 8px;
+            right: 12px;
+            background: #e74c3c;
+            color: white;
+            padding: 2px 7px;
+            border-radius: 10px;
+            font-weight: bold;
+            font-size: 11px;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.2);
+        }}
+        .disclaimer {{
+            background: #e3f2fd;
+            border-left: 3px solid #2196f3;
+            padding: 8px 12px;
+            margin: 15px 0;
+            border-radius: 0 3px 3px 0;
+            font-size: 11px;
+            line-height: 1.4;
+        }}
+        .report-meta {{
+            text-align: right;
+            font-size: 10px;
+            color: #7f8c8d;
+            margin-top: 4px;
+            font-style: italic;
+        }}
+    </style>
+</head>
+<body>
+    <div class="report">
+        <div class="report-id">RPT-{patient['report_id']}</div>
+        
+        <div class="header">
+            <div class="logo-section">
+                {f'<img src="{patient["logo_data_uri"]}" class="logo-img" alt="Lab Logo">' if patient.get('logo_data_uri') else f'<div class="lab-name">{patient["lab_name"]}</div>'}
+                <div class="lab-info">
+                    {f'<div class="lab-name">{patient["lab_name"]}</div>' if not patient.get('logo_data_uri') else ''}
+                    <div class="lab-address">{patient['lab_address']}</div>
+                    <div class="lab-address">📞 {patient['lab_phone']}</div>
+                </div>
+            </div>
+            <div class="report-title">LABORATORY TEST REPORT</div>
+        </div>
+        
+        <div class="report-subtitle">Diagnostic Test Results</div>
+        
+        <div class="patient-section">
+            <div class="patient-details">
+                <div class="patient-item"><span class="patient-label">Lab No:</span> <span class="patient-value">{patient['lab_no']}</span></div>
+                <div class="patient-item"><span class="patient-label">Patient No:</span> <span class="patient-value">{patient['patient_no']}</span></div>
+                <div class="patient-item"><span class="patient-label">Name:</span> <span class="patient-value">{patient['name']}</span></div>
+                <div class="patient-item"><span class="patient-label">Age/Sex:</span> <span class="patient-value">{patient['age']} / {patient['sex']}</span></div>
+                <div class="patient-item"><span class="patient-label">Doctor:</span> <span class="patient-value">{patient['doctor']}</span></div>
+                <div class="patient-item"><span class="patient-label">City:</span> <span class="patient-value">{patient['city']}</span></div>
+                <div class="patient-item"><span class="patient-label">Mobile:</span> <span class="patient-value">{patient['mobile']}</span></div>
+                <div class="patient-item"><span class="patient-label">Date:</span> <span class="patient-value">{patient['visit_date']}</span></div>
+            </div>
+            <div class="qr-container">
+                {f'<img src="{qr_src}" class="qr-code" alt="QR Code">' if qr_src else '<div style="height:90px"></div>'}
+                <div class="qr-label">Scan to Verify</div>
+            </div>
+        </div>
+        
+        <div class="disclaimer">
+            <strong>Note:</strong> Results with <span style="color:#e74c3c;text-decoration:underline wavy">wavy underline</span> are outside reference range. 
+            Consult your physician for interpretation. Report valid only for specimen tested on reported date.
+        </div>
+        
+        <div class="tests-container">
+            <table class="tests-table">
+                <thead>
+                    <tr>
+                        <th width="10%">Test No</th>
+                        <th width="40%">Test Name</th>
+                        <th width="25%">Result</th>
+                        <th width="25%">Reference Range</th>
+                    </tr>
+                </thead>
+                <tbody>
+    """
+    
+    # Add test groups: ONLY SUB-TESTS under MAIN TEST headers
+    if not test_groups:
+        html += """
+                    <tr>
+                        <td colspan="4" style="text-align:center; padding:20px; color:#7f8c8d;">
+                            No sub-test results available for this patient
+                        </td>
+                    </tr>
+        """
+    else:
+        for group in test_groups:
+            main_test_name = group["main_test_name"]
+            sub_tests = group["sub_tests"]
+            
+            # SECTION HEADER: Main test name (parent of sub-tests)
+            html += f"""
+                    <tr>
+                        <td colspan="4" class="section-header">
+                            🔬 {main_test_name}
+                        </td>
+                    </tr>
+            """
+            
+            # SUB-TESTS ONLY (NO main test row)
+            for sub in sub_tests:
+                # Format result with unit inline
+                result_display = sub['result']
+                if sub['unit']:
+                    result_display += f" <span class='unit'>{sub['unit']}</span>"
+                
+                html += f"""
+                    <tr>
+                        <td>{sub['display_no']}</td>
+                        <td>  ▫️ {sub['test_name']}</td>
+                        <td>
+                            <span class="result-value {'abnormal' if sub['is_abnormal'] else ''}">
+                                {result_display}
+                            </span>
+                        </td>
+                        <td><div class="reference-range">{sub['reference_range']}</div></td>
+                    </tr>
+                """
+    
+    html += f"""
+                </tbody>
+            </table>
+        </div>
+        
+        <div class="report-meta">
+            Generated: {report_time} | Page 1 of 1
+        </div>
+        
+        <div class="footer">
+            <div>Thank you for trusting {patient['lab_name']}</div>
+            <div style="margin-top: 2px; font-weight: bold;">Precision in Every Test • Excellence in Every Report</div>
+            <div style="margin-top: 4px; font-size: 10px;">
+                Computer-generated report. No signature required. Report ID: RPT-{patient['report_id']}
+            </div>
+        </div>
+    </div>
+    
+    <div class="no-print" style="text-align: center; margin: 18px 0; padding: 10px; background: #e3f2fd; border-radius: 6px; border: 1px solid #2196f3;">
+        <button onclick="window.print()" style="
+            background: #2196f3; 
+            color: white; 
+            border: none; 
+            padding: 8px 22px; 
+            font-size: 15px; 
+            border-radius: 5px; 
+            cursor: pointer;
+            margin: 0 6px;
+            font-weight: 600;
+            box-shadow: 0 2px 3px rgba(0,0,0,0.2);
+        ">🖨️ Print Report</button>
+        <button onclick="downloadPDF()" style="
+            background: #4caf50; 
+            color: white; 
+            border: none; 
+            padding: 8px 22px; 
+            font-size: 15px; 
+            border-radius: 5px; 
+            cursor: pointer;
+            margin: 0 6px;
+            font-weight: 600;
+            box-shadow: 0 2px 3px rgba(0,0,0,0.2);
+        ">💾 Save as PDF</button>
+    </div>
+    
+    <script>
+    function downloadPDF() {{
+        alert('For best quality PDF:\\n1. Click OK\\n2. In print dialog, choose "Save as PDF"\\n3. Set margins to "Default"\\n4. Check "Background graphics"\\n5. Click Save');
+        window.print();
+    }}
+    </script>
+</body>
+</html>
+    """
+    
+    return html
+
+
+def legacy_receipt_copies(data, user_name):
+    """receipt_preview() HTML (customer copy, lab copy) as it was built inline"""
+    lab_info = data["lab_info"]
+    all_tests = data['tests']
+
+    # Receipt QR (inline SVG, cached per payload)
+    qr_markup = qr_svg(f"Lab:{lab_info['name']}|LabNo:{data['labno']}|Receipt:{data['patient_no']}|Date:{data['date']}", size=64)
+    
+    # CUSTOMER RECEIPT HTML
+    customer_receipt_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            @media print {{
+                body {{ margin: 0; padding: 0; }}
+                .receipt {{ width: 210mm; height: 148mm; page-break-after: always; }}
+            }}
+            .receipt {{
+                font-family: Arial, sans-serif;
+                width: 100%;
+                max-width: 210mm;
+                min-height: 148mm;
+                margin: 0 auto;
+                padding: 15px;
+                border: 2px solid #2c3e50;
+                background: #fff;
+                box-sizing: border-box;
+            }}
+            .header {{ text-align: center; margin-bottom: 10px; }}
+            .header h2 {{ color: #2c3e50; margin: 3px 0; font-size: 18px; }}
+            .header p {{ margin: 2px 0; font-size: 12px; }}
+            .divider {{ border-top: 1px dashed #2c3e50; margin: 8px 0; }}
+            .patient-info {{ margin: 8px 0; }}
+            .patient-info p {{ margin: 3px 0; font-size: 13px; }}
+            .tests-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 12px; }}
+            .tests-table th {{ background: #e8f4fc; padding: 4px; text-align: left; border-bottom: 1px solid #2c3e50; }}
+            .tests-table td {{ padding: 4px; border-bottom: 1px dashed #ccc; }}
+            .sub-test {{ color: #555; font-size: 11px; }}
+            .payment-table {{ width: 100%; margin-top: 5px; font-size: 13px; }}
+            .payment-table td {{ padding: 2px 0; }}
+            .balance-due {{ color: {'red' if data['balance'] > 0 else 'green'}; font-weight: bold; }}
+            .footer {{ text-align: center; margin-top: 10px; font-size: 11px; color: #7f8c8d; }}
+            .badge {{ background: #e8f4fc; padding: 2px 8px; border-radius: 3px; font-weight: bold; display: inline-block; margin-top: 5px; }}
+        </style>
+    </head>
+    <body>
+        <div class="receipt">
+            <div class="header">
+                <h2>{lab_info['name']}</h2>
+                <p>{lab_info['address']}</p>
+                <p>📞 {lab_info['phone']}</p>
+                <div class="divider"></div>
+                <h3>PATIENT RECEIPT</h3>
+                <div class="badge">CUSTOMER COPY</div>
+                {f'<div style="margin-top: 6px;">{qr_markup}</div>' if qr_markup else ''}
+            </div>
+            
+            <div class="patient-info">
+                <p><strong>Lab No:</strong> {data['labno']}</p>
+                <p><strong>Patient No:</strong> {data['patient_no']}</p>
+                <p><strong>Date:</strong> {data['date']}</p>
+                <p><strong>Patient:</strong> {data['name']}</p>
+                <p><strong>Age/Sex:</strong> {data['age']} / {data['sex']}</p>
+                <p><strong>Mobile:</strong> {data['mobile']}</p>
+                <p><strong>Doctor:</strong> {data['doctor_name']}</p>
+                <p><strong>City:</strong> {data['city']}</p>
+            </div>
+            
+            <div class="divider"></div>
+            
+            <table class="tests-table">
+                <thead>
+                    <tr>
+                        <th>Test</th>
+                        <th style="text-align: right;">Amount</th>
+                    </tr>
+                </thead>
+                <tbody>
+    """
+    
+    for test in all_tests:
+        test_class = "sub-test" if test["is_sub"] else ""
+        customer_receipt_html += f"""
+                    <tr class="{test_class}">
+                        <td>{test['display_no']} {test['name']}</td>
+                        <td style="text-align: right;">Rs. {test['rate']:.2f}</td>
+                    </tr>
+        """
+    
+    customer_receipt_html += f"""
+                </tbody>
+            </table>
+            
+            <div class="divider"></div>
+            
+            <table class="payment-table">
+                <tr>
+                    <td><strong>Total Amount</strong></td>
+                    <td style="text-align: right;">Rs. {data['total']:.2f}</td>
+                </tr>
+                <tr>
+                    <td><strong>Discount</strong></td>
+                    <td style="text-align: right;">Rs. {data['discount']:.2f}</td>
+                </tr>
+                <tr>
+                    <td><strong>Amount Paid</strong></td>
+                    <td style="text-align: right;">Rs. {data['paid']:.2f}</td>
+                </tr>
+                <tr style="border-top: 2px solid #2c3e50;">
+                    <td><strong>Balance Due</strong></td>
+                    <td style="text-align: right;" class="balance-due">Rs. {data['balance']:.2f}</td>
+                </tr>
+            </table>
+            
+            <div class="divider"></div>
+            
+            <div class="footer">
+                <p>Thank you for your visit!</p>
+                <p>Results will be ready after {data['return_time'] or '5:00 PM'}</p>
+                <p style="margin-top: 8px; font-size: 10px;">This is a computer-generated receipt. No signature required.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    # LAB RECEIPT HTML
+    lab_receipt_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            @media print {{
+                body {{ margin: 0; padding: 0; }}
+                .receipt {{ width: 210mm; height: 148mm; page-break-after: always; }}
+            }}
+            .receipt {{
+                font-family: Arial, sans-serif;
+                width: 100%;
+                max-width: 210mm;
+                min-height: 148mm;
+                margin: 0 auto;
+                padding: 15px;
+                border: 2px solid #e74c3c;
+                background: #fff;
+                box-sizing: border-box;
+            }}
+            .header {{ text-align: center; margin-bottom: 10px; }}
+            .header h2 {{ color: #e74c3c; margin: 3px 0; font-size: 18px; }}
+            .header p {{ margin: 2px 0; font-size: 12px; }}
+            .divider {{ border-top: 1px dashed #e74c3c; margin: 8px 0; }}
+            .patient-info {{ margin: 8px 0; }}
+            .patient-info p {{ margin: 3px 0; font-size: 13px; }}
+            .tests-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 12px; }}
+            .tests-table th {{ background: #fadbd8; padding: 4px; text-align: left; border-bottom: 1px solid #e74c3c; }}
+            .tests-table td {{ padding: 4px; border-bottom: 1px dashed #ccc; }}
+            .sub-test {{ color: #555; font-size: 11px; }}
+            .payment-table {{ width: 100%; margin-top: 5px; font-size: 13px; }}
+            .payment-table td {{ padding: 2px 0; }}
+            .balance-due {{ color: {'red' if data['balance'] > 0 else 'green'}; font-weight: bold; }}
+            .footer {{ text-align: center; margin-top: 10px; font-size: 11px; color: #7f8c8d; }}
+            .badge {{ background: #fadbd8; padding: 2px 8px; border-radius: 3px; font-weight: bold; color: #c0392b; display: inline-block; margin-top: 5px; }}
+        </style>
+    </head>
+    <body>
+        <div class="receipt">
+            <div class="header">
+                <h2>{lab_info['name']}</h2>
+                <p>{lab_info['address']}</p>
+                <p>📞 {lab_info['phone']}</p>
+                <div class="divider"></div>
+                <h3>PATIENT RECEIPT</h3>
+                <div class="badge">LAB COPY - INTERNAL USE</div>
+            </div>
+            
+            <div class="patient-info">
+                <p><strong>Lab No:</strong> {data['labno']}</p>
+                <p><strong>Patient No:</strong> {data['patient_no']}</p>
+                <p><strong>Date:</strong> {data['date']}</p>
+                <p><strong>Patient:</strong> {data['name']}</p>
+                <p><strong>Age/Sex:</strong> {data['age']} / {data['sex']}</p>
+                <p><strong>Mobile:</strong> {data['mobile']}</p>
+                <p><strong>Doctor:</strong> {data['doctor_name']}</p>
+                <p><strong>City:</strong> {data['city']}</p>
+                <p><strong>Address:</strong> {data['address']}</p>
+                <p><strong>Sample Source:</strong> {data['sample_source']}</p>
+                <p><strong>Entered By:</strong> {user_name}</p>
+            </div>
+            
+            <div class="divider"></div>
+            
+            <table class="tests-table">
+                <thead>
+                    <tr>
+                        <th>Display No</th>
+                        <th>Test Name</th>
+                        <th style="text-align: right;">Amount</th>
+                    </tr>
+                </thead>
+                <tbody>
+    """
+    
+    for test in all_tests:
+        display_no = test['display_no'] if not test['is_sub'] else "Sub"
+        lab_receipt_html += f"""
+                    <tr class="{'sub-test' if test['is_sub'] else ''}">
+                        <td>{display_no}</td>
+                        <td>{test['name']}</td>
+                        <td style="text-align: right;">Rs. {test['rate']:.2f}</td>
+                    </tr>
+        """
+    
+    lab_receipt_html += f"""
+                </tbody>
+            </table>
+            
+            <div class="divider"></div>
+            
+            <table class="payment-table">
+                <tr>
+                    <td><strong>Total Amount</strong></td>
+                    <td style="text-align: right;">Rs. {data['total']:.2f}</td>
+                </tr>
+                <tr>
+                    <td><strong>Discount</strong></td>
+                    <td style="text-align: right;">Rs. {data['discount']:.2f}</td>
+                </tr>
+                <tr>
+                    <td><strong>Amount Paid</strong></td>
+                    <td style="text-align: right;">Rs. {data['paid']:.2f}</td>
+                </tr>
+                <tr style="border-top: 2px solid #e74c3c;">
+                    <td><strong>Balance Due</strong></td>
+                    <td style="text-align: right;" class="balance-due">Rs. {data['balance']:.2f}</td>
+                </tr>
+            </table>
+            
+            <div class="divider"></div>
+            
+            <div class="footer">
+                <p><strong>INTERNAL COPY - FOR LAB USE ONLY</strong></p>
+                <p>Results will be ready after {data['return_time'] or '5:00 PM'}</p>
+                <p style="margin-top: 8px; font-size: 10px;">Patient must present this receipt to collect reports. Balance must be cleared before report release.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+    return customer_receipt_html, lab_receipt_html
+
+
+def legacy_dual_receipt_html(patient, tests, lab_info):
+    # Format tests list
+    tests_list = ", ".join([f"{t.Test_Name}" for t in tests]) if tests else "No tests recorded"
+    
+    # Format amounts
+    total = patient.TotalAmount if patient.TotalAmount else 0
+    discount = patient.Discount if patient.Discount else 0
+    paid = patient.AmountPaid if patient.AmountPaid else 0
+    balance = patient.Balance if patient.Balance else 0
+    
+    # Format dates
+    visit_date = patient.Visit_Date.strftime('%d-%b-%Y') if patient.Visit_Date else ""
+    return_time = patient.ReturnTime.strftime('%I:%M %p') if patient.ReturnTime else "N/A"
+    
+    # Lab logo handling
+    logo_html = ""
+    if lab_info and lab_info["logo_data_uri"]:  # Pad_Logo exists
+        logo_html = f'<img src="{lab_info["logo_data_uri"]}" style="max-height:40px; max-width:150px;">'
+    elif lab_info:
+        logo_html = f"<h3>{lab_info['name']}</h3>"
+    
+    # Receipt QR (inline SVG, cached per payload; both copies share it)
+    qr_markup = qr_svg(
+        f"Lab:{lab_info['name'] if lab_info else ''}|LabNo:{patient.LabNo}|Receipt:{patient.PatientNo}|Date:{visit_date}",
+        size=64
+    )
+    qr_html = f'<div class="receipt-qr">{qr_markup}</div>' if qr_markup else ""
+    
+    # Generate SINGLE PAGE with TWO RECEIPTS (TOP + BOTTOM)
+    receipt_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Receipt - Lab No: {patient.LabNo}</title>
+        <style>
+            @media print {{
+                body {{ margin: 0; padding: 0; }}
+                .receipt-page {{ width: 210mm; height: 297mm; margin: 0; padding: 0; }}
+                .receipt {{ page-break-inside: avoid; }}
+            }}
+            body {{
+                font-family: Arial, sans-serif;
+                margin: 0;
+                padding: 0;
+                background: #f5f7fa;
+            }}
+            .receipt-page {{
+                width: 210mm;
+                height: 297mm;
+                margin: 10mm auto;
+                background: white;
+                box-shadow: 0 0 10px rgba(0,0,0,0.1);
+            }}
+            .receipt {{
+                width: 190mm;
+                margin: 10mm;
+                padding: 15px;
+                border: 1px solid #000;
+            }}
+            .receipt-top {{
+                border-bottom: 1px dashed #000;
+                padding-bottom: 10px;
+                margin-bottom: 10px;
+            }}
+            .receipt-bottom {{
+                padding-top: 10px;
+                margin-top: 10px;
+            }}
+            .header {{
+                text-align: center;
+                margin-bottom: 10px;
+                position: relative;
+            }}
+            .receipt-qr {{
+                position: absolute;
+                top: 0;
+                right: 0;
+            }}
+            .header h2 {{
+                margin: 3px 0;
+                font-size: 18px;
+                color: #2c3e50;
+            }}
+            .header p {{
+                margin: 2px 0;
+                font-size: 12px;
+            }}
+            .receipt-info {{
+                display: flex;
+                justify-content: space-between;
+                font-size: 13px;
+                margin: 8px 0;
+            }}
+            .patient-info {{
+                margin: 10px 0;
+                font-size: 13px;
+            }}
+            .patient-info p {{
+                margin: 3px 0;
+            }}
+            .tests-list {{
+                margin: 10px 0;
+                font-size: 12px;
+                line-height: 1.4;
+            }}
+            .payment-summary {{
+                width: 100%;
+                border-collapse: collapse;
+                margin: 15px 0;
+                font-size: 13px;
+            }}
+            .payment-summary td {{
+                padding: 4px 8px;
+                border-bottom: 1px solid #000;
+            }}
+            .payment-summary tr:last-child td {{
+                border-top: 2px solid #000;
+                font-weight: bold;
+            }}
+            .balance-due {{
+                color: {'red' if balance > 0 else 'green'};
+                font-weight: bold;
+            }}
+            .footer {{
+                text-align: center;
+                margin-top: 15px;
+                font-size: 11px;
+                color: #7f8c8d;
+            }}
+            .badge {{
+                background: #e8f4fc;
+                padding: 2px 8px;
+                border-radius: 3px;
+                font-weight: bold;
+                display: inline-block;
+                margin-top: 5px;
+                font-size: 12px;
+            }}
+            .lab-badge {{
+                background: #fadbd8;
+                color: #c0392b;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="receipt-page">
+            <!-- TOP RECEIPT (CUSTOMER COPY) -->
+            <div class="receipt receipt-top">
+                <div class="header">
+                    {logo_html}
+                    <p>{lab_info['address'] if lab_info else ''}<br>📞 {lab_info['phone'] if lab_info else ''}</p>
+                    <div class="badge">CUSTOMER COPY</div>
+                    {qr_html}
+                </div>
+                <div class="receipt-info">
+                    <div><strong>Lab No:</strong> {patient.LabNo}</div>
+                    <div><strong>Date:</strong> {visit_date}</div>
+                    <div><strong>Receipt No:</strong> {patient.PatientNo}</div>
+                </div>
+                <div class="patient-info">
+                    <p><strong>Patient:</strong> {patient.Patient_Name}</p>
+                    <p><strong>Age/Sex:</strong> {patient.Age} / {patient.Sex}</p>
+                    <p><strong>Mobile:</strong> {patient.Mobile_No or 'N/A'}</p>
+                    <p><strong>City:</strong> {patient.City or 'N/A'}</p>
+                    <p><strong>Referred by:</strong> {patient.Referred_By or 'N/A'}</p>
+                    <p><strong>Delivery:</strong> {visit_date} {return_time}</p>
+                </div>
+                <div class="tests-list">
+                    <strong>Tests Performed:</strong><br>
+                    {tests_list}
+                </div>
+                <table class="payment-summary">
+                    <tr>
+                        <td><strong>Total</strong></td>
+                        <td style="text-align: right;">Rs. {total:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Discount</strong></td>
+                        <td style="text-align: right;">Rs. {discount:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Paid</strong></td>
+                        <td style="text-align: right;">Rs. {paid:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Balance</strong></td>
+                        <td style="text-align: right;" class="balance-due">Rs. {balance:,.2f}</td>
+                    </tr>
+                </table>
+                <div class="footer">
+                    <p>Received with thanks the sum of Rs. {paid:,.2f} in Cash</p>
+                    <p style="margin-top: 8px; font-size: 10px;">Note: Computer generated receipt. No signature required.</p>
+                </div>
+            </div>
+            
+            <!-- BOTTOM RECEIPT (LAB COPY) -->
+            <div class="receipt receipt-bottom">
+                <div class="header">
+                    {logo_html}
+                    <p>{lab_info['address'] if lab_info else ''}<br>📞 {lab_info['phone'] if lab_info else ''}</p>
+                    <div class="badge lab-badge">LAB COPY</div>
+                    {qr_html}
+                </div>
+                <div class="receipt-info">
+                    <div><strong>Lab No:</strong> {patient.LabNo}</div>
+                    <div><strong>Date:</strong> {visit_date}</div>
+                    <div><strong>Receipt No:</strong> {patient.PatientNo}</div>
+                </div>
+                <div class="patient-info">
+                    <p><strong>Patient:</strong> {patient.Patient_Name}</p>
+                    <p><strong>Age/Sex:</strong> {patient.Age} / {patient.Sex}</p>
+                    <p><strong>Mobile:</strong> {patient.Mobile_No or 'N/A'}</p>
+                    <p><strong>City:</strong> {patient.City or 'N/A'}</p>
+                    <p><strong>Address:</strong> {patient.Address or 'N/A'}</p>
+                    <p><strong>Referred by:</strong> {patient.Referred_By or 'N/A'}</p>
+                    <p><strong>Delivery:</strong> {visit_date} {return_time}</p>
+                </div>
+                <div class="tests-list">
+                    <strong>Tests Performed:</strong><br>
+                    {tests_list}
+                </div>
+                <table class="payment-summary">
+                    <tr>
+                        <td><strong>Total</strong></td>
+                        <td style="text-align: right;">Rs. {total:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Discount</strong></td>
+                        <td style="text-align: right;">Rs. {discount:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Paid</strong></td>
+                        <td style="text-align: right;">Rs. {paid:,.2f}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Balance</strong></td>
+                        <td style="text-align: right;" class="balance-due">Rs. {balance:,.2f}</td>
+                    </tr>
+                </table>
+                <div class="footer">
+                    <p><strong>INTERNAL USE ONLY</strong></p>
+                    <p>Results ready after {return_time}. Balance must be cleared before report release.</p>
+                    <p style="margin-top: 8px; font-size: 10px;">Note: Computer generated receipt. No signature required.</p>
+                </div>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return receipt_html
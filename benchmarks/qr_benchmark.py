@@ -0,0 +1,69 @@
+"""
+QR Rendering Benchmark
+Features: compares the old per-render PNG path (qrcode + PIL + base64) with the SVG and
+cached renderers in qr_codes.py on report-style payloads; no database needed
+
+Usage:
+    python benchmarks/qr_benchmark.py [--reports 500]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qr_codes  # noqa: E402
+
+
+def payloads(count):
+    return [
+        f"Lab:City Diagnostic Lab|LabNo:{n}|Patient:Patient {n}|Date:01-Jan-2024 09:{n % 60:02d} AM"
+        for n in range(1, count + 1)
+    ]
+
+
+def uncached_png(data):
+    return qr_codes.qr_png_base64.__wrapped__(data)
+
+
+def uncached_svg(data):
+    qr_codes.qr_matrix.cache_clear()
+    return qr_codes.qr_svg.__wrapped__(data)
+
+
+def run(label, render, items):
+    started = time.perf_counter()
+    sizes = [len(render(item) or "") for item in items]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000 / len(items):8.3f} ms/report   "
+          f"{sum(sizes) / len(sizes) / 1024:6.1f} KB/report")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark QR rendering for reports")
+    parser.add_argument("--reports", type=int, default=500, help="distinct payloads to render")
+    args = parser.parse_args(argv)
+
+    if not qr_codes.QR_AVAILABLE:
+        print("qrcode is not installed (pip install qrcode[pil])")
+        return 1
+
+    items = payloads(args.reports)
+    print(f"{args.reports} distinct payloads\n")
+    run("PNG, every render (old)", uncached_png, items)
+    run("SVG, every render", uncached_svg, items)
+
+    # Re-prints: the same payloads a second time, served from the caches
+    qr_codes.qr_svg.cache_clear()
+    qr_codes.qr_png_base64.cache_clear()
+    for item in items:
+        qr_codes.qr_svg(item)
+        qr_codes.qr_png_base64(item)
+    run("PNG, cached re-print", qr_codes.qr_png_base64, items)
+    run("SVG, cached re-print", qr_codes.qr_svg, items)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Report / Receipt Template Benchmark
+Features: render time and output size of the precompiled templates (reports.py, receipts.py)
+against the frozen f-string implementations in legacy_templates.py; synthetic patients, no
+database needed. Every run starts from the same QR cache state: cleared, then either timed
+cold or after one untimed warm-up pass (--qr), so neither side inherits the other's QR codes
+
+Usage:
+    python benchmarks/template_benchmark.py [--documents 500] [--tests 30] [--qr warm|cold]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reports  # noqa: E402
+import receipts  # noqa: E402
+import qr_codes  # noqa: E402
+import legacy_templates  # noqa: E402
+
+
+def report_data(n, tests):
+    groups = []
+    for g in range(max(1, tests // 6)):
+        groups.append({
+            "main_test_name": f"Panel {g}",
+            "sub_tests": [{
+                "display_no": f"{g}.{i}",
+                "test_name": f"Analyte {g}-{i}",
+                "result": f"{(n + i) % 20}.{i}",
+                "unit": "mg/dl",
+                "is_abnormal": (n + i) % 5 == 0,
+                "reference_range": "4 - 11",
+            } for i in range(6)],
+        })
+    return {
+        "patient": {
+            "lab_no": n, "patient_no": n, "name": f"Patient {n}", "age": "35 Y", "sex": "Male",
+            "doctor": "Dr. Referrer", "city": "Abbottabad", "mobile": "0300-1234567",
+            "visit_date": "01-Jan-2024", "report_id": 1, "lab_name": "City Diagnostic Lab",
+            "lab_address": "Main Road", "lab_phone": "0300-0000000", "logo_data_uri": None,
+        },
+        "tests": groups,
+        "report_generated": "01-Jan-2024 06:00 PM",
+    }
+
+
+def receipt_data(n, tests):
+    return {
+        "labno": n, "patient_no": n, "name": f"Patient {n}", "age": "35 Y", "sex": "Male",
+        "mobile": "0300-1234567", "doctor_name": "Dr. Referrer", "city": "Abbottabad",
+        "address": "Main Road", "sample_source": "Lab",
+        "tests": [{"display_no": str(i), "name": f"Test {i}", "rate": 250.0 * (i + 1), "is_sub": i % 3 == 2}
+                  for i in range(tests)],
+        "total": 5000.0, "discount": 500.0, "paid": 4000.0, "balance": 500.0,
+        "date": "01-Jan-2024 09:00 AM", "return_time": "5:00 PM",
+        "lab_info": {"name": "City Diagnostic Lab", "address": "Main Road", "phone": "0300-0000000"},
+    }
+
+
+def search_row(n, tests):
+    patient = SimpleNamespace(
+        LabNo=n, PatientNo=n, Patient_Name=f"Patient {n}", Age="35 Y", Sex="Male",
+        Mobile_No="0300-1234567", City="Abbottabad", Address="Main Road", Referred_By="Dr. Referrer",
+        Visit_Date=datetime(2024, 1, 1, 9), ReturnTime=datetime(2024, 1, 1, 17),
+        TotalAmount=5000.0, Discount=500.0, AmountPaid=4000.0, Balance=500.0,
+    )
+    rows = [SimpleNamespace(Test_Name=f"Test {i}") for i in range(tests)]
+    lab = {"name": "City Diagnostic Lab", "address": "Main Road", "phone": "0300-0000000", "logo_data_uri": None}
+    return patient, rows, lab
+
+
+def reset_qr_caches():
+    for cached in (qr_codes.qr_matrix, qr_codes.qr_svg, qr_codes.qr_png_base64):
+        cached.cache_clear()
+
+
+def run(label, render, items, qr="warm"):
+    reset_qr_caches()
+    if qr == "warm":
+        for item in items:
+            render(*item)
+    started = time.perf_counter()
+    sizes = [sum(len(part) for part in (out if isinstance(out, tuple) else (out,)))
+             for out in (render(*item) for item in items)]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<32} {elapsed * 1000 / len(items):8.3f} ms/document   "
+          f"{sum(sizes) / len(sizes) / 1024:6.1f} KB/document")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark report and receipt HTML rendering")
+    parser.add_argument("--documents", type=int, default=500, help="documents of each kind")
+    parser.add_argument("--tests", type=int, default=30, help="tests per patient")
+    parser.add_argument("--qr", choices=("warm", "cold"), default="warm",
+                        help="time with every QR code cached (HTML assembly only) or none cached")
+    args = parser.parse_args(argv)
+
+    n, tests, qr = args.documents, args.tests, args.qr
+    if n > qr_codes.CACHE_SIZE and qr == "warm":
+        print(f"note: more documents than the QR cache holds ({qr_codes.CACHE_SIZE}), warm runs are partly cold")
+    print(f"{n} documents of each kind, {tests} tests per patient, QR cache {qr}\n")
+
+    items = [(report_data(i, tests),) for i in range(n)]
+    run("Lab report, f-string (old)", legacy_templates.legacy_standard_report_html, items, qr)
+    run("Lab report, template", reports.generate_standard_report_html, items, qr)
+
+    items = [(receipt_data(i, tests), "admin") for i in range(n)]
+    run("Receipt copies, f-string (old)", legacy_templates.legacy_receipt_copies, items, qr)
+    run("Receipt copies, template", receipts.receipt_copies, items, qr)
+
+    items = [search_row(i, tests) for i in range(n)]
+    run("Dual receipt, f-string (old)", legacy_templates.legacy_dual_receipt_html, items, qr)
+    run("Dual receipt, template", receipts.dual_receipt_html, items, qr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
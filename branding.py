@@ -0,0 +1,106 @@
+"""
+Lab Branding Cache
+Features: LabInfo (name, address, phone, Pad_Logo) loaded once per process with the logo
+already encoded as a data URI; a cheap checksum stamp is re-read every few minutes and the
+rows (logo blob included) are only fetched again when it moved
+"""
+import time
+import base64
+import logging
+import threading
+
+from db import get_connection
+
+log = logging.getLogger("lab.branding")
+
+# Branding changes a few times a year; how often (seconds) the stamp is re-read
+BRANDING_CHECK_INTERVAL = 300.0
+
+# The first 8000 bytes of the logo plus its length: enough to notice a replaced image
+VERSION_SQL = """
+    SELECT COUNT_BIG(*),
+           CHECKSUM_AGG(BINARY_CHECKSUM(ID, LabName, Address, PhoneNo,
+                                        DATALENGTH(Pad_Logo), SUBSTRING(Pad_Logo, 1, 8000)))
+    FROM LabInfo
+"""
+
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def image_mime(data):
+    """MIME type of an image blob from its leading bytes (PNG when unknown)"""
+    for signature, mime in _SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    return "image/png"
+
+
+def _branding(row, version):
+    logo = bytes(row.Pad_Logo) if row.Pad_Logo else None
+    data_uri = None
+    if logo:
+        data_uri = f"data:{image_mime(logo)};base64,{base64.b64encode(logo).decode('ascii')}"
+    return {
+        "id": row.ID,
+        "name": row.LabName,
+        "address": row.Address,
+        "phone": row.PhoneNo,
+        "logo": logo,
+        "logo_data_uri": data_uri,
+        "version": version,
+    }
+
+
+# -----------------------------
+# PROCESS-WIDE ACCESS
+# -----------------------------
+_labs = None            # LabInfo.ID -> branding dict
+_default_id = None      # lowest ID (the app has always used the first LabInfo row)
+_version = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _refresh(force=False):
+    global _labs, _default_id, _version, _checked_at
+    now = time.monotonic()
+    if _labs is not None and not force and now - _checked_at < BRANDING_CHECK_INTERVAL:
+        return
+    with _lock:
+        if _labs is not None and not force and now - _checked_at < BRANDING_CHECK_INTERVAL:
+            return
+        with get_connection() as con:
+            cur = con.cursor()
+            cur.execute(VERSION_SQL)
+            version = tuple(cur.fetchone())
+            if _labs is None or version != _version:
+                cur.execute("SELECT ID, LabName, Address, PhoneNo, Pad_Logo FROM LabInfo ORDER BY ID")
+                labs = {row.ID: _branding(row, version) for row in cur.fetchall()}
+                _labs, _version = labs, version
+                _default_id = next(iter(labs), None)
+                log.info("Lab branding loaded for %d lab(s)", len(labs))
+        _checked_at = time.monotonic()
+
+
+def get_branding(lab_id=None):
+    """
+    Branding dict (id, name, address, phone, logo bytes, logo_data_uri, version) of a lab,
+    the first LabInfo row when lab_id is None; None when there is no such lab.
+    Returned dicts are shared - do not modify them.
+    """
+    _refresh()
+    if lab_id is None:
+        lab_id = _default_id
+    return _labs.get(lab_id)
+
+
+def invalidate():
+    """Force the next get_branding() call to re-check the stamp"""
+    global _checked_at
+    _checked_at = 0.0
@@ -0,0 +1,264 @@
+"""
+In-Memory Test Catalog
+Features: test, test_identity and Normal_Ranges loaded once per process and indexed
+(by Test_Id, test_identity Id, display no, parent -> children); reloaded only when the
+tables' checksum stamp moves, so catalog lookups are dictionary hits instead of SQL
+"""
+import time
+import heapq
+import logging
+import threading
+
+from db import get_connection
+from ranges import compile_ranges, range_text
+
+log = logging.getLogger("lab.catalog")
+
+# How often (seconds) the cheap version stamp is re-read; the catalog changes a few times a month
+VERSION_CHECK_INTERVAL = 60.0
+
+VERSION_SQL = """
+    SELECT
+        (SELECT COUNT_BIG(*) FROM test),
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM test),
+        (SELECT COUNT_BIG(*) FROM test_identity),
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM test_identity),
+        (SELECT COUNT_BIG(*) FROM Normal_Ranges),
+        (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(*)) FROM Normal_Ranges)
+"""
+
+
+def display_sort_key(test):
+    """Same order as ORDER BY CAST(ti.Test_Display_No AS VARCHAR(50)) (NULLs first)"""
+    no = test["display_no"]
+    return (no is not None, "" if no is None else str(no))
+
+
+# -----------------------------
+# TEST SEARCH INDEX
+# -----------------------------
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TestSearchIndex:
+    """
+    Case-insensitive search over test names and display numbers.
+
+    Queries of 3+ characters are narrowed with a trigram index and then confirmed as
+    substrings; shorter ones scan the (small) list. Results are ranked exact match >
+    prefix > word prefix > substring, then display order, and returned one page at a time.
+    """
+
+    def __init__(self, tests):
+        self.tests = tests
+        self.names = [(t["test_name"] or "").lower() for t in tests]
+        self.numbers = [str(t["display_no"]).strip().lower() for t in tests]
+        self.name_words = [tuple(name.split()[1:]) for name in self.names]
+        self.name_grams = self._build(self.names)
+        self.number_grams = self._build(self.numbers)
+
+    @staticmethod
+    def _build(texts):
+        index = {}
+        for pos, text in enumerate(texts):
+            for gram in _trigrams(text):
+                index.setdefault(gram, set()).add(pos)
+        return index
+
+    @staticmethod
+    def _matches(query, texts, grams):
+        """Positions whose text contains query"""
+        if len(query) >= 3:
+            postings = sorted((grams.get(g, set()) for g in _trigrams(query)), key=len)
+            candidates = set.intersection(*postings) if postings else set()
+            return {pos for pos in candidates if query in texts[pos]}
+        return {pos for pos, text in enumerate(texts) if query in text}
+
+    @staticmethod
+    def _rank(query, text, words):
+        if text == query:
+            return 0
+        if text.startswith(query):
+            return 1
+        for word in words:
+            if word.startswith(query):
+                return 2
+        return 3
+
+    def search(self, name_query="", number_query="", offset=0, limit=50):
+        """
+        Return (page of test dicts, total number of matches).
+
+        Both queries must match when both are given (same as the old AND of two LIKEs).
+        """
+        name_query = (name_query or "").strip().lower()
+        number_query = (number_query or "").strip().lower()
+
+        if not name_query and not number_query:
+            return self.tests[offset:offset + limit], len(self.tests)
+
+        positions = None
+        if name_query:
+            positions = self._matches(name_query, self.names, self.name_grams)
+        if number_query:
+            found = self._matches(number_query, self.numbers, self.number_grams)
+            positions = found if positions is None else positions & found
+
+        rank, names, numbers, words = self._rank, self.names, self.numbers, self.name_words
+        keys = [
+            (
+                rank(number_query, numbers[pos], ()) if number_query else 0,
+                rank(name_query, names[pos], words[pos]) if name_query else 0,
+                pos,
+            )
+            for pos in positions
+        ]
+        ranked = heapq.nsmallest(offset + limit, keys)
+        ranked = [key[2] for key in ranked[offset:]]
+        return [self.tests[pos] for pos in ranked], len(keys)
+
+
+# -----------------------------
+# CATALOG SNAPSHOT
+# -----------------------------
+class TestCatalog:
+    """Immutable, indexed snapshot of the test catalog"""
+
+    def __init__(self, version, test_rows, range_rows):
+        self.version = version
+        self.loaded_at = time.time()
+
+        self.tests = {}            # Test_Id -> test dict
+        self.by_identity = {}      # test_identity.Id -> [test dicts]
+        self.by_display_no = {}    # display no (str) -> test dict
+        self.children = {}         # General_Test_Id -> [sub-test dicts, display order]
+        self.ranges = {}           # Test_Id -> [Normal_Ranges dicts, Ref_Id order]
+        self.reference = {}        # Test_Id -> compiled first range (ranges.ReferenceRange)
+
+        for row in test_rows:
+            test = {
+                "test_id": row.Test_Id,
+                "identity_id": row.Id,
+                "test_name": row.Test_Name,
+                "general_test_id": row.General_Test_Id,
+                "unit": row.Unit,
+                "display_no": row.Test_Display_No,
+                "display_name": row.Test_Display_Name,
+                "rate": float(row.SRate) if row.SRate else 0.0,
+                "report_id": row.ReportID,
+                "has_identity": row.IdentityId is not None,
+            }
+            self.tests[test["test_id"]] = test
+            self.by_identity.setdefault(test["identity_id"], []).append(test)
+            if test["display_no"] is not None and str(test["display_no"]).strip():
+                self.by_display_no.setdefault(str(test["display_no"]).strip(), test)
+            # Sub-tests need a test_identity row (the queries this replaces used INNER JOINs)
+            if test["general_test_id"] and test["has_identity"]:
+                self.children.setdefault(test["general_test_id"], []).append(test)
+
+        for subs in self.children.values():
+            subs.sort(key=display_sort_key)
+
+        for row in range_rows:
+            self.ranges.setdefault(row.Test_Id, []).append({
+                "ref_id": row.Ref_Id,
+                "initial_value": row.Inital_Value,
+                "final_value": row.Final_Value,
+            })
+
+        self.reference = compile_ranges({
+            test_id: range_text(ranges[0]["initial_value"], ranges[0]["final_value"])
+            for test_id, ranges in self.ranges.items()
+        })
+
+        # Rows offered on the test selection screen, already in display order
+        self.selectable = sorted(
+            (t for t in self.tests.values()
+             if t["display_no"] is not None and str(t["display_no"]).strip()),
+            key=display_sort_key
+        )
+        self.search_index = TestSearchIndex(self.selectable)
+
+    def get(self, test_id):
+        return self.tests.get(test_id)
+
+    def subtests(self, test_id):
+        """Sub-tests (General_Test_Id = test_id) in display order"""
+        return self.children.get(test_id, [])
+
+    def subtests_for(self, test_ids):
+        """Sub-tests of several main tests at once: {test_id: [sub-tests]}"""
+        return {test_id: self.children.get(test_id, []) for test_id in test_ids}
+
+    def first_range(self, test_id):
+        """Normal range with the lowest Ref_Id for a test, or None"""
+        ranges = self.ranges.get(test_id)
+        return ranges[0] if ranges else None
+
+    def reference_range(self, test_id):
+        """Compiled first normal range of a test (see ranges.py), or None"""
+        return self.reference.get(test_id)
+
+
+# -----------------------------
+# PROCESS-WIDE ACCESS
+# -----------------------------
+_catalog = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _read_version(cur):
+    cur.execute(VERSION_SQL)
+    return tuple(cur.fetchone())
+
+
+def _load(cur, version):
+    cur.execute("""
+        SELECT
+            t.Test_Id, t.Id, t.Test_Name, t.General_Test_Id, t.Unit,
+            ti.Id AS IdentityId, ti.Test_Display_No, ti.Test_Display_Name, ti.SRate, ti.ReportID
+        FROM test t
+        LEFT JOIN test_identity ti ON t.Id = ti.Id
+    """)
+    test_rows = cur.fetchall()
+    cur.execute("""
+        SELECT Ref_Id, Test_Id, Inital_Value, Final_Value
+        FROM Normal_Ranges
+        ORDER BY Test_Id, Ref_Id
+    """)
+    range_rows = cur.fetchall()
+    log.info("Test catalog loaded: %d tests, %d ranges", len(test_rows), len(range_rows))
+    return TestCatalog(version, test_rows, range_rows)
+
+
+def get_catalog(force_check=False):
+    """
+    Return the current catalog snapshot.
+
+    The version stamp is re-read at most every VERSION_CHECK_INTERVAL seconds; the full
+    reload only happens when it changed. Snapshots are never mutated, so callers may
+    keep a reference for the duration of a page render.
+    """
+    global _catalog, _checked_at
+    now = time.monotonic()
+    if _catalog is not None and not force_check and now - _checked_at < VERSION_CHECK_INTERVAL:
+        return _catalog
+
+    with _lock:
+        if _catalog is not None and not force_check and now - _checked_at < VERSION_CHECK_INTERVAL:
+            return _catalog
+        with get_connection() as con:
+            cur = con.cursor()
+            version = _read_version(cur)
+            if _catalog is None or version != _catalog.version:
+                _catalog = _load(cur, version)
+        _checked_at = time.monotonic()
+        return _catalog
+
+
+def invalidate():
+    """Force the next get_catalog() call to re-check the version stamp"""
+    global _checked_at
+    _checked_at = 0.0
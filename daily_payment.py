@@ -0,0 +1,101 @@
+"""
+Daily Payment Detail Data
+Features: the report's three independent statements (detail rows, previous due from the
+receivables ledger, month-to-date sale) dispatched concurrently, each on its own pooled
+connection, with per-component timings - latency is the slowest statement, not the sum
+"""
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from db import read_sql, day_bounds
+from order_summary import summary_source
+from receivables import due_before
+
+log = logging.getLogger("lab.daily_payment")
+
+
+# -----------------------------
+# COMPONENTS
+# -----------------------------
+def detail_rows(from_date, to_date, from_lab, to_lab):
+    """One row per patient: tests and amounts come from the order summary"""
+    summary_join, col = summary_source()
+    return read_sql(f"""
+        SELECT
+            p.PatientNo AS [Pat#],
+            p.LabNo AS [Lab#],
+            p.Patient_Name AS [Patient Name],
+            {col["tests"]} AS Tests,
+            CONVERT(VARCHAR, p.Visit_Date, 106) AS [Visit Date],
+            CONVERT(VARCHAR(15), p.Visit_Date, 100) AS [Visit Time],
+            ISNULL(d.DoctorName, 'N/A') AS [Referred By],
+            {col["total"]} AS Total,
+            {col["discount"]} AS Discount,
+            {col["paid"]} AS Paid,
+            {col["due"]} AS Due
+        FROM patient p
+        LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+        {summary_join}
+        WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
+          AND p.LabNo BETWEEN ? AND ?
+        ORDER BY p.LabNo
+    """, params=[*day_bounds(from_date, to_date), from_lab, to_lab])
+
+
+def previous_due(from_date):
+    """Receivables balance at the start of from_date (closing of the day before, from the ledger)"""
+    return due_before(day_bounds(from_date)[0])
+
+
+def monthly_sale(to_date):
+    """Amount paid from the first of to_date's month up to and including to_date"""
+    summary_join, col = summary_source()
+    month_start = datetime(to_date.year, to_date.month, 1)
+    df = read_sql(f"""
+        SELECT ISNULL(SUM({col["paid"]}), 0) AS MonthlySale
+        FROM patient p
+        {summary_join}
+        WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
+    """, params=[*day_bounds(month_start, to_date)])
+    return df['MonthlySale'].iloc[0] if not df.empty else 0
+
+
+def _timed(component, *args):
+    started = time.perf_counter()
+    value = component(*args)
+    return value, (time.perf_counter() - started) * 1000
+
+
+# -----------------------------
+# PUBLIC API
+# -----------------------------
+def daily_payment_data(from_date, to_date, from_lab, to_lab):
+    """
+    Everything the Daily Payment Detail report shows, fetched concurrently.
+
+    Returns:
+        dict with rows (DataFrame), prev_due, monthly_sale,
+        timings {component: ms} and elapsed_ms (wall clock for all of them)
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="daily-payment") as pool:
+        futures = {
+            "detail": pool.submit(_timed, detail_rows, from_date, to_date, from_lab, to_lab),
+            "previous_due": pool.submit(_timed, previous_due, from_date),
+            "monthly_sale": pool.submit(_timed, monthly_sale, to_date),
+        }
+        results = {name: future.result() for name, future in futures.items()}
+    elapsed = (time.perf_counter() - started) * 1000
+
+    timings = {name: ms for name, (_, ms) in results.items()}
+    log.info("Daily payment report in %.0f ms (%s)", elapsed,
+             ", ".join(f"{name} {ms:.0f} ms" for name, ms in timings.items()))
+    return {
+        "rows": results["detail"][0],
+        "prev_due": results["previous_due"][0],
+        "monthly_sale": results["monthly_sale"][0],
+        "timings": timings,
+        "elapsed_ms": elapsed,
+    }
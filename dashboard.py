@@ -1,14 +1,12 @@
 import streamlit as st
-from db import get_connection
-import pandas as pd
+from db import read_sql
+from patient_keys import join_on
 
 def dashboard():
     st.title(st.session_state.lab_name)
     st.subheader("Today Patients")
 
-    conn = get_connection()
-
-    query = """
+    query = f"""
     SELECT 
         p.LabNo,
         p.Patient_Name,
@@ -22,16 +20,17 @@ def dashboard():
             ELSE 'Waiting'
         END AS Status
     FROM patient p
-    JOIN patient_test pt ON p.Patient_Id = pt.PatientID
+    JOIN patient_test pt ON {join_on("pt", "patient_test")}
     JOIN Test_identity ti ON pt.Test_ID = ti.Id
-    LEFT JOIN patientpayment pp ON p.Patient_Id = pp.PatientID
+    LEFT JOIN patientpayment pp ON {join_on("pp", "patientpayment")}
     WHERE 
-        CAST(p.Visit_Date AS DATE) = CAST(GETDATE() AS DATE)
+        p.Visit_Date >= CAST(GETDATE() AS DATE)
+        AND p.Visit_Date < DATEADD(DAY, 1, CAST(GETDATE() AS DATE))
         AND p.LabID = ?
     GROUP BY 
         p.LabNo, p.Patient_Name, pp.TotalAmount, pp.AmountPaid
     ORDER BY p.LabNo DESC
     """
 
-    df = pd.read_sql(query, conn, params=[st.session_state.lab_id])
+    df = read_sql(query, params=[st.session_state.lab_id])
     st.dataframe(df, use_container_width=True)
@@ -1,12 +1,315 @@
+"""
+Shared Database Access Layer
+Features: one place for connection settings, process-wide pyodbc connection pool
+(sized, health-checked, idle eviction, leak detection) used by every page and report
+"""
+import os
+import time
+import logging
+import threading
+import traceback
+import weakref
+from collections import deque
+from datetime import datetime, timedelta, time as time_of_day
+
 import pyodbc
+import pandas as pd
 
-def get_connection():
-    conn = pyodbc.connect(
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        "SERVER=dbserver\sqlexpress;"          # change if needed
-        "DATABASE=Lab;"        # <-- your database name
-        "UID=sa;"                    # or SQL user
-        "PWD=aielitetechsims2000;"          # <-- change
+log = logging.getLogger("lab.db")
+
+# -----------------------------
+# CONNECTION SETTINGS (SINGLE SOURCE)
+# -----------------------------
+# Every value can be overridden with an environment variable so the same code
+# runs against the office server, the remote server and a developer laptop.
+DB_CONFIG = {
+    "driver": os.environ.get("LAB_DB_DRIVER", "ODBC Driver 17 for SQL Server"),
+    "server": os.environ.get("LAB_DB_SERVER", "91.239.146.172"),
+    "database": os.environ.get("LAB_DB_NAME", "Labnew"),
+    "uid": os.environ.get("LAB_DB_USER", "labuser"),
+    "pwd": os.environ.get("LAB_DB_PASSWORD", "janan123%%"),
+}
+
+POOL_CONFIG = {
+    "max_size": int(os.environ.get("LAB_DB_POOL_SIZE", "10")),        # max open connections
+    "acquire_timeout": float(os.environ.get("LAB_DB_POOL_TIMEOUT", "30")),   # seconds to wait for a free slot
+    "idle_timeout": float(os.environ.get("LAB_DB_IDLE_TIMEOUT", "300")),     # close connections idle longer than this
+    "health_check_after": float(os.environ.get("LAB_DB_HEALTH_AFTER", "30")),  # ping connections idle longer than this
+    "leak_timeout": float(os.environ.get("LAB_DB_LEAK_TIMEOUT", "120")),     # warn about connections held longer than this
+}
+
+
+def connection_string(config=None):
+    """Build the ODBC connection string from DB_CONFIG"""
+    cfg = config or DB_CONFIG
+    return (
+        f"DRIVER={{{cfg['driver']}}};"
+        f"SERVER={cfg['server']};"
+        f"DATABASE={cfg['database']};"
+        f"UID={cfg['uid']};"
+        f"PWD={cfg['pwd']}"
     )
-    return conn
 
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within acquire_timeout"""
+
+
+# -----------------------------
+# BORROWED CONNECTION WRAPPER
+# -----------------------------
+class PooledConnection:
+    """
+    Thin wrapper around a pyodbc connection borrowed from the pool.
+
+    Behaves like the raw connection (cursor, commit, rollback, ...) but close()
+    returns it to the pool instead of dropping the socket. Used as a context
+    manager it commits on success, rolls back on error and always returns.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+        self.borrowed_at = time.monotonic()
+        self.borrowed_by = "".join(traceback.format_stack(limit=6)[:-2])
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+    def cursor(self):
+        return self._raw.cursor()
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        """Return the connection to the pool (uncommitted work is rolled back, as with a real close)"""
+        if not self._released:
+            self._released = True
+            self._pool._release(self._raw, self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._raw.commit()
+            else:
+                self._raw.rollback()
+        except pyodbc.Error:
+            pass
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        # Caller forgot close(): hand the connection back instead of leaking it
+        if not getattr(self, "_released", True):
+            try:
+                log.warning("Pooled connection garbage-collected without close(); borrowed at:\n%s", self.borrowed_by)
+                self.close()
+            except Exception:
+                pass
+
+
+# -----------------------------
+# CONNECTION POOL
+# -----------------------------
+class ConnectionPool:
+    """Process-wide pool of pyodbc connections"""
+
+    def __init__(self, conn_str, max_size=10, acquire_timeout=30.0, idle_timeout=300.0,
+                 health_check_after=30.0, leak_timeout=120.0):
+        self.conn_str = conn_str
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.leak_timeout = leak_timeout
+
+        self._lock = threading.RLock()   # re-entrant: __del__ of a wrapper may release while held
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = deque()          # (raw_connection, returned_at)
+        self._borrowed = weakref.WeakValueDictionary()   # id(wrapper) -> wrapper (weak so __del__ can reclaim)
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "broken": 0, "leaks": 0}
+
+    def _connect(self):
+        raw = pyodbc.connect(self.conn_str)
+        self.stats["created"] += 1
+        return raw
+
+    @staticmethod
+    def _discard(raw):
+        try:
+            raw.close()
+        except pyodbc.Error:
+            pass
+
+    @staticmethod
+    def _is_alive(raw):
+        try:
+            cur = raw.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _evict_idle(self, now):
+        """Close connections that sat unused longer than idle_timeout (caller holds the lock)"""
+        kept = deque()
+        while self._idle:
+            raw, returned_at = self._idle.popleft()
+            if now - returned_at > self.idle_timeout:
+                self._discard(raw)
+                self.stats["evicted"] += 1
+            else:
+                kept.append((raw, returned_at))
+        self._idle = kept
+
+    def _report_leaks(self, now):
+        """Log every connection held longer than leak_timeout (caller holds the lock)"""
+        for wrapper in list(self._borrowed.values()):
+            held = now - wrapper.borrowed_at
+            if held > self.leak_timeout and not getattr(wrapper, "_leak_reported", False):
+                wrapper._leak_reported = True
+                self.stats["leaks"] += 1
+                log.warning("Connection held for %.0fs (possible leak); borrowed at:\n%s", held, wrapper.borrowed_by)
+
+    def acquire(self):
+        """Borrow a healthy connection, waiting up to acquire_timeout for a free slot"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._report_leaks(time.monotonic())
+            raise PoolTimeout(
+                f"No database connection available after {self.acquire_timeout:.0f}s "
+                f"(pool size {self.max_size})"
+            )
+
+        try:
+            raw = None
+            while raw is None:
+                now = time.monotonic()
+                with self._lock:
+                    self._evict_idle(now)
+                    self._report_leaks(now)
+                    candidate = self._idle.pop() if self._idle else None
+
+                if candidate is None:
+                    raw = self._connect()
+                    break
+
+                candidate_raw, returned_at = candidate
+                if now - returned_at > self.health_check_after and not self._is_alive(candidate_raw):
+                    self._discard(candidate_raw)
+                    self.stats["broken"] += 1
+                    continue
+                raw = candidate_raw
+                self.stats["reused"] += 1
+        except Exception:
+            self._slots.release()
+            raise
+
+        wrapper = PooledConnection(self, raw)
+        with self._lock:
+            self._borrowed[id(wrapper)] = wrapper
+        return wrapper
+
+    def _release(self, raw, wrapper):
+        with self._lock:
+            self._borrowed.pop(id(wrapper), None)
+
+        try:
+            # Same semantics as closing a real connection: uncommitted work is discarded
+            raw.rollback()
+            cur = raw.cursor()
+            cur.execute("IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION")
+            cur.close()
+            healthy = True
+        except pyodbc.Error:
+            healthy = False
+
+        if healthy:
+            with self._lock:
+                self._idle.append((raw, time.monotonic()))
+        else:
+            self._discard(raw)
+            self.stats["broken"] += 1
+        self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones are closed when returned)"""
+        with self._lock:
+            while self._idle:
+                raw, _ = self._idle.popleft()
+                self._discard(raw)
+
+    def status(self):
+        """Snapshot of pool usage for diagnostics"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "borrowed": len(self._borrowed),
+                **self.stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(connection_string(), **POOL_CONFIG)
+    return _pool
+
+
+# -----------------------------
+# PUBLIC API
+# -----------------------------
+def get_connection():
+    """
+    Borrow a pooled connection.
+
+    Preferred usage:
+        with get_connection() as con:
+            cur = con.cursor()
+            ...
+    Calling con.close() also returns the connection to the pool.
+    """
+    return get_pool().acquire()
+
+
+def read_sql(query, params=None):
+    """pandas.read_sql on a pooled connection that is returned straight after the read"""
+    with get_connection() as con:
+        return pd.read_sql(query, con, params=params)
+
+
+def day_bounds(from_date, to_date=None):
+    """
+    Half-open [start, end) bounds covering whole days, for sargable date filters:
+        WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
+    instead of CAST(p.Visit_Date AS DATE) BETWEEN ? AND ?, which cannot seek an index.
+    """
+    to_date = to_date or from_date
+    if isinstance(from_date, datetime):
+        from_date = from_date.date()
+    if isinstance(to_date, datetime):
+        to_date = to_date.date()
+    start = datetime.combine(from_date, time_of_day.min)
+    end = datetime.combine(to_date, time_of_day.min) + timedelta(days=1)
+    return start, end
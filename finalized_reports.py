@@ -0,0 +1,257 @@
+"""
+Finalized Report Store
+Features: once results are verified the rendered report (gzip HTML, PDF when available) and a
+gzip JSON snapshot of its data are written once to local storage, read-only, and indexed by
+LabNo / PatientNo / visit date in SQLite; re-prints are a file read, never a rebuild
+"""
+import os
+import sys
+import stat
+import gzip
+import hashlib
+import uuid
+import shutil
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+import reports
+from pdf_render import PDF_AVAILABLE, html_to_pdf
+
+log = logging.getLogger("lab.finalized_reports")
+
+STORE_DIR = os.environ.get(
+    "LAB_REPORT_STORE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_store"),
+)
+INDEX_PATH = os.path.join(STORE_DIR, "index.sqlite")
+
+INDEX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS finalized_report (
+        patient_id   INTEGER PRIMARY KEY,
+        lab_no       TEXT,          -- as shown on the report (PatientNo is e.g. 'P123')
+        patient_no   TEXT,
+        visit_date   TEXT,          -- ISO date
+        patient_name TEXT,
+        finalized_at TEXT NOT NULL,
+        finalized_by TEXT,
+        html_path    TEXT NOT NULL, -- relative to STORE_DIR
+        pdf_path     TEXT,
+        data_path    TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS ix_finalized_lab_no ON finalized_report (lab_no);
+    CREATE INDEX IF NOT EXISTS ix_finalized_patient_no ON finalized_report (patient_no);
+    CREATE INDEX IF NOT EXISTS ix_finalized_visit_date ON finalized_report (visit_date);
+"""
+
+_lock = threading.Lock()
+_schema_ready = False
+
+
+class AlreadyFinalized(Exception):
+    """Raised when a patient's report has already been finalized (the store is write-once)"""
+
+
+# -----------------------------
+# INDEX
+# -----------------------------
+def _index():
+    global _schema_ready
+    os.makedirs(STORE_DIR, exist_ok=True)
+    con = sqlite3.connect(INDEX_PATH, timeout=30)
+    con.row_factory = sqlite3.Row
+    if not _schema_ready:
+        con.executescript(INDEX_SCHEMA)
+        _schema_ready = True
+    return con
+
+
+def get_finalized(patient_id):
+    """Index record (dict) of a patient's finalized report, or None"""
+    con = _index()
+    try:
+        row = con.execute("SELECT * FROM finalized_report WHERE patient_id = ?", (int(patient_id),)).fetchone()
+    finally:
+        con.close()
+    return dict(row) if row else None
+
+
+def find_finalized(lab_no=None, patient_no=None, visit_date=None):
+    """Index records matching any combination of LabNo, PatientNo and visit date"""
+    sql, params = "SELECT * FROM finalized_report WHERE 1=1", []
+    if lab_no:
+        sql += " AND lab_no = ?"
+        params.append(str(lab_no).strip())
+    if patient_no:
+        sql += " AND patient_no = ?"
+        params.append(str(patient_no).strip())
+    if visit_date:
+        sql += " AND visit_date = ?"
+        params.append(visit_date.isoformat() if hasattr(visit_date, "isoformat") else str(visit_date))
+    sql += " ORDER BY visit_date DESC, lab_no"
+    con = _index()
+    try:
+        return [dict(row) for row in con.execute(sql, params).fetchall()]
+    finally:
+        con.close()
+
+
+# -----------------------------
+# FILES
+# -----------------------------
+def _write_file(path, payload):
+    """Write bytes to a new read-only file"""
+    with open(path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(path, 0o444)
+
+
+def _make_writable(func, path, _error):
+    """rmtree error handler: Windows will not delete read-only files, so clear the flag and retry"""
+    os.chmod(path, stat.S_IWRITE)
+    func(path)
+
+
+def _remove_dir(path, missing_ok=False):
+    """Remove a report directory including its read-only files"""
+    if missing_ok and not os.path.exists(path):
+        return
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=_make_writable)
+    else:
+        shutil.rmtree(path, onerror=_make_writable)
+
+
+def _discard(path):
+    """Best-effort cleanup after a failed finalize; a leftover is logged, not raised over the real error"""
+    try:
+        _remove_dir(path, missing_ok=True)
+    except OSError:
+        log.warning("Could not remove %s", path, exc_info=True)
+
+
+def _write_report_dir(relative_dir, parts):
+    """
+    Write all parts of a report into a temp directory and rename it into place in one
+    step, so a failure part-way never leaves a half-written report in the store.
+
+    Returns {part name: relative path}.
+    """
+    target = os.path.join(STORE_DIR, relative_dir)
+    temp = os.path.join(STORE_DIR, ".tmp", uuid.uuid4().hex)
+    os.makedirs(temp)
+    try:
+        for name, payload in parts.items():
+            _write_file(os.path.join(temp, name), payload)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.exists(target):
+            # Left by a finalize that died between the rename and the index insert
+            log.warning("Removing unindexed report directory %s", relative_dir)
+            _remove_dir(target)
+        os.rename(temp, target)
+    except Exception:
+        _discard(temp)
+        raise
+    return {name: f"{relative_dir}/{name}" for name in parts}
+
+
+def _read(relative_path):
+    with open(os.path.join(STORE_DIR, relative_path), "rb") as f:
+        return f.read()
+
+
+def read_html(record):
+    return gzip.decompress(_read(record["html_path"])).decode("utf-8")
+
+
+def read_pdf(record):
+    """Stored PDF bytes, or None when the report was finalized without a PDF engine"""
+    return _read(record["pdf_path"]) if record.get("pdf_path") else None
+
+
+def read_data(record):
+    """The report data snapshot the stored report was rendered from (logo as logo_sha1)"""
+    return json.loads(gzip.decompress(_read(record["data_path"])).decode("utf-8"))
+
+
+def _snapshot(report_data):
+    """
+    Report data as stored next to the report: the logo (a base64 data URI of several KB,
+    identical for every report of a lab) is replaced by its hash - the rendered report
+    keeps the image itself
+    """
+    patient = dict(report_data["patient"])
+    logo = patient.pop("logo_data_uri", None)
+    patient["logo_sha1"] = hashlib.sha1(logo.encode("ascii")).hexdigest() if logo else None
+    return {**report_data, "patient": patient}
+
+
+def _visit_day(report_data):
+    try:
+        return datetime.strptime(report_data["patient"]["visit_date"], "%d-%b-%Y %I:%M %p").date()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# -----------------------------
+# FINALIZE
+# -----------------------------
+def finalize(patient_id, finalized_by=None):
+    """
+    Render the patient's report from live data once and store it.
+
+    Returns the index record. Raises AlreadyFinalized when the patient's report is
+    already in the store (finalized reports are never replaced).
+    """
+    report_data = reports.get_patient_report_data(patient_id)
+    if not report_data:
+        raise ValueError(f"No report data for patient {patient_id}")
+    html = reports.generate_standard_report_html(report_data)
+    pdf = html_to_pdf(html) if PDF_AVAILABLE else None
+
+    patient = report_data["patient"]
+    day = _visit_day(report_data)
+    folder = day.strftime("%Y/%m/%d") if day else "undated"
+    report_dir = f"{folder}/LabReport_Lab{patient['lab_no']}_Patient{patient['patient_no']}_{patient_id}"
+    parts = {
+        "report.html.gz": gzip.compress(html.encode("utf-8")),
+        "data.json.gz": gzip.compress(json.dumps(_snapshot(report_data), default=str, ensure_ascii=False).encode("utf-8")),
+    }
+    if pdf:
+        parts["report.pdf"] = pdf
+
+    with _lock:
+        if get_finalized(patient_id):
+            raise AlreadyFinalized(f"Report of patient {patient_id} is already finalized")
+        paths = _write_report_dir(report_dir, parts)
+        record = {
+            "patient_id": int(patient_id),
+            "lab_no": str(patient["lab_no"]),
+            "patient_no": str(patient["patient_no"]),
+            "visit_date": day.isoformat() if day else None,
+            "patient_name": patient["name"],
+            "finalized_at": datetime.now().isoformat(timespec="seconds"),
+            "finalized_by": finalized_by,
+            "html_path": paths["report.html.gz"],
+            "pdf_path": paths.get("report.pdf"),
+            "data_path": paths["data.json.gz"],
+        }
+        con = _index()
+        try:
+            with con:
+                con.execute(
+                    f"INSERT INTO finalized_report ({', '.join(record)}) VALUES ({', '.join('?' * len(record))})",
+                    list(record.values()),
+                )
+        except Exception:
+            # No index row, no report: drop the files so a retry can finalize again
+            _discard(os.path.join(STORE_DIR, report_dir))
+            raise
+        finally:
+            con.close()
+    log.info("Report of patient %s finalized (Lab No %s)", patient_id, patient["lab_no"])
+    return record
@@ -0,0 +1,195 @@
+"""
+Database Migration Tool
+Features: applies the versioned scripts in migrations/ (NNNN_name.sql, batches split on GO)
+once each, records them in schema_migrations, and has a check mode that reports pending
+migrations and missing indexes on a given database without changing anything.
+
+Usage:
+    python migrate.py            # apply pending migrations
+    python migrate.py --check    # report pending migrations / missing indexes (exit 1 if any)
+    python migrate.py --list     # show applied and pending migrations
+    python migrate.py --rerun 6  # apply an already applied (re-runnable) migration again
+Connection settings come from db.py (LAB_DB_* environment variables).
+"""
+import os
+import re
+import sys
+import argparse
+from datetime import datetime
+
+from db import get_connection
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Indexes the application's queries are written against: (table, index name, purpose)
+REQUIRED_INDEXES = [
+    ("patient", "IX_patient_Visit_Date", "today / date-range filters"),
+    ("patient", "IX_patient_LabNo", "receipt search and Lab No ranges"),
+    ("patient_test", "IX_patient_test_PatientID", "tests per patient"),
+    ("patientpayment", "IX_patientpayment_PatientID", "payment per patient"),
+    ("patient_test_results", "IX_patient_test_results_Patient_Test", "results per patient/test"),
+    ("test", "IX_test_General_Test_Id", "sub-tests per main test"),
+    ("patient_test", "IX_patient_test_PatientKey", "typed patient key joins"),
+    ("patientpayment", "IX_patientpayment_PatientKey", "typed patient key joins"),
+    ("patient_test_results", "IX_patient_test_results_PatientKey", "typed patient key joins"),
+    ("patientpayment", "IX_patientpayment_RowVer", "dashboard delta polling"),
+    ("patient_test", "IX_patient_test_RowVer", "dashboard delta polling"),
+    ("patient_test_results", "IX_patient_test_results_RowVer", "dashboard delta polling"),
+    ("receivable_entry", "IX_receivable_entry_PatientId", "ledger reversal per patient"),
+]
+
+SCHEMA_TABLE_DDL = """
+IF OBJECT_ID('dbo.schema_migrations', 'U') IS NULL
+CREATE TABLE dbo.schema_migrations (
+    Version   INT          NOT NULL PRIMARY KEY,
+    Name      VARCHAR(200) NOT NULL,
+    AppliedAt DATETIME     NOT NULL
+)
+"""
+
+_GO = re.compile(r"^\s*GO\s*$", re.IGNORECASE | re.MULTILINE)
+_FILE = re.compile(r"^(\d{4})_(.+)\.sql$")
+
+
+# -----------------------------
+# MIGRATION FILES
+# -----------------------------
+def load_migrations():
+    """[(version, name, [batches])] in version order"""
+    migrations = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _FILE.match(file_name)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, file_name), encoding="utf-8") as f:
+            batches = [b.strip() for b in _GO.split(f.read()) if b.strip()]
+        migrations.append((int(match.group(1)), match.group(2), batches))
+    return migrations
+
+
+def applied_versions(cur):
+    cur.execute(SCHEMA_TABLE_DDL)
+    cur.execute("SELECT Version FROM dbo.schema_migrations")
+    return {row[0] for row in cur.fetchall()}
+
+
+def missing_indexes(cur):
+    """Required indexes that do not exist on the connected database"""
+    missing = []
+    for table, index_name, purpose in REQUIRED_INDEXES:
+        cur.execute("""
+            SELECT 1 FROM sys.indexes
+            WHERE name = ? AND object_id = OBJECT_ID(?)
+        """, (index_name, f"dbo.{table}"))
+        if cur.fetchone() is None:
+            missing.append((table, index_name, purpose))
+    return missing
+
+
+# -----------------------------
+# COMMANDS
+# -----------------------------
+def apply_pending():
+    with get_connection() as con:
+        cur = con.cursor()
+        done = applied_versions(cur)
+        con.commit()
+
+        pending = [m for m in load_migrations() if m[0] not in done]
+        if not pending:
+            print("Database is up to date.")
+            return 0
+
+        for version, name, batches in pending:
+            print(f"Applying {version:04d}_{name} ...", end=" ", flush=True)
+            try:
+                for batch in batches:
+                    cur.execute(batch)
+                cur.execute(
+                    "INSERT INTO dbo.schema_migrations (Version, Name, AppliedAt) VALUES (?, ?, ?)",
+                    (version, name, datetime.now())
+                )
+                con.commit()
+                print("done")
+            except Exception as e:
+                con.rollback()
+                print("FAILED")
+                print(f"  {e}")
+                return 1
+    return 0
+
+
+def rerun(version):
+    """Apply one already applied migration again; only for scripts written to be re-run"""
+    scripts = {m[0]: m for m in load_migrations()}
+    if version not in scripts:
+        print(f"No migration {version:04d} in {MIGRATIONS_DIR}")
+        return 1
+    _, name, batches = scripts[version]
+    with get_connection() as con:
+        cur = con.cursor()
+        if version not in applied_versions(cur):
+            con.rollback()
+            print(f"{version:04d}_{name} is not applied yet; run migrate.py without --rerun")
+            return 1
+        print(f"Re-running {version:04d}_{name} ...", end=" ", flush=True)
+        try:
+            for batch in batches:
+                cur.execute(batch)
+            con.commit()
+            print("done")
+        except Exception as e:
+            con.rollback()
+            print("FAILED")
+            print(f"  {e}")
+            return 1
+    return 0
+
+
+def check():
+    with get_connection() as con:
+        cur = con.cursor()
+        done = applied_versions(cur)
+        pending = [m for m in load_migrations() if m[0] not in done]
+        missing = missing_indexes(cur)
+        con.rollback()   # check mode never leaves changes behind
+
+    for version, name, _ in pending:
+        print(f"PENDING  {version:04d}_{name}")
+    for table, index_name, purpose in missing:
+        print(f"MISSING  {table}.{index_name}  ({purpose})")
+    if not pending and not missing:
+        print("OK: all migrations applied and all required indexes present.")
+        return 0
+    return 1
+
+
+def list_migrations():
+    with get_connection() as con:
+        done = applied_versions(con.cursor())
+        con.rollback()
+    for version, name, _ in load_migrations():
+        print(f"{'applied' if version in done else 'pending'}  {version:04d}_{name}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or check Lab database migrations")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--check", action="store_true", help="report pending migrations and missing indexes")
+    group.add_argument("--list", action="store_true", help="list applied and pending migrations")
+    group.add_argument("--rerun", type=int, metavar="VERSION",
+                       help="apply an already applied migration again (re-runnable backfills)")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return check()
+    if args.list:
+        return list_migrations()
+    if args.rerun is not None:
+        return rerun(args.rerun)
+    return apply_pending()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
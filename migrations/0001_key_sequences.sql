@@ -0,0 +1,19 @@
+-- Support tables for sequences.py (hi/lo key blocks and the daily LabNo counter).
+-- The application also creates these on first use; shipping them here lets a DBA
+-- provision the database up front with restricted application permissions.
+
+IF OBJECT_ID('dbo.id_sequence', 'U') IS NULL
+CREATE TABLE dbo.id_sequence (
+    SeqName   VARCHAR(50) NOT NULL PRIMARY KEY,
+    NextValue BIGINT      NOT NULL
+);
+GO
+
+IF OBJECT_ID('dbo.lab_daily_counter', 'U') IS NULL
+CREATE TABLE dbo.lab_daily_counter (
+    LabID       INT  NOT NULL,
+    CounterDate DATE NOT NULL,
+    LastLabNo   INT  NOT NULL,
+    CONSTRAINT PK_lab_daily_counter PRIMARY KEY (LabID, CounterDate)
+);
+GO
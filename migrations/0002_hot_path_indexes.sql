@@ -0,0 +1,38 @@
+-- Indexes behind the dashboard, receipt search and the date-range reports.
+-- Queries filter Visit_Date with half-open ranges (Visit_Date >= @day AND
+-- Visit_Date < @next_day), which can seek these indexes.
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_Visit_Date' AND object_id = OBJECT_ID('dbo.patient'))
+CREATE NONCLUSTERED INDEX IX_patient_Visit_Date
+    ON dbo.patient (Visit_Date)
+    INCLUDE (LabNo, PatientNo, Patient_Name, Refered_By);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_LabNo' AND object_id = OBJECT_ID('dbo.patient'))
+CREATE NONCLUSTERED INDEX IX_patient_LabNo
+    ON dbo.patient (LabNo, Visit_Date);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_PatientID' AND object_id = OBJECT_ID('dbo.patient_test'))
+CREATE NONCLUSTERED INDEX IX_patient_test_PatientID
+    ON dbo.patient_test (PatientID)
+    INCLUDE (Test_ID, PaymentID);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patientpayment_PatientID' AND object_id = OBJECT_ID('dbo.patientpayment'))
+CREATE NONCLUSTERED INDEX IX_patientpayment_PatientID
+    ON dbo.patientpayment (PatientID)
+    INCLUDE (TotalAmount, Discount, AmountPaid);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_results_Patient_Test' AND object_id = OBJECT_ID('dbo.patient_test_results'))
+CREATE NONCLUSTERED INDEX IX_patient_test_results_Patient_Test
+    ON dbo.patient_test_results (Patient_No, Test_No)
+    INCLUDE (Test_Values, Remarks);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_test_General_Test_Id' AND object_id = OBJECT_ID('dbo.test'))
+CREATE NONCLUSTERED INDEX IX_test_General_Test_Id
+    ON dbo.test (General_Test_Id)
+    INCLUDE (Test_Name, Id);
+GO
@@ -0,0 +1,42 @@
+-- Typed patient key on the tables that store the patient id as a string.
+--
+-- PatientKey is a NON-persisted computed column, so adding it is a metadata-only change
+-- (no table rewrite, no long lock). The index materialises it; on Enterprise edition add
+-- WITH (ONLINE = ON) to build the index without blocking writers. Existing code keeps
+-- writing PatientID / Patient_No unchanged and the key follows automatically.
+--
+-- Note: sessions inserting into these tables must use the default ANSI settings
+-- (ANSI_NULLS, QUOTED_IDENTIFIER, ARITH_ABORT ON), which the SQL Server ODBC driver does.
+
+IF COL_LENGTH('dbo.patient_test', 'PatientKey') IS NULL
+ALTER TABLE dbo.patient_test ADD PatientKey AS
+    CAST(CASE WHEN PatientID NOT LIKE '%[^0-9]%' AND LEN(PatientID) BETWEEN 1 AND 9 THEN PatientID END AS INT);
+GO
+
+IF COL_LENGTH('dbo.patientpayment', 'PatientKey') IS NULL
+ALTER TABLE dbo.patientpayment ADD PatientKey AS
+    CAST(CASE WHEN PatientID NOT LIKE '%[^0-9]%' AND LEN(PatientID) BETWEEN 1 AND 9 THEN PatientID END AS INT);
+GO
+
+IF COL_LENGTH('dbo.patient_test_results', 'PatientKey') IS NULL
+ALTER TABLE dbo.patient_test_results ADD PatientKey AS
+    CAST(CASE WHEN Patient_No NOT LIKE '%[^0-9]%' AND LEN(Patient_No) BETWEEN 1 AND 9 THEN Patient_No END AS INT);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_PatientKey' AND object_id = OBJECT_ID('dbo.patient_test'))
+CREATE NONCLUSTERED INDEX IX_patient_test_PatientKey
+    ON dbo.patient_test (PatientKey)
+    INCLUDE (Test_ID, PaymentID);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patientpayment_PatientKey' AND object_id = OBJECT_ID('dbo.patientpayment'))
+CREATE NONCLUSTERED INDEX IX_patientpayment_PatientKey
+    ON dbo.patientpayment (PatientKey)
+    INCLUDE (TotalAmount, Discount, AmountPaid);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_results_PatientKey' AND object_id = OBJECT_ID('dbo.patient_test_results'))
+CREATE NONCLUSTERED INDEX IX_patient_test_results_PatientKey
+    ON dbo.patient_test_results (PatientKey, Test_No)
+    INCLUDE (Test_Values, Remarks);
+GO
@@ -0,0 +1,44 @@
+-- Row versions for the dashboard's delta polling.
+--
+-- A rowversion column is stamped by SQL Server on every insert and update, so "what changed
+-- since the last poll" becomes RowVer >= @watermark instead of re-reading the whole day.
+-- Unlike the computed key in 0003, adding a rowversion column writes a value into every
+-- existing row: run this migration outside opening hours on large tables.
+--
+-- Every INSERT into these tables must name its columns (all application inserts do).
+
+IF COL_LENGTH('dbo.patient', 'RowVer') IS NULL
+ALTER TABLE dbo.patient ADD RowVer ROWVERSION;
+GO
+
+IF COL_LENGTH('dbo.patientpayment', 'RowVer') IS NULL
+ALTER TABLE dbo.patientpayment ADD RowVer ROWVERSION;
+GO
+
+IF COL_LENGTH('dbo.patient_test', 'RowVer') IS NULL
+ALTER TABLE dbo.patient_test ADD RowVer ROWVERSION;
+GO
+
+IF COL_LENGTH('dbo.patient_test_results', 'RowVer') IS NULL
+ALTER TABLE dbo.patient_test_results ADD RowVer ROWVERSION;
+GO
+
+-- patient is filtered by Visit_Date first (IX_patient_Visit_Date); the child tables are
+-- searched by RowVer and joined back to the patient through the typed key
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patientpayment_RowVer' AND object_id = OBJECT_ID('dbo.patientpayment'))
+CREATE NONCLUSTERED INDEX IX_patientpayment_RowVer
+    ON dbo.patientpayment (RowVer)
+    INCLUDE (PatientID);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_RowVer' AND object_id = OBJECT_ID('dbo.patient_test'))
+CREATE NONCLUSTERED INDEX IX_patient_test_RowVer
+    ON dbo.patient_test (RowVer)
+    INCLUDE (PatientID);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_patient_test_results_RowVer' AND object_id = OBJECT_ID('dbo.patient_test_results'))
+CREATE NONCLUSTERED INDEX IX_patient_test_results_RowVer
+    ON dbo.patient_test_results (RowVer)
+    INCLUDE (Patient_No);
+GO
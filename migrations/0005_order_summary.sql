@@ -0,0 +1,76 @@
+-- Denormalized per-patient order summary.
+--
+-- One row per patient with the comma-joined test list, test count, money totals and result
+-- status, so the dashboard and the payment / doctor reports read a single indexed row
+-- instead of rebuilding the test list with FOR XML PATH for every patient.
+-- The application keeps it current (order_summary.refresh_summary) in the same transaction
+-- as registration, result saves and deletes; the backfill below covers existing patients.
+--
+-- Re-runnable: it adds patients without a row, drops rows of deleted patients and marks
+-- patients whose results were saved as Ready, so writes a live app made before it noticed the
+-- table (order_summary.RECHECK_SECONDS) are healed by `python migrate.py --rerun 5`.
+
+IF OBJECT_ID('dbo.order_summary', 'U') IS NULL
+CREATE TABLE dbo.order_summary (
+    PatientId    INT            NOT NULL,
+    Tests        NVARCHAR(MAX)  NULL,
+    TestCount    INT            NOT NULL,
+    Gross        DECIMAL(18, 2) NOT NULL,
+    Discount     DECIMAL(18, 2) NOT NULL,
+    Paid         DECIMAL(18, 2) NOT NULL,
+    Net          AS (Gross - Discount) PERSISTED,
+    Due          AS (Gross - Discount - Paid) PERSISTED,
+    ResultStatus VARCHAR(20)    NOT NULL,
+    UpdatedAt    DATETIME       NOT NULL,
+    CONSTRAINT PK_order_summary PRIMARY KEY (PatientId)
+);
+GO
+
+-- Patients without a row
+INSERT INTO dbo.order_summary (PatientId, Tests, TestCount, Gross, Discount, Paid, ResultStatus, UpdatedAt)
+SELECT
+    p.Patient_Id,
+    STUFF((
+        SELECT ', ' + t2.Test_Name
+        FROM patient_test pt2
+        JOIN test t2 ON pt2.Test_ID = t2.Test_Id
+        WHERE pt2.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
+        FOR XML PATH(''), TYPE
+    ).value('.', 'NVARCHAR(MAX)'), 1, 2, ''),
+    (SELECT COUNT(*) FROM patient_test pt3 WHERE pt3.PatientID = CAST(p.Patient_Id AS VARCHAR(50))),
+    ISNULL(pay.Gross, 0),
+    ISNULL(pay.Discount, 0),
+    ISNULL(pay.Paid, 0),
+    CASE
+        WHEN EXISTS (
+            SELECT 1 FROM patient_test_results r
+            WHERE r.Patient_No = CAST(p.Patient_Id AS VARCHAR(50))
+        ) THEN 'Ready'
+        ELSE 'Awaiting Result'
+    END,
+    GETDATE()
+FROM patient p
+OUTER APPLY (
+    SELECT SUM(pp.TotalAmount) AS Gross, SUM(pp.Discount) AS Discount, SUM(pp.AmountPaid) AS Paid
+    FROM patientpayment pp
+    WHERE pp.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
+) pay
+WHERE NOT EXISTS (SELECT 1 FROM dbo.order_summary s WHERE s.PatientId = p.Patient_Id);
+GO
+
+-- Rows of patients deleted since
+DELETE s
+FROM dbo.order_summary s
+WHERE NOT EXISTS (SELECT 1 FROM patient p WHERE p.Patient_Id = s.PatientId);
+GO
+
+-- Results saved since
+UPDATE s
+SET ResultStatus = 'Ready', UpdatedAt = GETDATE()
+FROM dbo.order_summary s
+WHERE s.ResultStatus <> 'Ready'
+  AND EXISTS (
+      SELECT 1 FROM patient_test_results r
+      WHERE r.Patient_No = CAST(s.PatientId AS VARCHAR(50))
+  );
+GO
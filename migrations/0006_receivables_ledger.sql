@@ -0,0 +1,110 @@
+-- Receivables ledger with daily closing balances.
+--
+-- receivable_entry holds one posting per money event (registration, payment, reversal) with
+-- the lab and day it belongs to; receivable_daily holds per lab and day the posted totals,
+-- the closing receivable balance (net, by posting day) and DueClosing, the reports' Previous
+-- Due: positive patient balances of patients who visited up to that day. "Due as of day X"
+-- is then a seek on (LabId, Day) instead of summing every payment row ever written.
+-- The application posts in the same transaction as the write (receivables.post /
+-- reverse_patient); the backfill below opens the ledger from existing patients.
+--
+-- Re-runnable: every patient without ledger entries gets an opening entry and the daily
+-- balances are rebuilt from the entries. Patients registered on a live app before it noticed
+-- the ledger (receivables.RECHECK_SECONDS) are healed by `python migrate.py --rerun 6`.
+
+IF OBJECT_ID('dbo.receivable_entry', 'U') IS NULL
+CREATE TABLE dbo.receivable_entry (
+    EntryId     INT IDENTITY(1, 1) NOT NULL,
+    PatientId   INT            NOT NULL,
+    LabId       INT            NOT NULL,
+    Day         DATE           NOT NULL,
+    Charged     DECIMAL(18, 2) NOT NULL,
+    Discount    DECIMAL(18, 2) NOT NULL,
+    Received    DECIMAL(18, 2) NOT NULL,
+    Description VARCHAR(100)   NULL,
+    PostedAt    DATETIME       NOT NULL,
+    CONSTRAINT PK_receivable_entry PRIMARY KEY (EntryId)
+);
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_receivable_entry_PatientId' AND object_id = OBJECT_ID('dbo.receivable_entry'))
+CREATE NONCLUSTERED INDEX IX_receivable_entry_PatientId
+    ON dbo.receivable_entry (PatientId)
+    INCLUDE (LabId, Day, Charged, Discount, Received);
+GO
+
+IF OBJECT_ID('dbo.receivable_daily', 'U') IS NULL
+CREATE TABLE dbo.receivable_daily (
+    LabId    INT            NOT NULL,
+    Day      DATE           NOT NULL,
+    Charged  DECIMAL(18, 2) NOT NULL,
+    Discount DECIMAL(18, 2) NOT NULL,
+    Received DECIMAL(18, 2) NOT NULL,
+    Closing  DECIMAL(18, 2) NOT NULL,   -- receivable balance at the end of Day
+    DueClosing DECIMAL(18, 2) NOT NULL, -- positive patient balances, patients visited up to Day
+    CONSTRAINT PK_receivable_daily PRIMARY KEY (LabId, Day)
+);
+GO
+
+IF COL_LENGTH('dbo.receivable_daily', 'DueClosing') IS NULL
+ALTER TABLE dbo.receivable_daily
+    ADD DueClosing DECIMAL(18, 2) NOT NULL CONSTRAINT DF_receivable_daily_DueClosing DEFAULT 0;
+GO
+
+BEGIN TRANSACTION;
+
+-- Hold off postings while the ledger is topped up and rebuilt; locks are taken in the order
+-- receivables.post takes them (entries, then days)
+DECLARE @entries INT;
+SELECT @entries = COUNT(*) FROM dbo.receivable_entry WITH (TABLOCKX, HOLDLOCK);
+
+-- Patients without entries open the ledger. They carry no lab: they open on the first
+-- LabInfo row, the lab the application has always registered under by default
+INSERT INTO dbo.receivable_entry (PatientId, LabId, Day, Charged, Discount, Received, Description, PostedAt)
+SELECT
+    p.Patient_Id,
+    ISNULL((SELECT MIN(ID) FROM LabInfo), 0),
+    CAST(p.Visit_Date AS DATE),
+    ISNULL(pay.Gross, 0),
+    ISNULL(pay.Discount, 0),
+    ISNULL(pay.Paid, 0),
+    'Opening balance',
+    GETDATE()
+FROM patient p
+OUTER APPLY (
+    SELECT SUM(pp.TotalAmount) AS Gross, SUM(pp.Discount) AS Discount, SUM(pp.AmountPaid) AS Paid
+    FROM patientpayment pp
+    WHERE pp.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
+) pay
+WHERE p.Visit_Date IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM dbo.receivable_entry e WHERE e.PatientId = p.Patient_Id);
+
+-- Daily balances rebuilt from the entries: postings count under their posting day,
+-- positive patient balances under the visit day
+DELETE FROM dbo.receivable_daily WITH (TABLOCKX);
+
+INSERT INTO dbo.receivable_daily (LabId, Day, Charged, Discount, Received, Closing, DueClosing)
+SELECT
+    d.LabId, d.Day, SUM(d.Charged), SUM(d.Discount), SUM(d.Received),
+    SUM(SUM(d.Charged - d.Discount - d.Received)) OVER (PARTITION BY d.LabId ORDER BY d.Day ROWS UNBOUNDED PRECEDING),
+    SUM(SUM(d.Due)) OVER (PARTITION BY d.LabId ORDER BY d.Day ROWS UNBOUNDED PRECEDING)
+FROM (
+    SELECT LabId, Day, Charged, Discount, Received, 0 AS Due
+    FROM dbo.receivable_entry
+    UNION ALL
+    SELECT b.LabId, b.VisitDay, 0, 0, 0, b.Balance
+    FROM (
+        SELECT
+            MIN(e.LabId) AS LabId,
+            ISNULL(CAST(MIN(p.Visit_Date) AS DATE), MIN(e.Day)) AS VisitDay,
+            SUM(e.Charged - e.Discount - e.Received) AS Balance
+        FROM dbo.receivable_entry e
+        LEFT JOIN patient p ON p.Patient_Id = e.PatientId
+        GROUP BY e.PatientId
+    ) b
+    WHERE b.Balance > 0
+) d
+GROUP BY d.LabId, d.Day;
+
+COMMIT TRANSACTION;
+GO
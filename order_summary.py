@@ -0,0 +1,140 @@
+"""
+Order Summary Maintenance
+Features: keeps dbo.order_summary (migration 0005) - one row per patient with the test list,
+test count, gross / discount / paid / net / due and result status - current inside the
+writer's own transaction, and gives the dashboard and reports the SQL to read it (falling back
+to the per-patient FOR XML / EXISTS subqueries on databases without the table)
+"""
+import time
+import logging
+import threading
+
+from db import get_connection
+from patient_keys import join_on
+
+log = logging.getLogger("lab.order_summary")
+
+# Seconds before a "not migrated" answer is checked again, so running migration 0005
+# against a live app turns the summary on without a restart; patients written in between
+# are healed by re-running it (python migrate.py --rerun 5)
+RECHECK_SECONDS = 60
+
+_available = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def available():
+    """True when dbo.order_summary exists (migration 0005; once found, never checked again)"""
+    global _available, _checked_at
+    if _available or (_available is False and time.monotonic() - _checked_at < RECHECK_SECONDS):
+        return _available
+    with _lock:
+        if _available is None or (_available is False and time.monotonic() - _checked_at >= RECHECK_SECONDS):
+            with get_connection() as con:
+                cur = con.cursor()
+                cur.execute("SELECT OBJECT_ID('dbo.order_summary', 'U')")
+                _available = cur.fetchone()[0] is not None
+            _checked_at = time.monotonic()
+            if _available:
+                log.info("Order summary found; refresh enabled")
+    return _available
+
+
+# -----------------------------
+# WRITE
+# -----------------------------
+def _summary_select():
+    """SELECT producing the order_summary row of one patient (parameter: Patient_Id)"""
+    return f"""
+        SELECT
+            p.Patient_Id,
+            STUFF((
+                SELECT ', ' + t2.Test_Name
+                FROM patient_test pt2
+                JOIN test t2 ON pt2.Test_ID = t2.Test_Id
+                WHERE {join_on("pt2", "patient_test")}
+                FOR XML PATH(''), TYPE
+            ).value('.', 'NVARCHAR(MAX)'), 1, 2, ''),
+            (SELECT COUNT(*) FROM patient_test pt3 WHERE {join_on("pt3", "patient_test")}),
+            ISNULL(pay.Gross, 0),
+            ISNULL(pay.Discount, 0),
+            ISNULL(pay.Paid, 0),
+            CASE
+                WHEN EXISTS (
+                    SELECT 1 FROM patient_test_results r
+                    WHERE {join_on("r", "patient_test_results")}
+                ) THEN 'Ready'
+                ELSE 'Awaiting Result'
+            END,
+            GETDATE()
+        FROM patient p
+        OUTER APPLY (
+            SELECT SUM(pp.TotalAmount) AS Gross, SUM(pp.Discount) AS Discount, SUM(pp.AmountPaid) AS Paid
+            FROM patientpayment pp
+            WHERE {join_on("pp", "patientpayment")}
+        ) pay
+        WHERE p.Patient_Id = ?
+    """
+
+
+def refresh_summary(cur, patient_id):
+    """
+    Recompute one patient's summary row inside the caller's transaction.
+
+    Call it from every writer of patient, patient_test, patientpayment or
+    patient_test_results; when the patient no longer exists the row is removed.
+    """
+    if not available():
+        return
+    cur.execute(f"""
+        SET NOCOUNT ON;
+        DELETE FROM dbo.order_summary WHERE PatientId = ?;
+        INSERT INTO dbo.order_summary (PatientId, Tests, TestCount, Gross, Discount, Paid, ResultStatus, UpdatedAt)
+        {_summary_select()};
+    """, (int(patient_id), int(patient_id)))
+
+
+# -----------------------------
+# READ
+# -----------------------------
+def summary_source(patient_alias="p"):
+    """
+    (join clause, {field: SQL expression}) for queries over patient {patient_alias}.
+
+    Fields: tests, total, discount, paid, due (total - discount - paid) and status
+    ('Ready' / 'Awaiting Result'). Reads order_summary when it exists; otherwise the
+    same values are computed per patient as before.
+    """
+    p = patient_alias
+    if available():
+        return f"LEFT JOIN dbo.order_summary s ON s.PatientId = {p}.Patient_Id", {
+            "tests": "s.Tests",
+            "total": "ISNULL(s.Gross, 0)",
+            "discount": "ISNULL(s.Discount, 0)",
+            "paid": "ISNULL(s.Paid, 0)",
+            "due": "ISNULL(s.Due, 0)",
+            "status": "ISNULL(s.ResultStatus, 'Awaiting Result')",
+        }
+    return f"LEFT JOIN patientpayment pp ON {join_on('pp', 'patientpayment', p)}", {
+        "tests": f"""STUFF((
+                SELECT ', ' + t2.Test_Name
+                FROM patient_test pt2
+                JOIN test t2 ON pt2.Test_ID = t2.Test_Id
+                WHERE {join_on("pt2", "patient_test", p)}
+                FOR XML PATH(''), TYPE
+            ).value('.', 'NVARCHAR(MAX)'), 1, 2, '')""",
+        "total": "ISNULL(pp.TotalAmount, 0)",
+        "discount": "ISNULL(pp.Discount, 0)",
+        "paid": "ISNULL(pp.AmountPaid, 0)",
+        "due": "(ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0))",
+        "status": f"""CASE
+                WHEN EXISTS (
+                    SELECT 1
+                    FROM patient_test_results r
+                    WHERE {join_on("r", "patient_test_results", p)}
+                )
+                THEN 'Ready'
+                ELSE 'Awaiting Result'
+            END""",
+    }
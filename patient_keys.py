@@ -0,0 +1,54 @@
+"""
+Typed Patient Key Compatibility Layer
+Features: patient_test.PatientID, patientpayment.PatientID and patient_test_results.Patient_No
+hold the patient id as a string. Migration 0003 adds an indexed integer PatientKey column to
+each; these helpers emit the typed join/filter when it exists and fall back to the old
+string comparison otherwise, so the app runs on migrated and unmigrated databases alike.
+Column detection is cached per process - restart the app after running the migration.
+"""
+import threading
+
+from db import get_connection
+
+TYPED_KEY_COLUMN = "PatientKey"
+
+# table -> legacy varchar column holding Patient_Id
+VARCHAR_KEY_COLUMNS = {
+    "patient_test": "PatientID",
+    "patientpayment": "PatientID",
+    "patient_test_results": "Patient_No",
+}
+
+_typed = {}
+_lock = threading.Lock()
+
+
+def is_typed(table):
+    """True when table has the integer PatientKey column"""
+    if table not in _typed:
+        with _lock:
+            if table not in _typed:
+                with get_connection() as con:
+                    cur = con.cursor()
+                    cur.execute("SELECT COL_LENGTH(?, ?)", (f"dbo.{table}", TYPED_KEY_COLUMN))
+                    _typed[table] = cur.fetchone()[0] is not None
+    return _typed[table]
+
+
+def key_column(alias, table):
+    """Column to compare against an integer patient id"""
+    if is_typed(table):
+        return f"{alias}.{TYPED_KEY_COLUMN}"
+    return f"{alias}.{VARCHAR_KEY_COLUMNS[table]}"
+
+
+def join_on(alias, table, patient_alias="p"):
+    """Join predicate between patient.Patient_Id and the table's patient column"""
+    if is_typed(table):
+        return f"{alias}.{TYPED_KEY_COLUMN} = {patient_alias}.Patient_Id"
+    return f"{alias}.{VARCHAR_KEY_COLUMNS[table]} = CAST({patient_alias}.Patient_Id AS VARCHAR(50))"
+
+
+def key_param(table, patient_id):
+    """Parameter value matching key_column(): int when typed, string otherwise"""
+    return int(patient_id) if is_typed(table) else str(patient_id)
@@ -0,0 +1,238 @@
+"""
+PDF Rendering Pool
+Features: offline HTML -> PDF (WeasyPrint, optional) in a process-wide worker pool fed by a
+bounded queue, so report / receipt PDFs come straight from the server without a browser;
+recently rendered documents kept by content hash, pages/second and peak memory per worker
+"""
+import os
+import sys
+import time
+import atexit
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# Optional PDF support
+try:
+    import weasyprint
+    PDF_AVAILABLE = True
+except (ImportError, OSError):     # OSError: Pango / Cairo libraries missing
+    PDF_AVAILABLE = False
+
+try:
+    import resource                # peak RSS of a worker (not available on Windows)
+except ImportError:
+    resource = None
+
+log = logging.getLogger("lab.pdf_render")
+
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+
+# Documents waiting for a worker at once during batch jobs (bounds memory of queued HTML)
+QUEUE_DEPTH = PDF_WORKERS * 4
+
+# Tries per document in render_many when its worker dies (crash, out of memory): the pool is
+# rebuilt and the documents that were in flight are retried one at a time, so only the one
+# that kills its worker again is reported as failed
+RENDER_ATTEMPTS = 2
+
+# Rendered PDFs kept by HTML hash (re-opening a report screen does not render again)
+PDF_CACHE_SIZE = 32
+
+
+# -----------------------------
+# WORKER SIDE
+# -----------------------------
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _warm_up():
+    """Worker initializer: load fonts / stylesheets once, not on the first real document"""
+    weasyprint.HTML(string="<html><body></body></html>").render()
+
+
+def _render(html):
+    """One document: (pdf bytes, pages, seconds, worker pid, worker peak RSS in KB)"""
+    started = time.perf_counter()
+    document = weasyprint.HTML(string=html).render()
+    pdf = document.write_pdf()
+    return pdf, len(document.pages), time.perf_counter() - started, os.getpid(), _peak_rss_kb()
+
+
+# -----------------------------
+# POOL
+# -----------------------------
+class PdfPool:
+    """Process pool plus per-worker statistics; one per process (see POOL)"""
+
+    def __init__(self, workers=PDF_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._stats = {}          # worker pid -> {documents, pages, seconds, peak_rss_kb}
+        self._cache = OrderedDict()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking the threaded Streamlit server can copy held locks into workers
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_warm_up,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                log.info("PDF worker pool started with %d worker(s)", self.workers)
+            return self._executor
+
+    def _reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _record(self, pages, seconds, pid, rss_kb):
+        with self._lock:
+            stats = self._stats.setdefault(pid, {"documents": 0, "pages": 0, "seconds": 0.0, "peak_rss_kb": None})
+            stats["documents"] += 1
+            stats["pages"] += pages
+            stats["seconds"] += seconds
+            if rss_kb is not None:
+                stats["peak_rss_kb"] = max(stats["peak_rss_kb"] or 0, rss_kb)
+
+    def _submit(self, html):
+        try:
+            return self._pool().submit(_render, html)
+        except BrokenProcessPool:
+            log.warning("PDF worker pool broke; restarting it")
+            self._reset()
+            return self._pool().submit(_render, html)
+
+    def render(self, html):
+        """PDF bytes of one HTML document (cached by content), None when PDF is unavailable"""
+        if not PDF_AVAILABLE:
+            return None
+        key = hashlib.sha1(html.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        pdf, pages, seconds, pid, rss_kb = self._submit(html).result()
+        self._record(pages, seconds, pid, rss_kb)
+        with self._lock:
+            self._cache[key] = pdf
+            while len(self._cache) > PDF_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return pdf
+
+    def render_many(self, documents, progress=None):
+        """
+        PDFs for {name: html}, at most QUEUE_DEPTH documents queued at a time.
+
+        A document that fails is reported in "failed" instead of aborting the batch; when a
+        worker dies the pool is rebuilt and its documents are retried (RENDER_ATTEMPTS).
+
+        Returns {"pdfs": {name: bytes}, "failed": [name], "pages", "elapsed_ms", "pages_per_sec"}
+        """
+        if not PDF_AVAILABLE:
+            raise RuntimeError("PDF rendering needs WeasyPrint (pip install weasyprint)")
+        started = time.perf_counter()
+        pending = deque((name, html, 1) for name, html in documents.items())
+        suspects = deque()      # in flight when a worker died: retried alone
+        in_flight = {}
+        pdfs, failed, pages = {}, [], 0
+
+        def fill():
+            # _submit rebuilds the pool when the previous one broke
+            if suspects:
+                if not in_flight:
+                    name, html, attempt = suspects.popleft()
+                    in_flight[self._submit(html)] = (name, html, attempt)
+                return
+            while pending and len(in_flight) < QUEUE_DEPTH:
+                name, html, attempt = pending.popleft()
+                in_flight[self._submit(html)] = (name, html, attempt)
+
+        fill()
+        while in_flight:
+            done = next(as_completed(in_flight))
+            name, html, attempt = in_flight.pop(done)
+            try:
+                pdf, doc_pages, seconds, pid, rss_kb = done.result()
+            except BrokenProcessPool:
+                # Every document in flight on the dead pool ends up here, not only the culprit
+                if attempt < RENDER_ATTEMPTS:
+                    log.warning("PDF worker died while rendering %s; retrying it alone on a new pool", name)
+                    suspects.append((name, html, attempt + 1))
+                else:
+                    log.error("PDF of %s failed: worker died on %d attempts", name, attempt)
+                    failed.append(name)
+            except Exception:
+                log.warning("PDF of %s failed", name, exc_info=True)
+                failed.append(name)
+            else:
+                self._record(doc_pages, seconds, pid, rss_kb)
+                pdfs[name] = pdf
+                pages += doc_pages
+            if progress:
+                progress(len(pdfs) + len(failed), len(documents))
+            fill()
+
+        elapsed = time.perf_counter() - started
+        return {
+            "pdfs": pdfs,
+            "failed": failed,
+            "pages": pages,
+            "elapsed_ms": elapsed * 1000,
+            "pages_per_sec": pages / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def stats(self):
+        """Per-worker totals: [{pid, documents, pages, pages_per_sec, peak_rss_mb}]"""
+        with self._lock:
+            snapshot = {pid: dict(stats) for pid, stats in self._stats.items()}
+        rows = []
+        for pid, stats in sorted(snapshot.items()):
+            rss = stats["peak_rss_kb"]
+            rows.append({
+                "pid": pid,
+                "documents": stats["documents"],
+                "pages": stats["pages"],
+                "pages_per_sec": stats["pages"] / stats["seconds"] if stats["seconds"] else 0.0,
+                "peak_rss_mb": None if rss is None else rss / 1024,
+            })
+        return rows
+
+    def shutdown(self):
+        self._reset()
+
+
+# -----------------------------
+# PROCESS-WIDE ACCESS
+# -----------------------------
+POOL = PdfPool()
+atexit.register(POOL.shutdown)
+
+
+def html_to_pdf(html):
+    """PDF bytes of an HTML document, None when no PDF engine is installed or it failed"""
+    try:
+        return POOL.render(html)
+    except Exception:
+        log.warning("PDF rendering failed", exc_info=True)
+        return None
+
+
+def render_many(documents, progress=None):
+    return POOL.render_many(documents, progress)
+
+
+def worker_stats():
+    return POOL.stats()
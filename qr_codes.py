@@ -0,0 +1,90 @@
+"""
+QR Code Rendering
+Features: QR matrices computed once per payload (LRU), rendered as compact inline SVG - one
+path with a run per row of dark modules, no PIL raster, no base64 PNG - with a cached PNG
+variant for callers that need a bitmap; used by the lab report and the patient receipt
+"""
+import base64
+import logging
+from io import BytesIO
+from functools import lru_cache
+
+# Optional QR Code support
+try:
+    import qrcode
+    QR_AVAILABLE = True
+except ImportError:
+    QR_AVAILABLE = False
+
+log = logging.getLogger("lab.qr_codes")
+
+CACHE_SIZE = 1024     # payloads kept (a report and its receipt share one entry)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_matrix(data, border=2):
+    """Module matrix (tuple of tuples of bool, quiet zone included) for a payload"""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+
+def _svg_path(matrix):
+    """One path: a horizontal run 'M x y h n v 1 h -n z' for every stretch of dark modules"""
+    parts = []
+    for y, row in enumerate(matrix):
+        x, width = 0, len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                parts.append(f"M{start} {y}h{x - start}v1h{start - x}z")
+            else:
+                x += 1
+    return "".join(parts)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_svg(data, size=90):
+    """Inline <svg> markup of the QR code (size in CSS pixels), or None when unavailable"""
+    if not QR_AVAILABLE:
+        return None
+    try:
+        matrix = qr_matrix(data)
+    except Exception:
+        log.warning("QR code could not be generated for %r", data, exc_info=True)
+        return None
+    n = len(matrix)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {n} {n}" width="{size}" height="{size}" '
+        f'shape-rendering="crispEdges"><rect width="{n}" height="{n}" fill="#fff"/>'
+        f'<path d="{_svg_path(matrix)}" fill="#000"/></svg>'
+    )
+
+
+def qr_svg_data_uri(data, size=90):
+    """data: URI of the SVG, for <img src=...>; None when unavailable"""
+    svg = qr_svg(data, size)
+    if svg is None:
+        return None
+    return "data:image/svg+xml;base64," + base64.b64encode(svg.encode("utf-8")).decode("ascii")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def qr_png_base64(data, box_size=8):
+    """Base64 PNG of the QR code (needs Pillow), or None when unavailable"""
+    if not QR_AVAILABLE:
+        return None
+    try:
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=box_size, border=2)
+        qr.add_data(data)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="black", back_color="white")
+        buffered = BytesIO()
+        img.save(buffered, format="PNG")
+        return base64.b64encode(buffered.getvalue()).decode()
+    except Exception:
+        log.warning("QR PNG could not be generated for %r", data, exc_info=True)
+        return None
@@ -0,0 +1,226 @@
+"""
+Reference Range Engine
+Features: free-text normal ranges ("13-17", "-2 - +2", "< 5.7", "M: 13-17 F: 12-15",
+"Adult: 4-10 Child: 5-15", "Negative") compiled once into structured bands (low / high,
+inclusive bounds, sex and age), cached per text and per test with the catalog, and applied
+to whole reports or date ranges in one vectorised pass
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+NUMBER = r"[-+]?\d+(?:\.\d+)?"
+_NUMBER = re.compile(NUMBER)
+_LEADING_NUMBER = re.compile(rf"^\s*({NUMBER})")
+
+_BETWEEN = re.compile(rf"({NUMBER})\s*(?:-|–|to)\s*({NUMBER})", re.IGNORECASE)
+_COMPARE = re.compile(rf"(<=|>=|≤|≥|<|>|up\s*to|upto|less\s+than|more\s+than|greater\s+than)\s*({NUMBER})",
+                      re.IGNORECASE)
+
+# Band labels: (regex, sex, min age, max age); ages in years, max exclusive
+_LABELS = [
+    (r"\b(?:m|male|males|men)\b", "M", None, None),
+    (r"\b(?:f|female|females|women)\b", "F", None, None),
+    (r"\b(?:newborns?|neonates?|infants?)\b", None, None, 1),
+    (r"\b(?:child|children|kids?|paediatric|pediatric)\b", None, None, 18),
+    (r"\b(?:adults?)\b", None, 18, None),
+]
+_LABEL = re.compile("|".join(f"(?:{pattern})" for pattern, *_ in _LABELS) + r"\s*[:=]?", re.IGNORECASE)
+_LABEL_PARTS = [(re.compile(pattern, re.IGNORECASE), sex, lo, hi) for pattern, sex, lo, hi in _LABELS]
+
+_NORMAL_WORDS = {"negative", "nil", "absent", "non reactive", "non-reactive", "not detected", "normal"}
+_ABNORMAL_WORDS = re.compile(r"\b(?:positive|reactive|detected|present|\+{1,4})", re.IGNORECASE)
+_NEGATED = re.compile(r"\b(?:non|not|no)[\s-]", re.IGNORECASE)
+
+
+class Band:
+    """One numeric interval, optionally limited to a sex and an age span"""
+
+    __slots__ = ("low", "high", "low_inclusive", "high_inclusive", "sex", "age_min", "age_max")
+
+    def __init__(self, low=None, high=None, low_inclusive=True, high_inclusive=True,
+                 sex=None, age_min=None, age_max=None):
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+        self.sex = sex
+        self.age_min = age_min
+        self.age_max = age_max
+
+    def applies_to(self, sex, age):
+        if self.sex and sex and self.sex != sex:
+            return False
+        if age is not None:
+            if self.age_min is not None and age < self.age_min:
+                return False
+            if self.age_max is not None and age >= self.age_max:
+                return False
+        return True
+
+    def contains(self, value):
+        if self.low is not None and (value < self.low or (value == self.low and not self.low_inclusive)):
+            return False
+        if self.high is not None and (value > self.high or (value == self.high and not self.high_inclusive)):
+            return False
+        return True
+
+    def __repr__(self):
+        return (f"Band({self.low!r}, {self.high!r}, sex={self.sex!r}, "
+                f"age={self.age_min!r}-{self.age_max!r})")
+
+
+def _parse_interval(text):
+    """First interval in a text fragment as a Band, or None"""
+    between = _BETWEEN.search(text)
+    compare = _COMPARE.search(text)
+    if between and (not compare or between.start() <= compare.start()):
+        low, high = float(between.group(1)), float(between.group(2))
+        return Band(min(low, high), max(low, high))
+    if compare:
+        op, limit = compare.group(1).lower().replace(" ", ""), float(compare.group(2))
+        if op in ("<", "lessthan"):
+            return Band(high=limit, high_inclusive=False)
+        if op in ("<=", "≤", "upto"):
+            return Band(high=limit)
+        if op in (">", "morethan", "greaterthan"):
+            return Band(low=limit, low_inclusive=False)
+        return Band(low=limit)
+    return None
+
+
+class ReferenceRange:
+    """A compiled reference range: numeric bands and/or a qualitative normal answer"""
+
+    __slots__ = ("text", "bands", "qualitative")
+
+    def __init__(self, text, bands, qualitative):
+        self.text = text
+        self.bands = bands
+        self.qualitative = qualitative      # normal word ("negative", ...) or None
+
+    def bands_for(self, sex=None, age=None):
+        """Bands that apply to a patient; all bands when none is specific to them"""
+        matching = [band for band in self.bands if band.applies_to(sex, age)]
+        return matching or self.bands
+
+    def is_abnormal(self, value, sex=None, age=None):
+        if value is None or str(value).strip() == "":
+            return False
+        text = str(value).strip()
+        match = _LEADING_NUMBER.match(text)
+        if match and self.bands:
+            number = float(match.group(1))
+            return not any(band.contains(number) for band in self.bands_for(sex, age))
+        if self.qualitative:
+            return bool(_ABNORMAL_WORDS.search(text)) and not _NEGATED.search(text)
+        return False
+
+
+@lru_cache(maxsize=4096)
+def compile_range(text):
+    """Compile a free-text range once (cached by text)"""
+    text = (text or "").strip()
+    lowered = text.lower()
+    qualitative = lowered if lowered in _NORMAL_WORDS else None
+
+    bands = []
+    labels = list(_LABEL.finditer(text))
+    if labels:
+        # "M: 13-17 F: 12-15" -> one band per labelled segment
+        for i, label in enumerate(labels):
+            end = labels[i + 1].start() if i + 1 < len(labels) else len(text)
+            band = _parse_interval(text[label.end():end])
+            if band is None:
+                continue
+            for pattern, sex, age_min, age_max in _LABEL_PARTS:
+                if pattern.search(label.group(0)):
+                    band.sex = sex or band.sex
+                    band.age_min = age_min if age_min is not None else band.age_min
+                    band.age_max = age_max if age_max is not None else band.age_max
+            bands.append(band)
+    if not bands:
+        band = _parse_interval(text)
+        if band is not None:
+            bands.append(band)
+    return ReferenceRange(text, tuple(bands), qualitative)
+
+
+def compile_ranges(text_by_test):
+    """{test_id: range text} -> {test_id: ReferenceRange} (used by the catalog snapshot)"""
+    return {test_id: compile_range(text) for test_id, text in text_by_test.items() if text}
+
+
+def range_text(initial_value, final_value):
+    """Display text of a Normal_Ranges row, as reports show it"""
+    if initial_value is not None and final_value is not None:
+        return f"{initial_value} - {final_value}"
+    value = initial_value if initial_value is not None else final_value
+    return None if value is None else str(value)
+
+
+def patient_sex(sex):
+    """'Male' / 'Female' / anything else -> 'M' / 'F' / None"""
+    sex = (sex or "").strip().upper()
+    return sex[0] if sex[:1] in ("M", "F") else None
+
+
+# -----------------------------
+# VECTORISED FLAGGING
+# -----------------------------
+def flag_results(values, ranges, sexes=None, ages=None):
+    """
+    Abnormal flags for many results at once.
+
+    Args:
+        values: result texts
+        ranges: ReferenceRange (or range text, or None) per result
+        sexes / ages: per-result patient sex ('M' / 'F' / None) and age in years,
+                      or a single value for all rows (one patient's report)
+    Returns:
+        numpy bool array
+    """
+    n = len(values)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    if sexes is None or isinstance(sexes, str):
+        sexes = [sexes] * n
+    if ages is None or np.isscalar(ages):
+        ages = [ages] * n
+
+    series = pd.Series(values, dtype="object").fillna("").astype(str)
+    numbers = pd.to_numeric(series.str.extract(rf"^\s*({NUMBER})", expand=False), errors="coerce").to_numpy()
+
+    low = np.full(n, -np.inf)
+    high = np.full(n, np.inf)
+    low_open = np.zeros(n, dtype=bool)
+    high_open = np.zeros(n, dtype=bool)
+    numeric = np.zeros(n, dtype=bool)
+    slow = []          # rows several bands apply to, or qualitative rows: decided one by one
+
+    for i, rng in enumerate(ranges):
+        if rng is None:
+            continue
+        if isinstance(rng, str):
+            rng = compile_range(rng)
+        bands = rng.bands_for(sexes[i], ages[i])
+        if len(bands) == 1 and not np.isnan(numbers[i]):
+            band = bands[0]
+            numeric[i] = True
+            if band.low is not None:
+                low[i], low_open[i] = band.low, not band.low_inclusive
+            if band.high is not None:
+                high[i], high_open[i] = band.high, not band.high_inclusive
+        elif bands or rng.qualitative:
+            slow.append((i, rng))
+
+    with np.errstate(invalid="ignore"):
+        below = (numbers < low) | (low_open & (numbers == low))
+        above = (numbers > high) | (high_open & (numbers == high))
+    flags = numeric & (below | above)
+
+    for i, rng in slow:
+        flags[i] = rng.is_abnormal(values[i], sexes[i], ages[i])
+    return flags
@@ -0,0 +1,470 @@
+"""
+Patient Receipt Rendering
+Features: the registration receipts (customer / lab copy, half A4 each) and the searched dual
+receipt (both copies on one A4 page) from templates compiled once; both copies share one
+markup source and differ only in their accent colours and copy-specific blocks
+"""
+from qr_codes import qr_svg
+from templates import Template, escape
+
+
+def _rs(amount, grouped=False):
+    return f"Rs. {amount or 0:,.2f}" if grouped else f"Rs. {amount or 0:.2f}"
+
+
+# -----------------------------
+# REGISTRATION RECEIPTS (CUSTOMER + LAB COPY)
+# -----------------------------
+# Per-copy colours: accent (border / headings), table header background, badge colour
+_COPY_STYLES = {
+    "customer": {"accent": "#2c3e50", "header_bg": "#e8f4fc", "badge": ""},
+    "lab": {"accent": "#e74c3c", "header_bg": "#fadbd8", "badge": " color: #c0392b;"},
+}
+
+
+def _receipt_css(accent, header_bg, badge):
+    return f"""
+            @media print {{
+                body {{ margin: 0; padding: 0; }}
+                .receipt {{ width: 210mm; height: 148mm; page-break-after: always; }}
+            }}
+            .receipt {{
+                font-family: Arial, sans-serif;
+                width: 100%;
+                max-width: 210mm;
+                min-height: 148mm;
+                margin: 0 auto;
+                padding: 15px;
+                border: 2px solid {accent};
+                background: #fff;
+                box-sizing: border-box;
+            }}
+            .header {{ text-align: center; margin-bottom: 10px; }}
+            .header h2 {{ color: {accent}; margin: 3px 0; font-size: 18px; }}
+            .header p {{ margin: 2px 0; font-size: 12px; }}
+            .divider {{ border-top: 1px dashed {accent}; margin: 8px 0; }}
+            .patient-info {{ margin: 8px 0; }}
+            .patient-info p {{ margin: 3px 0; font-size: 13px; }}
+            .tests-table {{ width: 100%; border-collapse: collapse; margin: 8px 0; font-size: 12px; }}
+            .tests-table th {{ background: {header_bg}; padding: 4px; text-align: left; border-bottom: 1px solid {accent}; }}
+            .tests-table td {{ padding: 4px; border-bottom: 1px dashed #ccc; }}
+            .sub-test {{ color: #555; font-size: 11px; }}
+            .payment-table {{ width: 100%; margin-top: 5px; font-size: 13px; }}
+            .payment-table td {{ padding: 2px 0; }}
+            .payment-table .total-row {{ border-top: 2px solid {accent}; }}
+            .balance-due {{ color: green; font-weight: bold; }}
+            .balance-due.due {{ color: red; }}
+            .footer {{ text-align: center; margin-top: 10px; font-size: 11px; color: #7f8c8d; }}
+            .badge {{ background: {header_bg}; padding: 2px 8px; border-radius: 3px; font-weight: bold;{badge} display: inline-block; margin-top: 5px; }}
+"""
+
+
+def _receipt_template(copy):
+    return Template("""<!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>""" + _receipt_css(**_COPY_STYLES[copy]) + """        </style>
+    </head>
+    <body>
+        <div class="receipt">
+            <div class="header">
+                <h2>{{ lab_name }}</h2>
+                <p>{{ lab_address }}</p>
+                <p>📞 {{ lab_phone }}</p>
+                <div class="divider"></div>
+                <h3>PATIENT RECEIPT</h3>
+                <div class="badge">{{ badge }}</div>
+                {{ qr|safe }}
+            </div>
+
+            <div class="patient-info">
+                <p><strong>Lab No:</strong> {{ labno }}</p>
+                <p><strong>Patient No:</strong> {{ patient_no }}</p>
+                <p><strong>Date:</strong> {{ date }}</p>
+                <p><strong>Patient:</strong> {{ name }}</p>
+                <p><strong>Age/Sex:</strong> {{ age }} / {{ sex }}</p>
+                <p><strong>Mobile:</strong> {{ mobile }}</p>
+                <p><strong>Doctor:</strong> {{ doctor_name }}</p>
+                <p><strong>City:</strong> {{ city }}</p>
+                {{ extra_info|safe }}
+            </div>
+
+            <div class="divider"></div>
+
+            <table class="tests-table">
+                <thead>
+                    <tr>
+                        {{ table_head|safe }}
+                    </tr>
+                </thead>
+                <tbody>
+                {{ rows|safe }}
+                </tbody>
+            </table>
+
+            <div class="divider"></div>
+
+            <table class="payment-table">
+                <tr>
+                    <td><strong>Total Amount</strong></td>
+                    <td style="text-align: right;">{{ total }}</td>
+                </tr>
+                <tr>
+                    <td><strong>Discount</strong></td>
+                    <td style="text-align: right;">{{ discount }}</td>
+                </tr>
+                <tr>
+                    <td><strong>Amount Paid</strong></td>
+                    <td style="text-align: right;">{{ paid }}</td>
+                </tr>
+                <tr class="total-row">
+                    <td><strong>Balance Due</strong></td>
+                    <td style="text-align: right;" class="balance-due{{ due|safe }}">{{ balance }}</td>
+                </tr>
+            </table>
+
+            <div class="divider"></div>
+
+            <div class="footer">
+                {{ footer_title|safe }}
+                <p>Results will be ready after {{ return_time }}</p>
+                <p style="margin-top: 8px; font-size: 10px;">{{ footer_note }}</p>
+            </div>
+        </div>
+    </body>
+    </html>
+""", name=f"{copy}_receipt")
+
+
+CUSTOMER_RECEIPT = _receipt_template("customer")
+LAB_RECEIPT = _receipt_template("lab")
+
+CUSTOMER_ROW = Template("""
+                    <tr class="{{ row_class }}">
+                        <td>{{ display_no }} {{ name }}</td>
+                        <td style="text-align: right;">{{ rate }}</td>
+                    </tr>""", name="customer_row")
+
+LAB_ROW = Template("""
+                    <tr class="{{ row_class }}">
+                        <td>{{ lab_display_no }}</td>
+                        <td>{{ name }}</td>
+                        <td style="text-align: right;">{{ rate }}</td>
+                    </tr>""", name="lab_row")
+
+LAB_EXTRA_INFO = Template("""<p><strong>Address:</strong> {{ address }}</p>
+                <p><strong>Sample Source:</strong> {{ sample_source }}</p>
+                <p><strong>Entered By:</strong> {{ user_name }}</p>""", name="lab_extra_info")
+
+
+def receipt_copies(data, user_name):
+    """
+    (customer copy, lab copy) HTML of a just-registered patient.
+
+    data is the st.session_state.last_saved dict (lab_info, tests, amounts, ...);
+    user_name is the operator printed on the lab copy.
+    """
+    lab_info = data["lab_info"]
+    qr_markup = qr_svg(f"Lab:{lab_info['name']}|LabNo:{data['labno']}|Receipt:{data['patient_no']}|Date:{data['date']}", size=64)
+
+    customer_rows, lab_rows = [], []
+    for test in data["tests"]:
+        row = {
+            "row_class": "sub-test" if test["is_sub"] else "",
+            "display_no": test["display_no"],
+            "lab_display_no": "Sub" if test["is_sub"] else test["display_no"],
+            "name": test["name"],
+            "rate": _rs(test["rate"]),
+        }
+        CUSTOMER_ROW.render_into(customer_rows, row)
+        LAB_ROW.render_into(lab_rows, row)
+
+    common = {
+        **data,
+        "lab_name": lab_info["name"],
+        "lab_address": lab_info["address"],
+        "lab_phone": lab_info["phone"],
+        "total": _rs(data["total"]),
+        "discount": _rs(data["discount"]),
+        "paid": _rs(data["paid"]),
+        "balance": _rs(data["balance"]),
+        "due": " due" if data["balance"] > 0 else "",
+        "return_time": data["return_time"] or "5:00 PM",
+    }
+    customer = CUSTOMER_RECEIPT.render(
+        common,
+        badge="CUSTOMER COPY",
+        qr=f'<div style="margin-top: 6px;">{qr_markup}</div>' if qr_markup else "",
+        extra_info="",
+        table_head='<th>Test</th>\n<th style="text-align: right;">Amount</th>',
+        rows="".join(customer_rows),
+        footer_title="<p>Thank you for your visit!</p>",
+        footer_note="This is a computer-generated receipt. No signature required.",
+    )
+    lab = LAB_RECEIPT.render(
+        common,
+        badge="LAB COPY - INTERNAL USE",
+        qr="",
+        extra_info=LAB_EXTRA_INFO.render(data, user_name=user_name),
+        table_head='<th>Display No</th>\n<th>Test Name</th>\n<th style="text-align: right;">Amount</th>',
+        rows="".join(lab_rows),
+        footer_title="<p><strong>INTERNAL COPY - FOR LAB USE ONLY</strong></p>",
+        footer_note="Patient must present this receipt to collect reports. Balance must be cleared before report release.",
+    )
+    return customer, lab
+
+
+# -----------------------------
+# DUAL RECEIPT (BOTH COPIES ON ONE A4 PAGE)
+# -----------------------------
+DUAL_CSS = """
+            @media print {
+                body { margin: 0; padding: 0; }
+                .receipt-page { width: 210mm; height: 297mm; margin: 0; padding: 0; }
+                .receipt { page-break-inside: avoid; }
+            }
+            body {
+                font-family: Arial, sans-serif;
+                margin: 0;
+                padding: 0;
+                background: #f5f7fa;
+            }
+            .receipt-page {
+                width: 210mm;
+                height: 297mm;
+                margin: 10mm auto;
+                background: white;
+                box-shadow: 0 0 10px rgba(0,0,0,0.1);
+            }
+            .receipt {
+                width: 190mm;
+                margin: 10mm;
+                padding: 15px;
+                border: 1px solid #000;
+            }
+            .receipt-top {
+                border-bottom: 1px dashed #000;
+                padding-bottom: 10px;
+                margin-bottom: 10px;
+            }
+            .receipt-bottom {
+                padding-top: 10px;
+                margin-top: 10px;
+            }
+            .header {
+                text-align: center;
+                margin-bottom: 10px;
+                position: relative;
+            }
+            .receipt-qr {
+                position: absolute;
+                top: 0;
+                right: 0;
+            }
+            .header h2 {
+                margin: 3px 0;
+                font-size: 18px;
+                color: #2c3e50;
+            }
+            .header p {
+                margin: 2px 0;
+                font-size: 12px;
+            }
+            .receipt-info {
+                display: flex;
+                justify-content: space-between;
+                font-size: 13px;
+                margin: 8px 0;
+            }
+            .patient-info {
+                margin: 10px 0;
+                font-size: 13px;
+            }
+            .patient-info p {
+                margin: 3px 0;
+            }
+            .tests-list {
+                margin: 10px 0;
+                font-size: 12px;
+                line-height: 1.4;
+            }
+            .payment-summary {
+                width: 100%;
+                border-collapse: collapse;
+                margin: 15px 0;
+                font-size: 13px;
+            }
+            .payment-summary td {
+                padding: 4px 8px;
+                border-bottom: 1px solid #000;
+            }
+            .payment-summary tr:last-child td {
+                border-top: 2px solid #000;
+                font-weight: bold;
+            }
+            .balance-due {
+                color: green;
+                font-weight: bold;
+            }
+            .balance-due.due {
+                color: red;
+            }
+            .footer {
+                text-align: center;
+                margin-top: 15px;
+                font-size: 11px;
+                color: #7f8c8d;
+            }
+            .badge {
+                background: #e8f4fc;
+                padding: 2px 8px;
+                border-radius: 3px;
+                font-weight: bold;
+                display: inline-block;
+                margin-top: 5px;
+                font-size: 12px;
+            }
+            .lab-badge {
+                background: #fadbd8;
+                color: #c0392b;
+            }
+"""
+
+DUAL_HEAD = Template("""<!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <title>Receipt - Lab No: {{ lab_no }}</title>
+        <style>""" + DUAL_CSS + """        </style>
+    </head>
+    <body>
+        <div class="receipt-page">""", name="dual_head")
+
+DUAL_COPY = Template("""
+            <div class="receipt {{ position }}">
+                <div class="header">
+                    {{ logo|safe }}
+                    <p>{{ lab_address }}<br>📞 {{ lab_phone }}</p>
+                    <div class="{{ badge_class }}">{{ badge }}</div>
+                    {{ qr|safe }}
+                </div>
+                <div class="receipt-info">
+                    <div><strong>Lab No:</strong> {{ lab_no }}</div>
+                    <div><strong>Date:</strong> {{ visit_date }}</div>
+                    <div><strong>Receipt No:</strong> {{ patient_no }}</div>
+                </div>
+                <div class="patient-info">
+                    <p><strong>Patient:</strong> {{ name }}</p>
+                    <p><strong>Age/Sex:</strong> {{ age }} / {{ sex }}</p>
+                    <p><strong>Mobile:</strong> {{ mobile }}</p>
+                    <p><strong>City:</strong> {{ city }}</p>
+                    {{ address_line|safe }}
+                    <p><strong>Referred by:</strong> {{ referred_by }}</p>
+                    <p><strong>Delivery:</strong> {{ visit_date }} {{ return_time }}</p>
+                </div>
+                <div class="tests-list">
+                    <strong>Tests Performed:</strong><br>
+                    {{ tests_list }}
+                </div>
+                <table class="payment-summary">
+                    <tr>
+                        <td><strong>Total</strong></td>
+                        <td style="text-align: right;">{{ total }}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Discount</strong></td>
+                        <td style="text-align: right;">{{ discount }}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Paid</strong></td>
+                        <td style="text-align: right;">{{ paid }}</td>
+                    </tr>
+                    <tr>
+                        <td><strong>Balance</strong></td>
+                        <td style="text-align: right;" class="balance-due{{ due|safe }}">{{ balance }}</td>
+                    </tr>
+                </table>
+                <div class="footer">
+                    {{ footer|safe }}
+                    <p style="margin-top: 8px; font-size: 10px;">Note: Computer generated receipt. No signature required.</p>
+                </div>
+            </div>
+""", name="dual_copy")
+
+DUAL_FOOT = """        </div>
+    </body>
+    </html>
+"""
+
+
+def dual_receipt_html(patient, tests, lab_info):
+    """
+    One A4 page with the customer copy on top and the lab copy below.
+
+    patient is the receipt-search row (LabNo, PatientNo, amounts, Balance, ...),
+    tests the ordered test rows (Test_Name), lab_info a branding dict or None.
+    """
+    lab_info = lab_info or {}
+    visit_date = patient.Visit_Date.strftime('%d-%b-%Y') if patient.Visit_Date else ""
+    return_time = patient.ReturnTime.strftime('%I:%M %p') if patient.ReturnTime else "N/A"
+    paid = patient.AmountPaid or 0
+    balance = patient.Balance or 0
+
+    # Lab logo, or the lab name when there is no Pad_Logo
+    if lab_info.get("logo_data_uri"):
+        logo = f'<img src="{lab_info["logo_data_uri"]}" style="max-height:40px; max-width:150px;">'
+    elif lab_info:
+        logo = f"<h3>{escape(lab_info['name'])}</h3>"
+    else:
+        logo = ""
+
+    # Receipt QR (inline SVG, cached per payload; both copies share it)
+    qr_markup = qr_svg(
+        f"Lab:{lab_info.get('name', '')}|LabNo:{patient.LabNo}|Receipt:{patient.PatientNo}|Date:{visit_date}",
+        size=64
+    )
+
+    common = {
+        "logo": logo,
+        "qr": f'<div class="receipt-qr">{qr_markup}</div>' if qr_markup else "",
+        "lab_address": lab_info.get("address", ""),
+        "lab_phone": lab_info.get("phone", ""),
+        "lab_no": patient.LabNo,
+        "patient_no": patient.PatientNo,
+        "visit_date": visit_date,
+        "return_time": return_time,
+        "name": patient.Patient_Name,
+        "age": patient.Age,
+        "sex": patient.Sex,
+        "mobile": patient.Mobile_No or "N/A",
+        "city": patient.City or "N/A",
+        "referred_by": patient.Referred_By or "N/A",
+        "tests_list": ", ".join(t.Test_Name for t in tests) if tests else "No tests recorded",
+        "total": _rs(patient.TotalAmount, grouped=True),
+        "discount": _rs(patient.Discount, grouped=True),
+        "paid": _rs(paid, grouped=True),
+        "balance": _rs(balance, grouped=True),
+        "due": " due" if balance > 0 else "",
+    }
+
+    parts = DUAL_HEAD.render_into([], common)
+    DUAL_COPY.render_into(parts, {
+        **common,
+        "position": "receipt-top",
+        "badge_class": "badge",
+        "badge": "CUSTOMER COPY",
+        "address_line": "",
+        "footer": f"<p>Received with thanks the sum of {_rs(paid, grouped=True)} in Cash</p>",
+    })
+    DUAL_COPY.render_into(parts, {
+        **common,
+        "position": "receipt-bottom",
+        "badge_class": "badge lab-badge",
+        "badge": "LAB COPY",
+        "address_line": f"<p><strong>Address:</strong> {escape(patient.Address or 'N/A')}</p>",
+        "footer": ("<p><strong>INTERNAL USE ONLY</strong></p>\n"
+                   f"<p>Results ready after {escape(return_time)}. Balance must be cleared before report release.</p>"),
+    })
+    parts.append(DUAL_FOOT)
+    return "".join(parts)
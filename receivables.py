@@ -0,0 +1,208 @@
+"""
+Receivables Ledger
+Features: every money event posted once (lab, day, charged / discount / received) with the
+lab's daily closing balance kept current in the same transaction, so "due as of day X" is
+a point lookup per lab plus a small same-day delta instead of a scan of all history.
+Two balances per lab and day:
+    Closing     net receivable at the end of the day, by posting day (credits net in)
+    DueClosing  what reports call Previous Due: the sum of positive patient balances of
+                patients who visited up to that day (overpayments count as 0)
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, time as time_of_day
+
+from db import get_connection
+from patient_keys import join_on
+
+log = logging.getLogger("lab.receivables")
+
+# Seconds before a "not migrated" answer is checked again, so running migration 0006
+# against a live app turns posting on without a restart; patients registered in between
+# are added by re-running it (python migrate.py --rerun 6)
+RECHECK_SECONDS = 60
+
+_available = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def available():
+    """True when the ledger tables are in place (migration 0006; once found, never checked again)"""
+    global _available, _checked_at
+    if _available or (_available is False and time.monotonic() - _checked_at < RECHECK_SECONDS):
+        return _available
+    with _lock:
+        if _available is None or (_available is False and time.monotonic() - _checked_at >= RECHECK_SECONDS):
+            with get_connection() as con:
+                cur = con.cursor()
+                cur.execute("SELECT COL_LENGTH('dbo.receivable_daily', 'DueClosing')")
+                _available = cur.fetchone()[0] is not None
+            _checked_at = time.monotonic()
+            if _available:
+                log.info("Receivables ledger found; posting enabled")
+    return _available
+
+
+# -----------------------------
+# WRITE (INSIDE THE CALLER'S TRANSACTION)
+# -----------------------------
+POST_SQL = """
+    SET NOCOUNT ON;
+    DECLARE @patient INT = ?, @lab INT = ?, @day DATE = ?,
+            @charged DECIMAL(18, 2) = ?, @discount DECIMAL(18, 2) = ?, @received DECIMAL(18, 2) = ?,
+            @description VARCHAR(100) = ?;
+    DECLARE @delta DECIMAL(18, 2) = @charged - @discount - @received;
+
+    -- Previous Due counts a patient's balance under the visit day, and only while it is positive
+    DECLARE @visit DATE = ISNULL((SELECT CAST(Visit_Date AS DATE) FROM patient WHERE Patient_Id = @patient), @day);
+    DECLARE @balance DECIMAL(18, 2) = ISNULL((
+        SELECT SUM(Charged - Discount - Received) FROM dbo.receivable_entry WITH (UPDLOCK, HOLDLOCK)
+        WHERE PatientId = @patient
+    ), 0);
+    DECLARE @due_delta DECIMAL(18, 2) =
+        CASE WHEN @balance + @delta > 0 THEN @balance + @delta ELSE 0 END
+        - CASE WHEN @balance > 0 THEN @balance ELSE 0 END;
+
+    INSERT INTO dbo.receivable_entry (PatientId, LabId, Day, Charged, Discount, Received, Description, PostedAt)
+    VALUES (@patient, @lab, @day, @charged, @discount, @received, @description, GETDATE());
+
+    -- First posting on a day opens its row at the previous closing balances
+    INSERT INTO dbo.receivable_daily (LabId, Day, Charged, Discount, Received, Closing, DueClosing)
+    SELECT @lab, d.Day, 0, 0, 0, ISNULL(prev.Closing, 0), ISNULL(prev.DueClosing, 0)
+    FROM (SELECT @day AS Day UNION SELECT @visit) d
+    OUTER APPLY (
+        SELECT TOP 1 r.Closing, r.DueClosing FROM dbo.receivable_daily r
+        WHERE r.LabId = @lab AND r.Day < d.Day
+        ORDER BY r.Day DESC
+    ) prev
+    WHERE NOT EXISTS (
+        SELECT 1 FROM dbo.receivable_daily r WITH (UPDLOCK, HOLDLOCK) WHERE r.LabId = @lab AND r.Day = d.Day
+    );
+
+    UPDATE dbo.receivable_daily
+    SET Charged = Charged + @charged, Discount = Discount + @discount, Received = Received + @received
+    WHERE LabId = @lab AND Day = @day;
+
+    -- Today's postings touch one row; a back-dated one also moves the later closings
+    UPDATE dbo.receivable_daily
+    SET Closing = Closing + @delta
+    WHERE LabId = @lab AND Day >= @day;
+
+    IF @due_delta <> 0
+        UPDATE dbo.receivable_daily
+        SET DueClosing = DueClosing + @due_delta
+        WHERE LabId = @lab AND Day >= @visit;
+"""
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def post(cur, patient_id, lab_id, day, charged=0, discount=0, received=0, description=None):
+    """
+    Post one money event for a patient inside the caller's transaction.
+
+    Call it from every writer of patientpayment (registration, payments, corrections).
+    """
+    if not available():
+        return
+    cur.execute(POST_SQL, (
+        int(patient_id), int(lab_id or 0), _day(day),
+        charged or 0, discount or 0, received or 0, description,
+    ))
+
+
+def reverse_patient(cur, patient_id, description="Patient deleted"):
+    """Post the negation of everything posted for a patient (call before deleting it)"""
+    if not available():
+        return
+    cur.execute("""
+        SELECT LabId, Day, SUM(Charged), SUM(Discount), SUM(Received)
+        FROM dbo.receivable_entry
+        WHERE PatientId = ?
+        GROUP BY LabId, Day
+    """, (int(patient_id),))
+    for lab_id, day, charged, discount, received in cur.fetchall():
+        if charged or discount or received:
+            post(cur, patient_id, lab_id, day, -charged, -discount, -received, description)
+
+
+# -----------------------------
+# READ
+# -----------------------------
+def _closing_sql(lab_id, column="Closing"):
+    labs = "(SELECT ? AS LabId) l" if lab_id is not None else "(SELECT DISTINCT LabId FROM dbo.receivable_daily) l"
+    return f"""
+        SELECT ISNULL(SUM(c.{column}), 0)
+        FROM {labs}
+        CROSS APPLY (
+            SELECT TOP 1 r.{column}
+            FROM dbo.receivable_daily r
+            WHERE r.LabId = l.LabId AND r.Day <= ?
+            ORDER BY r.Day DESC
+        ) c
+    """
+
+
+def due_as_of(day, lab_id=None):
+    """Net receivable balance at the close of day (credits netted in), for one lab or all labs"""
+    params = ([lab_id] if lab_id is not None else []) + [_day(day)]
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(_closing_sql(lab_id), params)
+        return cur.fetchone()[0] or 0
+
+
+def due_before(moment, lab_id=None):
+    """
+    Previous Due just before a date / datetime: the outstanding (positive) balances of
+    patients who visited earlier - the previous day's DueClosing plus patients who
+    visited earlier on the same day.
+
+    Falls back to summing patientpayment over all earlier patients when the ledger
+    tables do not exist yet; both paths give the same figure.
+    """
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, time_of_day.min)
+    if not available():
+        return _legacy_due_before(moment)
+
+    day = moment.date()
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(_closing_sql(lab_id, "DueClosing"),
+                    ([lab_id] if lab_id is not None else []) + [day - timedelta(days=1)])
+        due = cur.fetchone()[0] or 0
+        if moment.time() != time_of_day.min:
+            cur.execute(f"""
+                SELECT ISNULL(SUM(CASE WHEN b.Balance > 0 THEN b.Balance ELSE 0 END), 0)
+                FROM patient p
+                CROSS APPLY (
+                    SELECT SUM(e.Charged - e.Discount - e.Received) AS Balance
+                    FROM dbo.receivable_entry e
+                    WHERE e.PatientId = p.Patient_Id{" AND e.LabId = ?" if lab_id is not None else ""}
+                ) b
+                WHERE p.Visit_Date >= ? AND p.Visit_Date < ?
+            """, ([lab_id] if lab_id is not None else []) + [datetime.combine(day, time_of_day.min), moment])
+            due += cur.fetchone()[0] or 0
+    return due
+
+
+def _legacy_due_before(moment):
+    """Sum of positive patient balances (all payment rows of a patient together) of earlier visits"""
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SELECT ISNULL(SUM(CASE WHEN pay.Balance > 0 THEN pay.Balance ELSE 0 END), 0)
+            FROM patient p
+            CROSS APPLY (
+                SELECT SUM(ISNULL(pp.TotalAmount,0) - ISNULL(pp.Discount,0) - ISNULL(pp.AmountPaid,0)) AS Balance
+                FROM patientpayment pp
+                WHERE {join_on("pp", "patientpayment")}
+            ) pay
+            WHERE p.Visit_Date < ?
+        """, (moment,))
+        return cur.fetchone()[0] or 0
@@ -0,0 +1,125 @@
+"""
+Patient Registration Service
+Features: writes patient, payment, every test line, the journal entries and the
+receivables posting in ONE transaction with batched inserts (fast_executemany), so a failure leaves no orphan rows
+and a 50-line package costs a handful of round trips instead of 60+
+"""
+import time
+import logging
+
+from db import get_connection
+from sequences import PATIENT_IDS, PAYMENT_IDS, JOURNAL_IDS, next_lab_no
+from order_summary import refresh_summary
+from receivables import post as post_receivable
+
+log = logging.getLogger("lab.registration")
+
+# Latency budget for saving a 50-line order (measured from first statement to commit)
+TARGET_MS_50_LINES = 300.0
+
+JOURNAL_DESCRIPTION = "Transaction Generated For Patient Entry"
+
+
+def build_test_lines(selected_tests, subtest_selections):
+    """Flatten main tests + selected sub-tests into the rows stored in patient_test"""
+    lines = [{"Test_ID": test["Test_Id"], "Rate": test["Rate"]} for test in selected_tests]
+    for main_test_id, subtests in subtest_selections.items():
+        for sub in subtests:
+            if sub["selected"]:
+                lines.append({"Test_ID": sub["Test_Id"], "Rate": sub["Rate"]})
+    return lines
+
+
+def register_patient(patient, payment, test_lines, user_id, lab_id):
+    """
+    Save a new patient atomically.
+
+    Args:
+        patient: dict with name, mobile, visit_date, age, sex, doctor_id, city,
+                 sample_source, return_time, address
+        payment: dict with total, discount, paid
+        test_lines: list of {"Test_ID", "Rate"} (see build_test_lines)
+        user_id: user saving the entry
+        lab_id: lab whose daily LabNo counter is used
+
+    Returns:
+        dict with patient_id, patient_no, lab_no, payment_id, line_count, elapsed_ms
+    Raises:
+        pyodbc.Error on any failure (nothing is written)
+    """
+    # Keys come from pre-reserved blocks: no round trip in the common case
+    patient_id = PATIENT_IDS.next_id()
+    payment_id = PAYMENT_IDS.next_id()
+    trn_ids = JOURNAL_IDS.next_ids(4)
+    patient_no = f"P{patient_id}"
+    visit_date = patient["visit_date"]
+    paid = payment["paid"]
+    doctor_id = int(patient["doctor_id"]) if patient["doctor_id"] is not None else None
+
+    started = time.perf_counter()
+    with get_connection() as con:
+        cur = con.cursor()
+
+        lab_no = next_lab_no(cur, lab_id, visit_date.date())
+
+        # Patient + payment header in a single batch
+        cur.execute("""
+            SET NOCOUNT ON;
+            INSERT INTO patient (
+                Patient_Id, PatientNo, LabNo, Patient_Name, NIC, Mobile_No,
+                ReportedDate, Visit_Date, Age, Sex, Refered_By,
+                City, Parent_Age_Name, SampleSource, WrongEntry,
+                ReturnTime, Address
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+            INSERT INTO patientpayment (
+                PaymentID, PatientID, TotalAmount, Discount, AmountPaid,
+                UserID, Description, TDiscount
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?);
+        """, (
+            patient_id, patient_no, lab_no, patient["name"], "", patient["mobile"],
+            visit_date, visit_date, patient["age"], patient["sex"], doctor_id,
+            patient["city"], "", patient["sample_source"], 0,
+            patient["return_time"], patient["address"],
+            payment_id, str(patient_id), payment["total"], payment["discount"], paid,
+            user_id, "New Patient Entry", payment["discount"]
+        ))
+
+        cur.fast_executemany = True
+        if test_lines:
+            cur.executemany("""
+                INSERT INTO patient_test (PatientID, Test_ID, PaymentID, TestRepeat)
+                VALUES (?, ?, ?, 0)
+            """, [(str(patient_id), line["Test_ID"], payment_id) for line in test_lines])
+
+        cur.executemany("""
+            INSERT INTO journal (
+                TRN_ID, TRN_date, S_ID, Description, TRN_type,
+                TRN_amount, PatientID, DoctorFeeID
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (trn_ids[0], visit_date, 1, JOURNAL_DESCRIPTION, "Debit", paid, patient_id, None),
+            (trn_ids[1], visit_date, 3, JOURNAL_DESCRIPTION, "Credit", paid, patient_id, None),
+            (trn_ids[2], visit_date, 1, JOURNAL_DESCRIPTION, "Credit", paid, patient_id, None),
+            (trn_ids[3], visit_date, 2, JOURNAL_DESCRIPTION, "Debit", paid, patient_id, None),
+        ])
+
+        refresh_summary(cur, patient_id)
+        post_receivable(cur, patient_id, lab_id, visit_date,
+                        payment["total"], payment["discount"], paid, "New Patient Entry")
+        con.commit()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    # Orders larger than 50 lines get a proportionally larger budget
+    budget = TARGET_MS_50_LINES * max(len(test_lines), 50) / 50
+    if elapsed_ms > budget:
+        log.warning("Registration of %d test lines took %.0f ms (target %.0f ms)",
+                    len(test_lines), elapsed_ms, budget)
+
+    return {
+        "patient_id": patient_id,
+        "patient_no": patient_no,
+        "lab_no": lab_no,
+        "payment_id": payment_id,
+        "line_count": len(test_lines),
+        "elapsed_ms": elapsed_ms,
+    }
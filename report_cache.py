@@ -0,0 +1,124 @@
+"""
+Rendered Report Cache
+Features: bounded, process-wide LRU of rendered lab reports keyed by patient, format and a
+version stamp of everything the report shows (patient row, doctor, results, test catalog,
+lab branding); screens that save results or patient details invalidate their patient straight
+away, other desks' writes are picked up by the stamp - so a re-print re-uses the HTML
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import reports
+from db import get_connection
+from catalog import get_catalog
+from branding import get_branding
+from patient_keys import key_column, key_param
+
+log = logging.getLogger("lab.report_cache")
+
+MAX_ENTRIES = 64           # rendered reports kept (a report is ~20 KB plus the logo)
+VERSION_CHECK_INTERVAL = 5.0   # seconds a cached report is served without re-reading its stamp
+
+
+def _version_sql():
+    return f"""
+        SELECT
+            BINARY_CHECKSUM(p.LabNo, p.PatientNo, p.Patient_Name, p.Age, p.Sex, p.Mobile_No,
+                            p.City, p.Address, p.Visit_Date, p.Refered_By, d.DoctorName),
+            (SELECT COUNT_BIG(*) FROM patient_test_results r
+             WHERE {key_column("r", "patient_test_results")} = ?),
+            (SELECT CHECKSUM_AGG(BINARY_CHECKSUM(r.Result_id, r.Test_No, r.Test_Values, r.Remarks))
+             FROM patient_test_results r
+             WHERE {key_column("r", "patient_test_results")} = ?)
+        FROM patient p
+        LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+        WHERE p.Patient_Id = ?
+    """
+
+
+def report_version(patient_id):
+    """Stamp that changes whenever the patient's report would change; None if no such patient"""
+    key = key_param("patient_test_results", patient_id)
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(_version_sql(), (key, key, int(patient_id)))
+        row = cur.fetchone()
+    if row is None:
+        return None
+    lab = get_branding()
+    return (tuple(row), get_catalog().version, lab["version"] if lab else None)
+
+
+class ReportCache:
+    """LRU of (patient_id, format_type) -> (version, html, checked_at)"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0       # bumped by invalidate(); renders started before are not stored
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, patient_id, format_type="standard"):
+        """Rendered report HTML, from the cache when still current"""
+        key = (int(patient_id), format_type)
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            entry = self._entries.get(key)
+            if entry and now - entry[2] < VERSION_CHECK_INTERVAL:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+
+        version = report_version(patient_id)
+        if version is None:
+            return reports.generate_report(patient_id, format_type=format_type)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries[key] = (version, entry[1], now)
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+
+        started = time.perf_counter()
+        html = reports.generate_report(patient_id, format_type=format_type)
+        self.stats["misses"] += 1
+        log.debug("Report for patient %s rendered in %.0f ms", patient_id,
+                  (time.perf_counter() - started) * 1000)
+
+        with self._lock:
+            if generation != self._generation:
+                return html
+            self._entries[key] = (version, html, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def invalidate(self, patient_id=None):
+        """Drop one patient's reports (all reports when patient_id is None)"""
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == int(patient_id)]:
+                    del self._entries[key]
+            self._generation += 1
+            self.stats["invalidations"] += 1
+
+
+# Kept in this module (not app.py) so rendered reports survive Streamlit reruns
+REPORTS = ReportCache()
+
+
+def get_report(patient_id, format_type="standard"):
+    return REPORTS.get(patient_id, format_type)
+
+
+def invalidate(patient_id=None):
+    REPORTS.invalidate(patient_id)
@@ -2,139 +2,115 @@
 Laboratory Report Generation Module - SUB-TESTS ONLY (NO MAIN TEST RESULTS)
 Features: Only sub-tests displayed, grouped by main test, proper hierarchy from Test table
 """
-import pyodbc
-import base64
-from io import BytesIO
 from datetime import datetime
-import re
 
-# Optional QR Code support
-try:
-    import qrcode
-    QR_AVAILABLE = True
-except ImportError:
-    QR_AVAILABLE = False
+# Optional QR Code support (see qr_codes.py)
+from qr_codes import QR_AVAILABLE, qr_png_base64, qr_svg_data_uri
 
 # -----------------------------
 # DATABASE CONNECTION
 # -----------------------------
-def get_connection():
-    return pyodbc.connect(
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        "SERVER=dbserver\\sqlexpress;"
-        "DATABASE=Lab;"
-        "UID=sa;"
-        "PWD=aielitetechsims2000"
-    )
+# Reports borrow from the same process-wide pool as the pages (see db.py)
+from db import get_connection
+from patient_keys import key_column, key_param
+from branding import get_branding
+from ranges import compile_range, flag_results, patient_sex, range_text
+from catalog import get_catalog
+from templates import Template, escape
 
 # -----------------------------
 # QR CODE GENERATION
 # -----------------------------
 def generate_qr_code(data):
-    """Generate QR code as base64 string"""
-    if not QR_AVAILABLE:
-        return None
-    
-    try:
-        qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=8, border=2)
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
-    except:
-        return None
+    """Generate QR code as base64 PNG string (cached per payload)"""
+    return qr_png_base64(data)
 
 # -----------------------------
 # CHECK ABNORMAL VALUE
 # -----------------------------
-def is_abnormal(result_value, reference_range):
-    """Check if result is outside reference range"""
+def is_abnormal(result_value, reference_range, sex=None, age=None):
+    """Check if result is outside reference range (range text compiled once, see ranges.py)"""
     if not result_value or not reference_range:
         return False
-    
-    result_num = re.search(r'[\d.]+', str(result_value))
-    if not result_num:
-        return False
-    
-    result_val = float(result_num.group())
-    ref_clean = reference_range.strip().lower()
-    
-    if '-' in ref_clean:
-        try:
-            parts = ref_clean.split('-')
-            low = float(parts[0].strip())
-            high = float(parts[1].strip())
-            return result_val < low or result_val > high
-        except:
-            return False
-    
-    if ref_clean.startswith('<'):
-        try:
-            limit = float(ref_clean.replace('<', '').strip())
-            return result_val > limit
-        except:
-            return False
-    
-    if ref_clean.startswith('>'):
-        try:
-            limit = float(ref_clean.replace('>', '').strip())
-            return result_val < limit
-        except:
-            return False
-    
-    return False
+    return compile_range(reference_range).is_abnormal(result_value, patient_sex(sex), age)
+
+def _age_years(age):
+    try:
+        return float(age)
+    except (TypeError, ValueError):
+        return None
 
 # -----------------------------
 # FETCH PATIENT REPORT DATA (SUB-TESTS ONLY - GROUPED BY MAIN TEST)
 # -----------------------------
 def get_patient_report_data(patient_id):
     """Fetch ONLY sub-tests grouped by their main test (General_Test_Id)"""
-    con = get_connection()
-    cur = con.cursor()
-    
-    # Get patient details with logo
-    cur.execute("""
-        SELECT 
-            p.LabNo,
-            p.PatientNo,
-            p.Patient_Name,
-            p.Age,
-            p.Sex,
-            p.Mobile_No,
-            p.City,
-            p.Address,
-            p.Visit_Date,
-            d.DoctorName,
-            l.LabName,
-            l.Address AS LabAddress,
-            l.PhoneNo,
-            l.Pad_Logo,
-            (SELECT TOP 1 ti.ReportID FROM test_identity ti 
-             JOIN test t ON ti.Id = t.Id 
-             JOIN patient_test pt ON t.Test_Id = pt.Test_ID
-             WHERE pt.PatientID = CAST(p.Patient_Id AS VARCHAR(50))
-             ORDER BY ti.ReportID) AS ReportID
-        FROM patient p
-        LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
-        CROSS JOIN LabInfo l
-        WHERE p.Patient_Id = ?
-    """, (patient_id,))
+    # One round trip: patient row, ordered test ids, result rows. Test names, hierarchy,
+    # display numbers, first normal ranges and ReportIDs come from the in-memory catalog.
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SET NOCOUNT ON;
+            SELECT 
+                p.LabNo,
+                p.PatientNo,
+                p.Patient_Name,
+                p.Age,
+                p.Sex,
+                p.Mobile_No,
+                p.City,
+                p.Address,
+                p.Visit_Date,
+                d.DoctorName
+            FROM patient p
+            LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+            WHERE p.Patient_Id = ?;
+            
+            SELECT pt.Test_ID
+            FROM patient_test pt
+            WHERE {key_column("pt", "patient_test")} = ?;
+            
+            SELECT ptr.Test_No, ptr.Test_Values, ptr.Remarks
+            FROM patient_test_results ptr
+            WHERE {key_column("ptr", "patient_test_results")} = ?
+            ORDER BY ptr.Result_id;
+        """, (
+            patient_id,
+            key_param("patient_test", patient_id),
+            key_param("patient_test_results", patient_id)
+        ))
+        patient_row = cur.fetchone()
+        cur.nextset()
+        ordered_test_ids = [row[0] for row in cur.fetchall()]
+        cur.nextset()
+        result_rows = cur.fetchall()
     
-    patient_row = cur.fetchone()
     if not patient_row:
-        con.close()
         return None
+    return build_report_data(patient_row, ordered_test_ids, result_rows, get_catalog())
+
+def report_id_for(ordered_test_ids, cat):
+    """Lowest ReportID of the ordered tests, as TOP 1 ... ORDER BY ti.ReportID picked it"""
+    report_ids = []
+    for test_id in ordered_test_ids:
+        test = cat.get(int(test_id))
+        if test and test["has_identity"]:
+            report_ids.append(test["report_id"])
+    if not report_ids or None in report_ids:
+        return None    # NULLs sort first in SQL Server
+    return min(report_ids)
+
+def build_report_data(patient_row, ordered_test_ids, result_rows, cat):
+    """
+    Report data from already-fetched rows.
     
-    # Convert binary logo to base64
-    logo_base64 = None
-    if patient_row[13]:
-        try:
-            logo_base64 = base64.b64encode(patient_row[13]).decode('utf-8')
-        except:
-            logo_base64 = None
+    patient_row: LabNo, PatientNo, Patient_Name, Age, Sex, Mobile_No, City, Address,
+                 Visit_Date, DoctorName
+    ordered_test_ids: patient_test.Test_ID values of the patient
+    result_rows: (Test_No, Test_Values, Remarks) in Result_id order
+    """
+    lab = get_branding() or {}
+    report_id = report_id_for(ordered_test_ids, cat)
     
     patient_data = {
         "lab_no": patient_row[0],
@@ -147,129 +123,99 @@ def get_patient_report_data(patient_id):
         "address": patient_row[7],
         "visit_date": patient_row[8].strftime('%d-%b-%Y %I:%M %p') if patient_row[8] else "",
         "doctor": patient_row[9] if patient_row[9] else "N/A",
-        "lab_name": patient_row[10],
-        "lab_address": patient_row[11],
-        "lab_phone": patient_row[12],
-        "logo_base64": logo_base64,
-        "report_id": patient_row[14] if patient_row[14] else 1
+        "lab_name": lab.get("name"),
+        "lab_address": lab.get("address"),
+        "lab_phone": lab.get("phone"),
+        "logo_data_uri": lab.get("logo_data_uri"),
+        "report_id": report_id if report_id else 1
     }
     
-    # 🔑 CRITICAL FIX: Fetch ONLY SUB-TESTS (General_Test_Id NOT NULL) grouped by MAIN TEST
+    # 🔑 CRITICAL FIX: ONLY SUB-TESTS (General_Test_Id NOT NULL) grouped by MAIN TEST
     # Structure matches your Test table exactly:
     #   - Main Test = test where other tests have General_Test_Id = this test's Test_Id
     #   - Sub-test = test where General_Test_Id points to main test's Test_Id
-    cur.execute("""
-        SELECT 
-            main_t.Test_Name AS MainTestName,
-            main_t.Test_Id AS MainTestId,
-            ti_sub.Test_Display_No AS SubTestDisplayNo,
-            sub_t.Test_Name AS SubTestName,
-            sub_t.Id AS SubTestId,
-            ptr.Test_Values,
-            COALESCE(
-                CASE 
-                    WHEN nr.Inital_Value IS NOT NULL AND nr.Final_Value IS NOT NULL 
-                    THEN CONCAT(nr.Inital_Value, ' - ', nr.Final_Value)
-                    ELSE COALESCE(nr.Inital_Value, nr.Final_Value, ptr.Remarks)
-                END,
-                ptr.Remarks
-            ) AS ReferenceRange,
-            sub_t.Unit
-        FROM patient_test_results ptr
-        -- Sub-test table (has General_Test_Id pointing to main test)
-        JOIN test sub_t ON ptr.Test_No = sub_t.Test_Id
-        -- Main test table (parent of sub-test)
-        JOIN test main_t ON sub_t.General_Test_Id = main_t.Test_Id
-        -- Get display number for SUB-TEST from test_identity
-        LEFT JOIN test_identity ti_sub ON sub_t.Id = ti_sub.Id
-        -- Get reference ranges for SUB-TEST
-        LEFT JOIN (
-            SELECT Test_Id, Inital_Value, Final_Value,
-                   ROW_NUMBER() OVER (PARTITION BY Test_Id ORDER BY Ref_Id) as rn
-            FROM Normal_Ranges
-        ) nr ON sub_t.Test_Id = nr.Test_Id AND nr.rn = 1
-        WHERE ptr.Patient_No = ?
-          AND sub_t.General_Test_Id IS NOT NULL 
-          AND sub_t.General_Test_Id != 0  -- ONLY SUB-TESTS (no main tests)
-        ORDER BY 
-            main_t.Test_Id,  -- Group by main test
-            CASE 
-                WHEN ti_sub.Test_Display_No IS NOT NULL THEN CAST(ti_sub.Test_Display_No AS VARCHAR(50)) 
-                ELSE 'ZZZ' 
-            END,
-            sub_t.Test_Name
-    """, (str(patient_id),))
-    
-    # Group sub-tests by main test
-    grouped_tests = {}
-    for row in cur.fetchall():
-        main_test_id = row[1]
-        if main_test_id not in grouped_tests:
-            grouped_tests[main_test_id] = {
-                "main_test_name": row[0],
-                "sub_tests": []
-            }
+    lines = []
+    for test_no, test_values, remarks in result_rows:
+        sub = cat.get(int(test_no)) if test_no is not None else None
+        if not sub or not sub["general_test_id"]:
+            continue    # ONLY SUB-TESTS (no main tests)
+        main = cat.get(sub["general_test_id"])
+        if not main:
+            continue
         
-        # Add sub-test to group
-        grouped_tests[main_test_id]["sub_tests"].append({
-            "display_no": row[2] if row[2] else "None",  # Show "None" if no display number
-            "test_name": row[3],
-            "result": row[5] if row[5] else "",
-            "reference_range": row[6] if row[6] else "N/A",
-            "unit": row[7] if row[7] else "",
-            "is_abnormal": is_abnormal(row[5], row[6]) if row[5] and row[6] else False
+        # First normal range of the sub-test, else the remark typed with the result
+        first = cat.first_range(sub["test_id"])
+        normal_text = range_text(first["initial_value"], first["final_value"]) if first else None
+        lines.append({
+            "main": main,
+            "sub": sub,
+            "result": test_values,
+            "reference_range": normal_text if normal_text is not None else remarks,
+            "compiled_range": cat.reference_range(sub["test_id"]) if normal_text is not None else remarks,
         })
     
-    con.close()
+    lines.sort(key=lambda line: (
+        line["main"]["test_id"],
+        str(line["sub"]["display_no"]) if line["sub"]["display_no"] is not None else "ZZZ",
+        line["sub"]["test_name"] or ""
+    ))
+    
+    # Flag every result of the report in one pass (sex/age specific bands apply)
+    abnormal = flag_results(
+        [line["result"] for line in lines],
+        [line["compiled_range"] if line["result"] and line["reference_range"] else None for line in lines],
+        sexes=patient_sex(patient_data["sex"]),
+        ages=_age_years(patient_data["age"])
+    )
     
-    # Convert to ordered list for consistent display
+    # Group sub-tests by main test (lines are already in main test order)
     test_groups = []
-    for main_id in sorted(grouped_tests.keys()):
-        test_groups.append({
-            "main_test_name": grouped_tests[main_id]["main_test_name"],
-            "sub_tests": grouped_tests[main_id]["sub_tests"]
+    for line, flagged in zip(lines, abnormal):
+        if not test_groups or test_groups[-1]["main_test_id"] != line["main"]["test_id"]:
+            test_groups.append({
+                "main_test_id": line["main"]["test_id"],
+                "main_test_name": line["main"]["test_name"],
+                "sub_tests": []
+            })
+        
+        sub = line["sub"]
+        test_groups[-1]["sub_tests"].append({
+            "display_no": sub["display_no"] if sub["display_no"] else "None",  # Show "None" if no display number
+            "test_name": sub["test_name"],
+            "result": line["result"] if line["result"] else "",
+            "reference_range": line["reference_range"] if line["reference_range"] else "N/A",
+            "unit": sub["unit"] if sub["unit"] else "",
+            "is_abnormal": bool(flagged)
         })
     
     return {
         "patient": patient_data,
-        "tests": test_groups,  # List of {main_test_name, sub_tests[]}
+        "tests": [
+            {"main_test_name": group["main_test_name"], "sub_tests": group["sub_tests"]}
+            for group in test_groups
+        ],  # List of {main_test_name, sub_tests[]}
         "report_generated": datetime.now().strftime('%d-%b-%Y %I:%M %p')
     }
 
 # -----------------------------
-# GENERATE REPORT HTML (SUB-TESTS ONLY - EXACTLY YOUR FORMAT)
+# REPORT TEMPLATES (COMPILED ONCE)
 # -----------------------------
-def generate_standard_report_html(report_data):
-    """Report showing ONLY sub-tests grouped under main test headers"""
-    patient = report_data["patient"]
-    test_groups = report_data["tests"]
-    report_time = report_data["report_generated"]
-    
-    # Generate QR code
-    qr_data = f"Lab:{patient['lab_name']}|LabNo:{patient['lab_no']}|Patient:{patient['name']}|Date:{patient['visit_date']}|ReportTime:{report_time}"
-    qr_base64 = generate_qr_code(qr_data) if QR_AVAILABLE else None
-    
-    # Build HTML report
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>Test Report - Lab No: {patient['lab_no']}</title>
-    <style>
-        @media print {{
-            body {{ margin: 0; padding: 0; }}
-            .report {{ width: 210mm; min-height: 297mm; padding: 10mm; }}
-            .no-print {{ display: none; }}
-        }}
-        * {{ box-sizing: border-box; }}
-        body {{
+# Static stylesheet, identical for every report
+REPORT_CSS = """
+        @media print {
+            body { margin: 0; padding: 0; }
+            .report { width: 210mm; min-height: 297mm; padding: 10mm; }
+            .no-print { display: none; }
+        }
+        * { box-sizing: border-box; }
+        body {
             font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
             margin: 0;
             padding: 0;
             color: #333;
             line-height: 1.4;
-        }}
-        .report {{
+        }
+        .report {
             width: 210mm;
             min-height: 297mm;
             margin: 10mm auto;
@@ -277,53 +223,53 @@ def generate_standard_report_html(report_data):
             padding: 15px;
             position: relative;
             box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }}
-        .header {{
+        }
+        .header {
             display: flex;
             justify-content: space-between;
             align-items: flex-start;
             border-bottom: 2px solid #2c3e50;
             padding-bottom: 8px;
             margin-bottom: 12px;
-        }}
-        .logo-section {{
+        }
+        .logo-section {
             display: flex;
             align-items: center;
-        }}
-        .logo-img {{
+        }
+        .logo-img {
             max-height: 50px;
             max-width: 160px;
             object-fit: contain;
-        }}
-        .lab-info {{
+        }
+        .lab-info {
             margin-left: 12px;
-        }}
-        .lab-name {{
+        }
+        .lab-name {
             font-size: 20px;
             color: #2c3e50;
             font-weight: bold;
             margin: 2px 0;
-        }}
-        .lab-address {{
+        }
+        .lab-address {
             font-size: 12px;
             color: #555;
             line-height: 1.3;
-        }}
-        .report-title {{
+        }
+        .report-title {
             font-size: 19px;
             color: #e74c3c;
             text-align: center;
             margin: 6px 0 4px;
             font-weight: bold;
-        }}
-        .report-subtitle {{
+        }
+        .report-subtitle {
             text-align: center;
             color: #7f8c8d;
             font-size: 13px;
             margin-bottom: 12px;
             font-weight: 500;
-        }}
-        .patient-section {{
+        }
+        .patient-section {
             display: flex;
             justify-content: space-between;
             background: #f8f9fa;
@@ -332,97 +278,97 @@ def generate_standard_report_html(report_data):
             margin-bottom: 12px;
             border: 1px solid #e9ecef;
             font-size: 12px;
-        }}
-        .patient-details {{
+        }
+        .patient-details {
             flex: 1;
             display: grid;
             grid-template-columns: repeat(4, 1fr);
             gap: 3px 8px;
-        }}
-        .patient-item {{
+        }
+        .patient-item {
             margin: 1px 0;
-        }}
-        .patient-label {{
+        }
+        .patient-label {
             font-weight: 600;
             color: #2c3e50;
             display: inline-block;
             width: 65px;
             font-size: 11px;
-        }}
-        .patient-value {{
+        }
+        .patient-value {
             color: #2c3e50;
             font-weight: 500;
             font-size: 11px;
-        }}
-        .qr-container {{
+        }
+        .qr-container {
             text-align: right;
             flex: 0 0 100px;
             padding-left: 8px;
             border-left: 1px dashed #ccc;
-        }}
-        .qr-code {{
+        }
+        .qr-code {
             width: 90px;
             height: 90px;
             border: 2px solid white;
             box-shadow: 0 2px 4px rgba(0,0,0,0.1);
             margin: 0 auto;
-        }}
-        .qr-label {{
+        }
+        .qr-label {
             font-size: 9px;
             color: #7f8c8d;
             margin-top: 4px;
             font-weight: 500;
-        }}
-        .tests-container {{
+        }
+        .tests-container {
             width: 100%;
             margin-top: 10px;
-        }}
-        .tests-table {{
+        }
+        .tests-table {
             width: 100%;
             border-collapse: collapse;
             font-size: 12px;
-        }}
-        .tests-table th {{
+        }
+        .tests-table th {
             background: #2c3e50;
             color: white;
             padding: 8px 10px;
             text-align: left;
             font-weight: 600;
-        }}
-        .tests-table td {{
+        }
+        .tests-table td {
             padding: 7px 10px;
             border-bottom: 1px solid #e9ecef;
-        }}
-        .tests-table tr:nth-child(even) {{
+        }
+        .tests-table tr:nth-child(even) {
             background: #f9fbfd;
-        }}
-        .tests-table tr:hover {{
+        }
+        .tests-table tr:hover {
             background: #e8f4fc;
-        }}
-        .section-header {{
+        }
+        .section-header {
             font-weight: bold;
             font-size: 14px;
             color: #2980b9;
             padding: 6px 0;
             background: #f1f8ff;
-        }}
-        .result-value {{
+        }
+        .result-value {
             font-weight: 600;
             color: #27ae60;
             font-size: 13px;
-        }}
-        .abnormal {{
+        }
+        .abnormal {
             color: #e74c3c !important;
             text-decoration: underline wavy #e74c3c;
             font-weight: 600;
-        }}
-        .unit {{
+        }
+        .unit {
             color: #7f8c8d;
             font-style: italic;
             margin-left: 3px;
             font-size: 11px;
-        }}
-        .reference-range {{
+        }
+        .reference-range {
             color: #e67e22;
             background: #fff9f0;
             padding: 1px 5px;
@@ -430,8 +376,8 @@ def generate_standard_report_html(report_data):
             display: inline-block;
             font-size: 11px;
             margin-top: 1px;
-        }}
-        .footer {{
+        }
+        .footer {
             text-align: center;
             margin-top: 20px;
             padding-top: 12px;
@@ -439,8 +385,8 @@ def generate_standard_report_html(report_data):
             color: #7f8c8d;
             font-size: 11px;
             line-height: 1.4;
-        }}
-        .report-id {{
+        }
+        .report-id {
             position: absolute;
             top: 8px;
             right: 12px;
@@ -451,8 +397,8 @@ def generate_standard_report_html(report_data):
             font-weight: bold;
             font-size: 11px;
             box-shadow: 0 1px 3px rgba(0,0,0,0.2);
-        }}
-        .disclaimer {{
+        }
+        .disclaimer {
             background: #e3f2fd;
             border-left: 3px solid #2196f3;
             padding: 8px 12px;
@@ -460,27 +406,34 @@ def generate_standard_report_html(report_data):
             border-radius: 0 3px 3px 0;
             font-size: 11px;
             line-height: 1.4;
-        }}
-        .report-meta {{
+        }
+        .report-meta {
             text-align: right;
             font-size: 10px;
             color: #7f8c8d;
             margin-top: 4px;
             font-style: italic;
-        }}
-    </style>
+        }
+"""
+
+REPORT_HEAD = Template("""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>Test Report - Lab No: {{ lab_no }}</title>
+    <style>""" + REPORT_CSS + """    </style>
 </head>
 <body>
     <div class="report">
-        <div class="report-id">RPT-{patient['report_id']}</div>
+        <div class="report-id">RPT-{{ report_id }}</div>
         
         <div class="header">
             <div class="logo-section">
-                {f'<img src="image/png;base64,{patient["logo_base64"]}" class="logo-img" alt="Lab Logo">' if patient.get('logo_base64') else f'<div class="lab-name">{patient["lab_name"]}</div>'}
+                {{ logo|safe }}
                 <div class="lab-info">
-                    {f'<div class="lab-name">{patient["lab_name"]}</div>' if not patient.get('logo_base64') else ''}
-                    <div class="lab-address">{patient['lab_address']}</div>
-                    <div class="lab-address">📞 {patient['lab_phone']}</div>
+                    {{ lab_title|safe }}
+                    <div class="lab-address">{{ lab_address }}</div>
+                    <div class="lab-address">📞 {{ lab_phone }}</div>
                 </div>
             </div>
             <div class="report-title">LABORATORY TEST REPORT</div>
@@ -490,17 +443,17 @@ def generate_standard_report_html(report_data):
         
         <div class="patient-section">
             <div class="patient-details">
-                <div class="patient-item"><span class="patient-label">Lab No:</span> <span class="patient-value">{patient['lab_no']}</span></div>
-                <div class="patient-item"><span class="patient-label">Patient No:</span> <span class="patient-value">{patient['patient_no']}</span></div>
-                <div class="patient-item"><span class="patient-label">Name:</span> <span class="patient-value">{patient['name']}</span></div>
-                <div class="patient-item"><span class="patient-label">Age/Sex:</span> <span class="patient-value">{patient['age']} / {patient['sex']}</span></div>
-                <div class="patient-item"><span class="patient-label">Doctor:</span> <span class="patient-value">{patient['doctor']}</span></div>
-                <div class="patient-item"><span class="patient-label">City:</span> <span class="patient-value">{patient['city']}</span></div>
-                <div class="patient-item"><span class="patient-label">Mobile:</span> <span class="patient-value">{patient['mobile']}</span></div>
-                <div class="patient-item"><span class="patient-label">Date:</span> <span class="patient-value">{patient['visit_date']}</span></div>
+                <div class="patient-item"><span class="patient-label">Lab No:</span> <span class="patient-value">{{ lab_no }}</span></div>
+                <div class="patient-item"><span class="patient-label">Patient No:</span> <span class="patient-value">{{ patient_no }}</span></div>
+                <div class="patient-item"><span class="patient-label">Name:</span> <span class="patient-value">{{ name }}</span></div>
+                <div class="patient-item"><span class="patient-label">Age/Sex:</span> <span class="patient-value">{{ age }} / {{ sex }}</span></div>
+                <div class="patient-item"><span class="patient-label">Doctor:</span> <span class="patient-value">{{ doctor }}</span></div>
+                <div class="patient-item"><span class="patient-label">City:</span> <span class="patient-value">{{ city }}</span></div>
+                <div class="patient-item"><span class="patient-label">Mobile:</span> <span class="patient-value">{{ mobile }}</span></div>
+                <div class="patient-item"><span class="patient-label">Date:</span> <span class="patient-value">{{ visit_date }}</span></div>
             </div>
             <div class="qr-container">
-                {f'<img src="image/png;base64,{qr_base64}" class="qr-code" alt="QR Code">' if qr_base64 else '<div style="height:90px"></div>'}
+                {{ qr|safe }}
                 <div class="qr-label">Scan to Verify</div>
             </div>
         </div>
@@ -521,65 +474,51 @@ def generate_standard_report_html(report_data):
                     </tr>
                 </thead>
                 <tbody>
-    """
-    
-    # Add test groups: ONLY SUB-TESTS under MAIN TEST headers
-    if not test_groups:
-        html += """
+""", name="report_head")
+
+REPORT_NO_RESULTS = Template("""
                     <tr>
                         <td colspan="4" style="text-align:center; padding:20px; color:#7f8c8d;">
                             No sub-test results available for this patient
                         </td>
                     </tr>
-        """
-    else:
-        for group in test_groups:
-            main_test_name = group["main_test_name"]
-            sub_tests = group["sub_tests"]
-            
-            # SECTION HEADER: Main test name (parent of sub-tests)
-            html += f"""
+""", name="report_no_results").render()
+
+REPORT_GROUP = Template("""
                     <tr>
                         <td colspan="4" class="section-header">
-                            🔬 {main_test_name}
+                            🔬 {{ main_test_name }}
                         </td>
                     </tr>
-            """
-            
-            # SUB-TESTS ONLY (NO main test row)
-            for sub in sub_tests:
-                # Format result with unit inline
-                result_display = sub['result']
-                if sub['unit']:
-                    result_display += f" <span class='unit'>{sub['unit']}</span>"
-                
-                html += f"""
+""", name="report_group")
+
+REPORT_ROW = Template("""
                     <tr>
-                        <td>{sub['display_no']}</td>
-                        <td>  ▫️ {sub['test_name']}</td>
+                        <td>{{ display_no }}</td>
+                        <td>  ▫️ {{ test_name }}</td>
                         <td>
-                            <span class="result-value {'abnormal' if sub['is_abnormal'] else ''}">
-                                {result_display}
+                            <span class="result-value{{ abnormal|safe }}">
+                                {{ result }}{{ unit|safe }}
                             </span>
                         </td>
-                        <td><div class="reference-range">{sub['reference_range']}</div></td>
+                        <td><div class="reference-range">{{ reference_range }}</div></td>
                     </tr>
-                """
-    
-    html += f"""
+""", name="report_row")
+
+REPORT_FOOT = Template("""
                 </tbody>
             </table>
         </div>
         
         <div class="report-meta">
-            Generated: {report_time} | Page 1 of 1
+            Generated: {{ report_time }} | Page 1 of 1
         </div>
         
         <div class="footer">
-            <div>Thank you for trusting {patient['lab_name']}</div>
+            <div>Thank you for trusting {{ lab_name }}</div>
             <div style="margin-top: 2px; font-weight: bold;">Precision in Every Test • Excellence in Every Report</div>
             <div style="margin-top: 4px; font-size: 10px;">
-                Computer-generated report. No signature required. Report ID: RPT-{patient['report_id']}
+                Computer-generated report. No signature required. Report ID: RPT-{{ report_id }}
             </div>
         </div>
     </div>
@@ -612,16 +551,55 @@ def generate_standard_report_html(report_data):
     </div>
     
     <script>
-    function downloadPDF() {{
+    function downloadPDF() {
         alert('For best quality PDF:\\n1. Click OK\\n2. In print dialog, choose "Save as PDF"\\n3. Set margins to "Default"\\n4. Check "Background graphics"\\n5. Click Save');
         window.print();
-    }}
+    }
     </script>
 </body>
 </html>
-    """
+""", name="report_foot")
+
+
+# -----------------------------
+# GENERATE REPORT HTML (SUB-TESTS ONLY - EXACTLY YOUR FORMAT)
+# -----------------------------
+def generate_standard_report_html(report_data):
+    """Report showing ONLY sub-tests grouped under main test headers"""
+    patient = report_data["patient"]
+    test_groups = report_data["tests"]
+    
+    # QR code as SVG, cached per payload (the payload identifies the report, not the render time)
+    qr_data = f"Lab:{patient['lab_name']}|LabNo:{patient['lab_no']}|Patient:{patient['name']}|Date:{patient['visit_date']}"
+    qr_src = qr_svg_data_uri(qr_data) if QR_AVAILABLE else None
     
-    return html
+    lab_name = escape(patient["lab_name"])
+    logo_uri = patient.get("logo_data_uri")
+    parts = REPORT_HEAD.render_into([], {
+        **patient,
+        "logo": f'<img src="{logo_uri}" class="logo-img" alt="Lab Logo">' if logo_uri else f'<div class="lab-name">{lab_name}</div>',
+        "lab_title": "" if logo_uri else f'<div class="lab-name">{lab_name}</div>',
+        "qr": f'<img src="{qr_src}" class="qr-code" alt="QR Code">' if qr_src else '<div style="height:90px"></div>',
+    })
+    
+    # Test groups: ONLY SUB-TESTS under MAIN TEST headers
+    if not test_groups:
+        parts.append(REPORT_NO_RESULTS)
+    for group in test_groups:
+        REPORT_GROUP.render_into(parts, group)
+        for sub in group["sub_tests"]:
+            REPORT_ROW.render_into(parts, {
+                **sub,
+                "abnormal": " abnormal" if sub["is_abnormal"] else "",
+                "unit": f" <span class='unit'>{escape(sub['unit'])}</span>" if sub["unit"] else "",
+            })
+    
+    REPORT_FOOT.render_into(parts, {
+        "report_time": report_data["report_generated"],
+        "lab_name": patient["lab_name"],
+        "report_id": patient["report_id"],
+    })
+    return "".join(parts)
 
 # -----------------------------
 # PUBLIC API
@@ -644,4 +622,9 @@ def generate_report(patient_id, format_type="standard"):
     if format_type == "standard":
         return generate_standard_report_html(report_data)
     else:
-        return generate_standard_report_html(report_data)
\ No newline at end of file
+        return generate_standard_report_html(report_data)
+
+
+def report_file_name(lab_no, patient_id, extension="html"):
+    """Download / archive name of a patient's report (viewer, receipt search and batch ZIPs)"""
+    return f"LabReport_Lab{lab_no}_Patient{patient_id}.{extension}"
\ No newline at end of file
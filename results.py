@@ -0,0 +1,173 @@
+"""
+Test Result Loader / Writer
+Features: loads a patient's ordered tests together with their existing results in ONE query,
+and saves every result of a patient in ONE transaction - existing rows are read once, only
+rows whose value or remark changed are sent, and the changes are applied with a single
+MERGE per chunk (update or insert) that reports what happened to each row
+"""
+import time
+import logging
+
+from db import get_connection
+from catalog import get_catalog
+from sequences import RESULT_IDS
+from patient_keys import key_column, key_param
+from order_summary import refresh_summary
+import report_cache
+
+log = logging.getLogger("lab.results")
+
+# SQL Server allows 2100 parameters per statement; 4 per row + 2 fixed
+MERGE_CHUNK_ROWS = 500
+
+
+def _clean(value):
+    return "" if value is None else str(value)
+
+
+# -----------------------------
+# LOAD
+# -----------------------------
+def load_patient_tests(patient_id):
+    """
+    A patient's ordered tests with their current result, sorted by display number.
+
+    Each dict has patient_id, test_id, payment_id, test_name, display_no, display_name,
+    rate, general_test_id, result_id, test_values and remarks (result_id is None and the
+    texts are "" when no result was entered yet).
+    """
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SELECT pt.PatientID, pt.Test_ID, pt.PaymentID, r.Result_id, r.Test_Values, r.Remarks
+            FROM patient_test pt
+            OUTER APPLY (
+                SELECT TOP 1 r.Result_id, r.Test_Values, r.Remarks
+                FROM patient_test_results r
+                WHERE {key_column("r", "patient_test_results")} = ? AND r.Test_No = pt.Test_ID
+                ORDER BY r.Result_id
+            ) r
+            WHERE {key_column("pt", "patient_test")} = ?
+        """, (key_param("patient_test_results", patient_id), key_param("patient_test", patient_id)))
+        rows = cur.fetchall()
+
+    # Test names, display numbers and rates come from the in-memory catalog
+    cat = get_catalog()
+    tests = []
+    for row in rows:
+        test = cat.get(int(row[1]))
+        if not test or not test["has_identity"]:
+            continue
+        tests.append({
+            "patient_id": row[0],
+            "test_id": int(row[1]),
+            "payment_id": row[2],
+            "test_name": test["test_name"],
+            "display_no": str(test["display_no"]),
+            "display_name": test["display_name"],
+            "rate": test["rate"],
+            "general_test_id": test["general_test_id"],
+            "result_id": row[3],
+            "test_values": _clean(row[4]),
+            "remarks": _clean(row[5]),
+        })
+
+    tests.sort(key=lambda t: t["display_no"])
+    return tests
+
+
+# -----------------------------
+# SAVE
+# -----------------------------
+def _read_existing(cur, patient_id):
+    """{Test_No: (Result_id, Test_Values, Remarks)} locked until the caller commits"""
+    cur.execute(f"""
+        SELECT r.Result_id, r.Test_No, r.Test_Values, r.Remarks
+        FROM patient_test_results r WITH (UPDLOCK, HOLDLOCK)
+        WHERE {key_column("r", "patient_test_results")} = ?
+        ORDER BY r.Result_id
+    """, (key_param("patient_test_results", patient_id),))
+    existing = {}
+    for row in cur.fetchall():
+        # Several rows for one test: the first one is the one screens show
+        existing.setdefault(int(row[1]), (row[0], _clean(row[2]), _clean(row[3])))
+    return existing
+
+
+def _merge(cur, patient_id, rows):
+    """Apply (Result_id, Test_No, Test_Values, Remarks) rows; returns {Test_No: action}"""
+    values_sql = ", ".join(["(?, ?, ?, ?)"] * len(rows))
+    params = [value for row in rows for value in row]
+    params += [key_param("patient_test_results", patient_id), str(patient_id)]
+    cur.execute(f"""
+        SET NOCOUNT ON;
+        MERGE patient_test_results WITH (HOLDLOCK) AS r
+        USING (VALUES {values_sql}) AS src (Result_id, Test_No, Test_Values, Remarks)
+            ON {key_column("r", "patient_test_results")} = ? AND r.Test_No = src.Test_No
+        WHEN MATCHED THEN
+            UPDATE SET Test_Values = src.Test_Values, Remarks = src.Remarks
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (Result_id, Patient_No, Test_No, Test_Values, Remarks)
+            VALUES (src.Result_id, ?, src.Test_No, src.Test_Values, src.Remarks)
+        OUTPUT $action, inserted.Test_No;
+    """, params)
+    return {int(row[1]): "inserted" if row[0] == "INSERT" else "updated" for row in cur.fetchall()}
+
+
+def save_results(patient_id, entries):
+    """
+    Upsert a patient's results in one transaction.
+
+    Args:
+        patient_id: patient.Patient_Id
+        entries: {test_id: {"test_values", "remarks"}} as edited on the results screen
+
+    Returns:
+        dict with outcomes ({test_id: "inserted" | "updated" | "unchanged"}),
+        inserted, updated, unchanged, elapsed_ms
+    Raises:
+        pyodbc.Error on any failure (nothing is written)
+    """
+    started = time.perf_counter()
+    outcomes = {}
+    with get_connection() as con:
+        cur = con.cursor()
+        existing = _read_existing(cur, patient_id)
+
+        changed = []
+        for test_id, entry in entries.items():
+            test_id = int(test_id)
+            values, remarks = _clean(entry.get("test_values")), _clean(entry.get("remarks"))
+            current = existing.get(test_id)
+            if current is None:
+                # Blank entry for a test that has no row yet: nothing to store
+                if not values and not remarks:
+                    outcomes[test_id] = "unchanged"
+                    continue
+            elif (current[1], current[2]) == (values, remarks):
+                outcomes[test_id] = "unchanged"
+                continue
+            changed.append([test_id, values, remarks, current is None])
+
+        new_ids = iter(RESULT_IDS.next_ids(sum(1 for row in changed if row[3])))
+        rows = [
+            (next(new_ids) if is_new else existing[test_id][0], test_id, values, remarks)
+            for test_id, values, remarks, is_new in changed
+        ]
+        for start in range(0, len(rows), MERGE_CHUNK_ROWS):
+            outcomes.update(_merge(cur, patient_id, rows[start:start + MERGE_CHUNK_ROWS]))
+        if rows:
+            refresh_summary(cur, patient_id)
+
+        con.commit()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if rows:
+        report_cache.invalidate(patient_id)
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    for outcome in outcomes.values():
+        counts[outcome] += 1
+    log.info("Results for patient %s: %d inserted, %d updated, %d unchanged in %.0f ms",
+             patient_id, counts["inserted"], counts["updated"], counts["unchanged"], elapsed_ms)
+
+    return {"outcomes": outcomes, **counts, "elapsed_ms": elapsed_ms}
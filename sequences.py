@@ -0,0 +1,237 @@
+"""
+Block-Allocating ID Sequences (hi/lo)
+Features: replaces SELECT ISNULL(MAX(id),0)+1 key generation with keys handed out from
+blocks reserved in the database - SQL Server SEQUENCE (sp_sequence_get_range) when
+available, otherwise a small id_sequence table. Inserts need no MAX scan and two desks
+can never be given the same key. Also holds the per-lab, per-day LabNo counter.
+"""
+import logging
+import threading
+import time
+
+import pyodbc
+
+from db import get_connection
+
+log = logging.getLogger("lab.sequences")
+
+SEQUENCE_TABLE_DDL = """
+IF OBJECT_ID('dbo.id_sequence', 'U') IS NULL
+CREATE TABLE dbo.id_sequence (
+    SeqName   VARCHAR(50) NOT NULL PRIMARY KEY,
+    NextValue BIGINT      NOT NULL
+)
+"""
+
+
+# -----------------------------
+# ALLOCATOR
+# -----------------------------
+class IdAllocator:
+    """
+    Hands out integer keys for one table column.
+
+    A block of block_size keys is reserved with a single short, separately committed
+    statement; keys are then served from memory until the block runs out. Unused keys
+    of a block are lost when the process restarts (gaps are expected, duplicates are not).
+    Every writer of the column must take its keys from here.
+    """
+
+    def __init__(self, name, table, column, block_size=20):
+        self.name = name
+        self.table = table
+        self.column = column
+        self.block_size = block_size
+        self.sequence_name = f"dbo.seq_{name}"
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0            # first key NOT in the current block
+        self._backend = None       # "sequence" or "table", decided on first reservation
+
+    # ---- provisioning ----
+    def _seed_value(self, cur):
+        cur.execute(f"SELECT ISNULL(MAX({self.column}), 0) + 1 FROM {self.table}")
+        return int(cur.fetchone()[0])
+
+    def _ensure_backend(self, cur):
+        """Create the SEQUENCE (or id_sequence row) starting above the current MAX, once"""
+        cur.execute("SELECT OBJECT_ID(?, 'SO')", (self.sequence_name,))
+        if cur.fetchone()[0] is not None:
+            return "sequence"
+
+        seed = self._seed_value(cur)
+        try:
+            cur.execute(
+                f"CREATE SEQUENCE {self.sequence_name} AS BIGINT "
+                f"START WITH {seed} INCREMENT BY 1 NO CYCLE CACHE 50"
+            )
+            return "sequence"
+        except pyodbc.Error as e:
+            cur.execute("SELECT OBJECT_ID(?, 'SO')", (self.sequence_name,))
+            if cur.fetchone()[0] is not None:
+                return "sequence"    # another process created it first
+            log.info("SEQUENCE unavailable for %s (%s); using id_sequence table", self.name, e)
+
+        cur.execute(SEQUENCE_TABLE_DDL)
+        cur.execute("""
+            IF NOT EXISTS (SELECT 1 FROM dbo.id_sequence WITH (UPDLOCK, HOLDLOCK) WHERE SeqName = ?)
+                INSERT INTO dbo.id_sequence (SeqName, NextValue) VALUES (?, ?)
+        """, (self.name, self.name, seed))
+        return "table"
+
+    # ---- reservation ----
+    def _reserve(self, size):
+        """Reserve `size` consecutive keys and return the first one"""
+        # Own connection and commit: the reservation must survive even if the caller's
+        # business transaction rolls back, and must not hold locks for its duration.
+        with get_connection() as con:
+            cur = con.cursor()
+            if self._backend is None:
+                self._backend = self._ensure_backend(cur)
+                con.commit()
+
+            if self._backend == "sequence":
+                cur.execute("""
+                    SET NOCOUNT ON;
+                    DECLARE @first SQL_VARIANT;
+                    EXEC sys.sp_sequence_get_range
+                        @sequence_name = ?, @range_size = ?, @range_first_value = @first OUTPUT;
+                    SELECT CAST(@first AS BIGINT);
+                """, (self.sequence_name, size))
+            else:
+                cur.execute("""
+                    UPDATE dbo.id_sequence WITH (ROWLOCK)
+                    SET NextValue = NextValue + ?
+                    OUTPUT deleted.NextValue
+                    WHERE SeqName = ?
+                """, (size, self.name))
+            first = int(cur.fetchone()[0])
+            con.commit()
+        return first
+
+    def next_ids(self, count):
+        """Return `count` unique keys (consecutive unless a block boundary is crossed)"""
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                if self._next >= self._limit:
+                    size = max(self.block_size, count - len(ids))
+                    self._next = self._reserve(size)
+                    self._limit = self._next + size
+                take = min(count - len(ids), self._limit - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def next_id(self):
+        """Return one unique key"""
+        return self.next_ids(1)[0]
+
+
+# -----------------------------
+# PROCESS-WIDE ALLOCATORS
+# -----------------------------
+# Kept in this module (not app.py) so blocks survive Streamlit reruns.
+PATIENT_IDS = IdAllocator("patient", "patient", "Patient_Id", block_size=10)
+PAYMENT_IDS = IdAllocator("patientpayment", "patientpayment", "PaymentID", block_size=10)
+JOURNAL_IDS = IdAllocator("journal", "journal", "TRN_ID", block_size=40)
+RESULT_IDS = IdAllocator("patient_test_results", "patient_test_results", "Result_id", block_size=100)
+
+
+# -----------------------------
+# DAILY LAB NUMBER COUNTER
+# -----------------------------
+LAB_COUNTER_DDL = """
+IF OBJECT_ID('dbo.lab_daily_counter', 'U') IS NULL
+CREATE TABLE dbo.lab_daily_counter (
+    LabID       INT  NOT NULL,
+    CounterDate DATE NOT NULL,
+    LastLabNo   INT  NOT NULL,
+    CONSTRAINT PK_lab_daily_counter PRIMARY KEY (LabID, CounterDate)
+)
+"""
+
+# Highest numeric LabNo already used on a day; only runs to seed a day's counter
+LAB_NO_SEED_SQL = """
+    SELECT ISNULL(MAX(CASE
+        WHEN ISNUMERIC(LabNo) = 1 THEN CAST(LabNo AS INT)
+        ELSE 0
+    END), 0)
+    FROM patient
+    WHERE Visit_Date >= @day AND Visit_Date < DATEADD(DAY, 1, @day)
+"""
+
+PREVIEW_TTL = 10.0   # seconds a LabNo preview may be served from memory
+
+_counter_ready = False
+_preview_lock = threading.Lock()
+_preview_cache = {}  # (lab_id, day) -> (next_lab_no, fetched_at)
+
+
+def _ensure_lab_counter():
+    global _counter_ready
+    if not _counter_ready:
+        with get_connection() as con:
+            con.cursor().execute(LAB_COUNTER_DDL)
+            con.commit()
+        _counter_ready = True
+
+
+def next_lab_no(cur, lab_id, for_date):
+    """
+    Take the next LabNo for a lab and day inside the caller's transaction.
+
+    The counter row is locked until the caller commits, so two desks can never get
+    the same number, and a rolled-back registration gives its number back.
+    """
+    _ensure_lab_counter()
+    cur.execute(f"""
+        SET NOCOUNT ON;
+        DECLARE @lab INT = ?, @day DATE = ?, @next INT;
+
+        UPDATE dbo.lab_daily_counter WITH (UPDLOCK, HOLDLOCK)
+        SET @next = LastLabNo = LastLabNo + 1
+        WHERE LabID = @lab AND CounterDate = @day;
+
+        IF @@ROWCOUNT = 0
+        BEGIN
+            SELECT @next = ({LAB_NO_SEED_SQL}) + 1;
+            INSERT INTO dbo.lab_daily_counter (LabID, CounterDate, LastLabNo)
+            VALUES (@lab, @day, @next);
+        END
+
+        SELECT @next;
+    """, (lab_id, for_date))
+    lab_no = int(cur.fetchone()[0])
+
+    with _preview_lock:
+        _preview_cache.pop((lab_id, for_date), None)
+    return lab_no
+
+
+def peek_lab_no(lab_id, for_date):
+    """Cheap preview of the next LabNo for the entry form (may be a few seconds stale)"""
+    key = (lab_id, for_date)
+    now = time.monotonic()
+    with _preview_lock:
+        cached = _preview_cache.get(key)
+        if cached and now - cached[1] < PREVIEW_TTL:
+            return cached[0]
+
+    _ensure_lab_counter()
+    with get_connection() as con:
+        cur = con.cursor()
+        cur.execute(f"""
+            SET NOCOUNT ON;
+            DECLARE @lab INT = ?, @day DATE = ?;
+            SELECT ISNULL(
+                (SELECT LastLabNo FROM dbo.lab_daily_counter WHERE LabID = @lab AND CounterDate = @day),
+                ({LAB_NO_SEED_SQL})
+            ) + 1;
+        """, (lab_id, for_date))
+        preview = int(cur.fetchone()[0])
+
+    with _preview_lock:
+        _preview_cache[key] = (preview, now)
+    return preview
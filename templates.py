@@ -0,0 +1,89 @@
+"""
+HTML Template Layer
+Features: templates compiled once at import into a generated render function ({{ name }} is
+HTML-escaped, {{ name|safe }} is inserted as-is), indentation stripped from the static
+markup at compile time, documents assembled into one list and joined once
+"""
+import re
+from functools import lru_cache
+from html import escape as _html_escape
+
+_FIELD = re.compile(r"\{\{\s*(\w+)\s*(\|\s*safe)?\s*\}\}")
+_INDENT = re.compile(r"\n[ \t]+")
+
+# Values whose text can never contain markup characters
+_PLAIN_TYPES = (int, float, bool)
+
+
+@lru_cache(maxsize=8192)
+def _escape_text(text):
+    # Test names, units, ranges and amounts repeat across every document
+    return _html_escape(text, quote=True)
+
+
+def escape(value):
+    """HTML-escaped text of a value; None renders as an empty string"""
+    if type(value) is str:
+        return _escape_text(value)
+    if value is None:
+        return ""
+    if type(value) in _PLAIN_TYPES:
+        return str(value)
+    return _escape_text(str(value))
+
+
+def _safe_str(value):
+    return "" if value is None else str(value)
+
+
+class Template:
+    """
+    A compiled template. Static text may contain CSS / JS braces freely; only
+    {{ name }} / {{ name|safe }} are fields. Every field must be supplied on render.
+    """
+
+    __slots__ = ("name", "_literals", "_fields", "_render")
+
+    def __init__(self, source, name=None, compact=True):
+        self.name = name
+        literals, fields = [], []
+        pos = 0
+        for match in _FIELD.finditer(source):
+            literals.append(source[pos:match.start()])
+            fields.append((match.group(1), bool(match.group(2))))
+            pos = match.end()
+        literals.append(source[pos:])
+        if compact:
+            # Leading indentation is insignificant in HTML / CSS; a newline is kept in its place
+            literals = [_INDENT.sub("\n", literal) for literal in literals]
+        self._literals = tuple(literals)
+        self._fields = tuple(fields)
+        self._render = self._compile()
+
+    def _compile(self):
+        """Generate one Python function that builds the whole piece tuple in a single expression"""
+        pieces = []
+        for literal, (name, safe) in zip(self._literals, self._fields):
+            if literal:
+                pieces.append(repr(literal))
+            pieces.append(f"_str(c[{name!r}])" if safe else f"_escape(c[{name!r}])")
+        if self._literals[-1]:
+            pieces.append(repr(self._literals[-1]))
+        source = f"def render(c):\n    return ({', '.join(pieces)},)\n"
+        namespace = {"_escape": escape, "_str": _safe_str}
+        exec(compile(source, f"<template {self.name or 'anonymous'}>", "exec"), namespace)
+        return namespace["render"]
+
+    @property
+    def fields(self):
+        return tuple(name for name, _ in self._fields)
+
+    def render_into(self, parts, context):
+        """Append the rendered pieces to a list (assemble many templates, join once)"""
+        parts.extend(self._render(context))
+        return parts
+
+    def render(self, context=None, **fields):
+        if fields:
+            context = {**(context or {}), **fields}
+        return "".join(self.render_into([], context or {}))
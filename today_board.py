@@ -0,0 +1,216 @@
+"""
+Today's Patients Board
+Features: process-wide snapshot of the dashboard rows for today, refreshed by deltas - new
+patients (Patient_Id above the last one seen) and patients whose row, tests, payment or results
+changed since a rowversion watermark (migration 0004) - so a refresh with no changes costs one
+tiny query instead of re-running the whole day with its per-patient test list and status check
+"""
+import time
+import logging
+import threading
+from datetime import date
+
+import pandas as pd
+
+from db import get_connection, day_bounds
+from patient_keys import join_on
+from order_summary import summary_source
+
+log = logging.getLogger("lab.today_board")
+
+# Sessions re-running within this many seconds of the last poll share its result
+MIN_POLL_INTERVAL = 1.0
+
+# Auto-refresh choices offered on the dashboard (label -> seconds, None = off)
+AUTO_REFRESH_CHOICES = {"Off": None, "15 s": 15, "30 s": 30, "1 min": 60, "5 min": 300}
+
+COLUMNS = ["Patient_Id", "LabNo", "Patient", "Age", "Sex", "Mobile", "DoctorID", "Doctor",
+           "Tests", "Balance", "Status", "Visit_Date"]
+
+VERSIONED_TABLES = ("patient", "patientpayment", "patient_test", "patient_test_results")
+
+# SQL Server allows 2100 parameters per statement
+ID_CHUNK = 1000
+
+
+def _rows_sql(where):
+    """Dashboard row query (the same columns the dashboard always showed) for a WHERE clause"""
+    summary_join, col = summary_source()
+    return f"""
+        SELECT
+            p.Patient_Id,
+            p.LabNo,
+            p.Patient_Name AS Patient,
+            p.Age,
+            p.Sex,
+            p.Mobile_No AS Mobile,
+            p.Refered_By AS DoctorID,
+            d.DoctorName AS Doctor,
+            {col["tests"]} AS Tests,
+            ({col["total"]} - {col["paid"]}) AS Balance,
+            {col["status"]} AS Status,
+            p.Visit_Date
+        FROM patient p
+        LEFT JOIN doctor d ON p.Refered_By = d.DoctorID
+        {summary_join}
+        WHERE {where}
+    """
+
+
+def _delta_sql():
+    """Watermark + day count, then the ids of today's patients touched since @wm"""
+    return f"""
+        SET NOCOUNT ON;
+        DECLARE @wm BINARY(8) = ?, @last INT = ?, @start DATETIME = ?, @end DATETIME = ?;
+
+        SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BINARY(8)),
+               (SELECT COUNT(*) FROM patient WHERE Visit_Date >= @start AND Visit_Date < @end);
+
+        SELECT p.Patient_Id FROM patient p
+        WHERE p.Visit_Date >= @start AND p.Visit_Date < @end
+          AND (p.Patient_Id > @last OR p.RowVer >= @wm)
+        UNION
+        SELECT p.Patient_Id FROM patientpayment pp
+        JOIN patient p ON {join_on("pp", "patientpayment")}
+        WHERE pp.RowVer >= @wm AND p.Visit_Date >= @start AND p.Visit_Date < @end
+        UNION
+        SELECT p.Patient_Id FROM patient_test pt
+        JOIN patient p ON {join_on("pt", "patient_test")}
+        WHERE pt.RowVer >= @wm AND p.Visit_Date >= @start AND p.Visit_Date < @end
+        UNION
+        SELECT p.Patient_Id FROM patient_test_results r
+        JOIN patient p ON {join_on("r", "patient_test_results")}
+        WHERE r.RowVer >= @wm AND p.Visit_Date >= @start AND p.Visit_Date < @end;
+    """
+
+
+def _row_dict(row):
+    record = dict(zip(COLUMNS, row))
+    record["Balance"] = float(record["Balance"] or 0)
+    return record
+
+
+# -----------------------------
+# SNAPSHOT
+# -----------------------------
+class TodayBoard:
+    """
+    Today's dashboard rows, kept up to date with delta polls.
+
+    Without the RowVer columns (migration 0004 not applied) every poll is a full reload,
+    which is what the dashboard used to do on each rerun.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._day = None
+        self._rows = {}            # Patient_Id -> row dict
+        self._last_id = 0          # highest Patient_Id in the snapshot
+        self._watermark = None     # MIN_ACTIVE_ROWVERSION() read before the last poll
+        self._versioned = None     # RowVer columns present (checked once per process)
+        self._polled_at = 0.0
+        self._frame = None
+        self.stats = {"full_loads": 0, "polls": 0, "changed_rows": 0}
+
+    # ---- loading ----
+    def _check_versioned(self, cur):
+        for table in VERSIONED_TABLES:
+            cur.execute("SELECT COL_LENGTH(?, 'RowVer')", (f"dbo.{table}",))
+            if cur.fetchone()[0] is None:
+                log.info("%s has no RowVer column; dashboard reloads the whole day on each poll", table)
+                return False
+        return True
+
+    def _read_watermark(self, cur):
+        cur.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BINARY(8))")
+        return bytes(cur.fetchone()[0])
+
+    def _full_load(self, cur, day):
+        # Watermark first: anything committed after it is picked up by the next poll
+        watermark = self._read_watermark(cur) if self._versioned else None
+        start, end = day_bounds(day)
+        cur.execute(_rows_sql("p.Visit_Date >= ? AND p.Visit_Date < ?"), (start, end))
+        self._rows = {row[0]: _row_dict(row) for row in cur.fetchall()}
+        self._day = day
+        self._watermark = watermark
+        self._last_id = max(self._rows, default=0)
+        self._frame = None
+        self.stats["full_loads"] += 1
+
+    def _poll(self, cur, day):
+        """Apply changes since the watermark; True when the snapshot changed"""
+        start, end = day_bounds(day)
+        cur.execute(_delta_sql(), (self._watermark, self._last_id, start, end))
+        watermark, day_count = cur.fetchone()
+        cur.nextset()
+        changed_ids = [row[0] for row in cur.fetchall()]
+        self.stats["polls"] += 1
+
+        if changed_ids:
+            fetched = {}
+            for i in range(0, len(changed_ids), ID_CHUNK):
+                chunk = changed_ids[i:i + ID_CHUNK]
+                marks = ", ".join("?" * len(chunk))
+                cur.execute(
+                    _rows_sql(f"p.Patient_Id IN ({marks}) AND p.Visit_Date >= ? AND p.Visit_Date < ?"),
+                    (*chunk, start, end)
+                )
+                fetched.update((row[0], _row_dict(row)) for row in cur.fetchall())
+            for patient_id in changed_ids:
+                if patient_id in fetched:
+                    self._rows[patient_id] = fetched[patient_id]
+                else:
+                    self._rows.pop(patient_id, None)   # moved to another day meanwhile
+            self._last_id = max(self._rows, default=0)
+            self.stats["changed_rows"] += len(changed_ids)
+
+        self._watermark = bytes(watermark)
+        if day_count != len(self._rows):
+            # Deleted patients leave no row to stamp; the day count gives them away
+            self._full_load(cur, day)
+            return True
+        if changed_ids:
+            self._frame = None
+            return True
+        return False
+
+    # ---- public ----
+    def refresh(self):
+        """Bring the snapshot up to date (at most one poll per MIN_POLL_INTERVAL) and return it"""
+        today = date.today()
+        with self._lock:
+            now = time.monotonic()
+            if self._day == today and now - self._polled_at < MIN_POLL_INTERVAL:
+                return self.frame()
+            with get_connection() as con:
+                cur = con.cursor()
+                if self._versioned is None:
+                    self._versioned = self._check_versioned(cur)
+                if self._day != today or not self._versioned:
+                    self._full_load(cur, today)
+                else:
+                    self._poll(cur, today)
+            self._polled_at = time.monotonic()
+            return self.frame()
+
+    def frame(self):
+        """Snapshot as a DataFrame, newest patient first (shared - do not modify)"""
+        if self._frame is None:
+            rows = [self._rows[pid] for pid in sorted(self._rows, reverse=True)]
+            self._frame = pd.DataFrame(rows, columns=COLUMNS)
+        return self._frame
+
+    def invalidate(self):
+        """Drop the snapshot; the next refresh() reloads the whole day"""
+        with self._lock:
+            self._day = None
+            self._polled_at = 0.0
+
+
+# Kept in this module (not app.py) so the snapshot survives Streamlit reruns
+BOARD = TodayBoard()
+
+
+def get_today_patients():
+    """Today's dashboard rows, newest first"""
+    return BOARD.refresh()